@@ -0,0 +1,51 @@
+""" Drop Card Game assets
+Assets are loaded on first use and shared, so importing the game and showing the start
+screen don't wait for assets that are not needed yet. When a display exists images are
+converted to its pixel format so blits don't have to convert them every frame.
+Sounds and music are played by the audio manager (audio.py).
+"""
+import os
+import pygame
+from engine import DECK_SIZE, card_name
+
+# Shared assets
+images = {}
+fonts = {}
+# Shared card images, indexed by card code
+card_images = []
+
+
+def load_image(name, alpha=True):
+    """ Load an image of data/images and convert it to the display pixel format if a display exists.
+    Use alpha=False for opaque images e.g., backgrounds """
+    image = pygame.image.load(os.path.join('data', 'images', name))
+    if pygame.display.get_surface() is not None:
+        if alpha and image.get_flags() & pygame.SRCALPHA:
+            image = image.convert_alpha()
+        else:
+            image = image.convert()
+    return image
+
+
+def image(name, alpha=True):
+    """ Return the shared image of data/images, loaded on first use """
+    key = (name, alpha)
+    if key not in images:
+        images[key] = load_image(name, alpha)
+    return images[key]
+
+
+def font(name, size):
+    """ Return the shared font of data/fonts, loaded on first use """
+    key = (name, size)
+    if key not in fonts:
+        fonts[key] = pygame.font.Font(os.path.join('data', 'fonts', name), size)
+    return fonts[key]
+
+
+def load_card_images():
+    """ Return the images of all deck cards. They are loaded on the first call only """
+    if not card_images:
+        for code in range(DECK_SIZE):
+            card_images.append(load_image(card_name(code) + '.png'))
+    return card_images
@@ -0,0 +1,175 @@
+""" Drop Card Game audio
+The audio manager owns the mixer. The sound effects are decoded once, when the manager starts, to the
+mixer format (FREQUENCY, SAMPLE_SIZE, OUTPUT_CHANNELS) so playing them never decodes or loads. They play on
+a fixed pool of reserved mixer channels: an effect that already plays on its maximum number of voices
+restarts its oldest voice, else it takes a free channel, else it steals the oldest voice of the lowest
+priority that is not higher than its own, else it is dropped. A cascade of combinations therefore
+restarts its sound instead of piling up voices or cutting off the game over sound.
+The background music is streamed from its file by pygame.mixer.music, it is never decoded as a whole.
+
+If there is no audio device the manager stays disabled and the game plays muted.
+
+Usage: python audio.py measures the trigger to output latency of the mixer
+"""
+import argparse
+import os
+import time
+import pygame
+
+# Mixer format. A smaller buffer lowers the latency but the mixer must fill it in time
+FREQUENCY = 44100
+SAMPLE_SIZE = -16  # signed 16 bit samples
+OUTPUT_CHANNELS = 1
+BUFFER = 512  # samples per mixer buffer, about 12 ms at 44100 Hz
+POOL_CHANNELS = 6
+MUSIC = 'music.mp3'
+# Sound effects of data/sound: priority (a voice is stolen for an effect of the same or a higher priority)
+# and maximum voices playing at once
+EFFECTS = {
+    'in-place.wav': (1, 2),
+    'pop.wav': (1, 2),
+    'remove-cards.wav': (2, 2),
+    'game-over.wav': (3, 1),
+}
+PROBE_TIME = 5  # ms of the silent sound played to measure the latency
+
+
+class AudioManager(object):
+    """ Sound effects on a pool of channels and streamed music. voices[i] is (effect, priority, start time)
+    of the last effect played on pool channel i. played, restarted, stolen and dropped count the effects """
+    def __init__(self, effects=EFFECTS, channels=POOL_CHANNELS, buffer=BUFFER):
+        self.effects = effects
+        self.channels = channels
+        self.buffer = buffer
+        self.enabled = False
+        self.sounds = {}
+        self.pool = []
+        self.voices = []
+        self.music = None
+        self.played = self.restarted = self.stolen = self.dropped = 0
+
+    def init(self):
+        """ Start the mixer and decode the sound effects. Return False if there is no audio device """
+        if self.enabled:
+            return True
+        try:
+            if not pygame.mixer.get_init():
+                pygame.mixer.pre_init(FREQUENCY, SAMPLE_SIZE, OUTPUT_CHANNELS, self.buffer)
+                pygame.mixer.init()
+        except pygame.error as error:
+            print('No audio: %s' % error)
+            return False
+        # The pool channels are reserved, Sound.play() doesn't pick them
+        pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), self.channels))
+        pygame.mixer.set_reserved(self.channels)
+        self.pool = [pygame.mixer.Channel(index) for index in range(self.channels)]
+        self.voices = [None] * self.channels
+        for name in self.effects:
+            self.sounds[name] = pygame.mixer.Sound(os.path.join('data', 'sound', name))
+        self.enabled = True
+        return True
+
+    def play(self, name):
+        """ Play a sound effect on a channel of the pool. Return the channel, None if the effect was dropped """
+        if not self.enabled:
+            return None
+        priority, max_voices = self.effects[name]
+        free = None
+        lowest = None
+        oldest_voice = None
+        voices = 0
+        for index, channel in enumerate(self.pool):
+            voice = self.voices[index]
+            if not channel.get_busy():
+                if free is None:
+                    free = index
+                continue
+            if voice[0] == name:
+                voices += 1
+                if oldest_voice is None or voice[2] < self.voices[oldest_voice][2]:
+                    oldest_voice = index
+            if lowest is None or voice[1:] < self.voices[lowest][1:]:
+                lowest = index
+        if voices >= max_voices:
+            index = oldest_voice
+            self.restarted += 1
+        elif free is not None:
+            index = free
+        elif self.voices[lowest][1] <= priority:
+            index = lowest
+            self.stolen += 1
+        else:
+            self.dropped += 1
+            return None
+        channel = self.pool[index]
+        channel.play(self.sounds[name])
+        self.voices[index] = (name, priority, time.perf_counter())
+        self.played += 1
+        return channel
+
+    def stop(self):
+        """ Stop the sound effects """
+        for channel in self.pool:
+            channel.stop()
+
+    def play_music(self, name=MUSIC):
+        """ Stream music of data/sound in an infinite loop """
+        if not self.enabled:
+            return
+        if self.music != name:
+            pygame.mixer.music.load(os.path.join('data', 'sound', name))
+            self.music = name
+        pygame.mixer.music.play(-1)
+
+    def stop_music(self):
+        if self.enabled:
+            pygame.mixer.music.stop()
+
+    def pause_music(self):
+        if self.enabled:
+            pygame.mixer.music.pause()
+
+    def unpause_music(self):
+        if self.enabled:
+            pygame.mixer.music.unpause()
+
+    def measure_latency(self, tries=20):
+        """ Return the trigger to output latencies in ms of tries plays of a short silent sound: the time the
+        mixer takes to mix the sound after it is played (polled on its channel) plus the time of the
+        output buffer, which is played after it is mixed. None if there is no audio """
+        if not self.init():
+            return None
+        frequency, size, channels = pygame.mixer.get_init()
+        samples = frequency * PROBE_TIME // 1000
+        probe = pygame.mixer.Sound(buffer=bytes(samples * abs(size) // 8 * channels))
+        output_time = self.buffer * 1000.0 / frequency
+        channel = self.pool[0]
+        latencies = []
+        for i in range(tries):
+            start = time.perf_counter()
+            channel.play(probe)
+            while channel.get_busy():
+                time.sleep(0.0002)
+            mixed = (time.perf_counter() - start) * 1000 - PROBE_TIME
+            latencies.append(max(mixed, 0.0) + output_time)
+        return latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the trigger to output latency of the Drop Card Game audio')
+    parser.add_argument('--buffer', type=int, default=BUFFER, help='samples per mixer buffer (default %d)' % BUFFER)
+    parser.add_argument('--tries', type=int, default=50)
+    args = parser.parse_args(argv)
+    # Sounds are loaded relative to the game directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    latencies = AudioManager(buffer=args.buffer).measure_latency(args.tries)
+    if latencies is None:
+        return
+    latencies.sort()
+    print('mixer %s buffer %d samples' % (pygame.mixer.get_init(), args.buffer))
+    print('latency ms: min %.1f median %.1f max %.1f' % (latencies[0], latencies[len(latencies) // 2],
+                                                         latencies[-1]))
+
+
+if __name__ == '__main__':
+    main()
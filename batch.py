@@ -0,0 +1,229 @@
+""" Drop Card Game batch simulator
+Plays N headless games in lockstep with NumPy arrays instead of one Game object per game.
+Each step() drops the active card of every running game at once and the boards are checked
+with vectorized window tests in the check_board order of the engine (5 horizontal,
+4 horizontal, 4 vertical, 3 horizontal, 3 vertical), so a batch game plays exactly like
+engine.play_game with the same deck order and the same policy choices.
+
+State of game i:
+cells[i] is the board, card codes with EMPTY for no card, indexed [col, row] like Board.cells.
+decks[i] is the shuffled deck of the stage and deck_pos[i] the number of cards dealt.
+hand[i, :hand_len[i]] is the pack followed by the active card (the last one), in the order of
+Pack.cards. Rotating clockwise moves the active card to the front.
+
+NumPy is needed by this module only, the engine doesn't depend on it.
+"""
+import numpy as np
+from engine import BOARD_COLUMNS, BOARD_ROWS, CARDS_IN_PACK, DECK_SIZE, DECK_SIZE_PER_SUIT, EMPTY, RULE_CHECKS, \
+    INTERSECT_COLUMNS, RELATION_SAME_SUIT, RELATION_SAME_NUMBER, RELATION_ASCENT, RELATION_DESCENT
+
+HAND_SIZE = CARDS_IN_PACK + 1  # the pack and the active card
+INTERSECT_ROWS = BOARD_ROWS - 2  # a horizontal line can intersect a 3 cards column on these rows only
+# The compiled scoring rules in check_board order: (is horizontal, number of cards, intersect columns, scored,
+# points, intersect points, always intersect). The arrays are indexed by the relation of a line (see engine)
+CHECKS = tuple((horizontal, number_of_cards, INTERSECT_COLUMNS[number_of_cards] if horizontal else (),
+                np.array([score is not None for score in scores]),
+                np.array([score[0] if score else 0 for score in scores]),
+                np.array([score[1] or 0 if score else 0 for score in scores]),
+                np.array([score[2] if score else False for score in scores]))
+               for horizontal, number_of_cards, lines, scores, cell_lines in RULE_CHECKS)
+
+
+def pair_relations(cells, axis):
+    """ Return masks of the pairs of neighbour cards along axis (1 for rows, 2 for columns):
+    same suit, same number, ascent and descent. Pairs with an empty cell have no relation """
+    codes = cells.astype(np.int16)
+    suits = codes // DECK_SIZE_PER_SUIT
+    numbers = codes % DECK_SIZE_PER_SUIT
+    first = [slice(None)] * 3
+    second = [slice(None)] * 3
+    first[axis] = slice(None, -1)
+    second[axis] = slice(1, None)
+    first, second = tuple(first), tuple(second)
+    filled = cells != EMPTY
+    both = filled[first] & filled[second]
+    step = (numbers[second] - numbers[first]) % DECK_SIZE_PER_SUIT
+    return (both & (suits[first] == suits[second]), both & (numbers[first] == numbers[second]),
+            both & (step == 1), both & (step == DECK_SIZE_PER_SUIT - 1))
+
+
+def window_relations(relations, number_of_cards, axis):
+    """ Return the relation (engine.RELATION_* bits) of every line of number_of_cards along axis.
+    Lines are indexed by their first cell """
+    count = relations[0].shape[axis] - number_of_cards + 2
+    windows = []
+    for pairs in relations:
+        window = None
+        for i in range(number_of_cards - 1):
+            index = [slice(None)] * 3
+            index[axis] = slice(i, i + count)
+            window = pairs[tuple(index)] if window is None else window & pairs[tuple(index)]
+        windows.append(window)
+    same_suit, same_number, ascent, descent = windows
+    return (same_suit * RELATION_SAME_SUIT | same_number * RELATION_SAME_NUMBER | ascent * RELATION_ASCENT |
+            descent * RELATION_DESCENT)
+
+
+class BatchGame(object):
+    """ N games played in lockstep. seed seeds the deck shuffles of all games """
+    def __init__(self, n, seed=None, max_stages=None):
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.max_stages = max_stages
+        self.cells = np.full((n, BOARD_COLUMNS, BOARD_ROWS), EMPTY, np.uint8)
+        self.decks = np.zeros((n, DECK_SIZE), np.uint8)
+        self.deck_pos = np.zeros(n, np.intp)
+        self.hand = np.zeros((n, HAND_SIZE), np.uint8)
+        self.hand_len = np.zeros(n, np.intp)
+        self.score = np.zeros(n, np.int64)
+        self.stage = np.ones(n, np.int64)
+        self.level = np.ones(n, np.int64)
+        self.drops = np.zeros(n, np.int64)  # cards dropped
+        self.game_over = np.zeros(n, bool)
+        self.done = np.zeros(n, bool)  # game over or max_stages played
+        self.new_stage(np.arange(n))
+
+    def new_stage(self, games):
+        """ Clear the boards, shuffle new decks and deal the packs and active cards of games """
+        self.cells[games] = EMPTY
+        self.decks[games] = self.rng.permuted(np.tile(np.arange(DECK_SIZE, dtype=np.uint8), (len(games), 1)), axis=1)
+        self.hand[games] = self.decks[games, :HAND_SIZE]
+        self.hand_len[games] = HAND_SIZE
+        self.deck_pos[games] = HAND_SIZE
+
+    def running(self):
+        """ Return the indexes of the games that are not done """
+        return np.flatnonzero(~self.done)
+
+    def active_cards(self):
+        """ Return the active card of every game """
+        return self.hand[np.arange(self.n), self.hand_len - 1]
+
+    def step(self, rotations, columns):
+        """ Rotate the pack of every running game clockwise rotations[i] times and drop its active card
+        on column columns[i], like Game.rotate_clockwise, Game.move_left/right and Game.drop """
+        games = self.running()
+        if not len(games):
+            return
+        # Rotate: hand position i gets the card of position i - rotations (modulo the hand length)
+        lengths = self.hand_len[games][:, None]
+        positions = np.arange(HAND_SIZE)[None, :]
+        source = np.where(positions < lengths, (positions - rotations[games][:, None]) % lengths, positions)
+        self.hand[games] = np.take_along_axis(self.hand[games], source, 1)
+        # The card stops above the first card of its column. A full column is game over
+        self.drops[games] += 1
+        cols = columns[games]
+        filled = self.cells[games, cols] != EMPTY
+        rows = np.where(filled.any(1), filled.argmax(1), BOARD_ROWS) - 1
+        over = rows < 0
+        self.game_over[games[over]] = True
+        self.done[games[over]] = True
+        landed = games[~over]
+        self.cells[landed, cols[~over], rows[~over]] = self.hand[landed, self.hand_len[landed] - 1]
+        self.resolve(landed)
+        # Next active card: the last pack card, and the pack gets the next deck card in front.
+        # The stage is over when the pack is empty
+        out_of_cards = self.hand_len[landed] == 1
+        pack = landed[~out_of_cards]
+        has_deck = self.deck_pos[pack] < DECK_SIZE
+        dealing = pack[has_deck]
+        self.hand[dealing, 1:] = self.hand[dealing, :-1]
+        self.hand[dealing, 0] = self.decks[dealing, self.deck_pos[dealing]]
+        self.deck_pos[dealing] += 1
+        self.hand_len[pack[~has_deck]] -= 1
+        self.end_stage(landed[out_of_cards])
+
+    def end_stage(self, games):
+        """ Out of cards: give the bonus or the penalty of the remaining cards and go to the next stage """
+        if not len(games):
+            return
+        remaining = (self.cells[games] != EMPTY).sum(axis=(1, 2))
+        level = self.level[games]
+        self.score[games] += np.where(remaining == 0, 1000 + (level - 1) * 100, 0) - 100 * level * remaining
+        cleared = self.score[games] > 0
+        self.game_over[games[~cleared]] = True
+        self.done[games[~cleared]] = True
+        games = games[cleared]
+        self.stage[games] += 1
+        self.level[games] = self.stage[games] // 3 + 1
+        if self.max_stages:
+            self.done[games[self.stage[games] > self.max_stages]] = True
+        self.new_stage(games[~self.done[games]])
+
+    def resolve(self, games):
+        """ Check the boards of games until there are no combinations """
+        while len(games):
+            points = self.check_board(games)
+            self.score[games] += points
+            games = games[points != 0]
+
+    def check_board(self, games):
+        """ Find and remove the first combination of each board like Board.check_board.
+        Return the points of each game, 0 if none was found """
+        cells = self.cells[games]
+        horizontal = pair_relations(cells, 1)
+        vertical = pair_relations(cells, 2)
+        intersects = window_relations(vertical, 3, 2) != 0
+        points = np.zeros(len(games), np.int64)
+        for check in CHECKS:
+            is_horizontal, number_of_cards = check[:2]
+            if is_horizontal:
+                relations = window_relations(horizontal, number_of_cards, 1)
+            else:
+                relations = window_relations(vertical, number_of_cards, 2)
+            found = check[3][relations].reshape(len(games), -1)
+            found[points != 0] = False
+            index = np.flatnonzero(found.any(1))
+            if not len(index):
+                continue
+            # First line in the scan order of Board: column by column, row by row
+            cols, rows = np.divmod(found[index].argmax(1), relations.shape[2])
+            relation = relations[index, cols, rows]
+            if is_horizontal:
+                points[index] = self.remove_horizontal(games[index], cells[index], intersects[index], cols, rows,
+                                                       relation, check)
+            else:
+                points[index] = check[4][relation]
+                for i in range(number_of_cards):
+                    self.cells[games[index], cols, rows + i] = EMPTY
+        return points
+
+    def remove_horizontal(self, games, cells, intersects, cols, rows, relation, check):
+        """ Remove the horizontal lines of a check (see CHECKS) and their intersected columns and scroll down
+        the cards above them. Return the points of each line """
+        is_horizontal, number_of_cards, intersect_columns, scored, line_points, intersect_points, always = check
+        take = np.arange(len(games))
+        intersect_col = np.full(len(games), -1)
+        can_intersect = rows < INTERSECT_ROWS
+        for col in intersect_columns:
+            hit = intersects[take, cols + col, np.minimum(rows, INTERSECT_ROWS - 1)] | always[relation]
+            hit &= can_intersect & (intersect_col < 0)
+            intersect_col[hit] = cols[hit] + col
+        hit = intersect_col >= 0
+        for i in range(1, 3):
+            cells[take[hit], intersect_col[hit], rows[hit] + i] = EMPTY
+        # Rows 0..row of the line columns get the card above them, row 0 gets no card
+        col_index = np.arange(BOARD_COLUMNS)[None, :, None]
+        row_index = np.arange(BOARD_ROWS)[None, None, :]
+        in_line = (col_index >= cols[:, None, None]) & (col_index < (cols + number_of_cards)[:, None, None])
+        source = row_index - (in_line & (row_index <= rows[:, None, None]))
+        padded = np.concatenate([np.full((len(games), BOARD_COLUMNS, 1), EMPTY, np.uint8), cells], axis=2)
+        self.cells[games] = np.take_along_axis(padded, source + 1, 2)
+        return np.where(hit, intersect_points[relation], line_points[relation])
+
+
+def random_policy(batch, rng):
+    """ Rotate the pack of every game a random number of times and choose a random column,
+    like engine.random_policy """
+    return rng.integers(0, batch.hand_len), rng.integers(0, BOARD_COLUMNS, batch.n)
+
+
+def play_games(n, policy=random_policy, seed=None, max_stages=None):
+    """ Play n complete games in lockstep. policy(batch, rng) returns the rotations and the columns
+    of every game for the next step. Return the batch, e.g. batch.score and batch.stage """
+    batch = BatchGame(n, seed, max_stages)
+    rng = np.random.default_rng(None if seed is None else seed + 1)
+    while not batch.done.all():
+        rotations, columns = policy(batch, rng)
+        batch.step(rotations, columns)
+    return batch
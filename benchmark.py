@@ -0,0 +1,272 @@
+""" Drop Card Game benchmarks
+Reproducible benchmarks of the rules, the rendering and the simulation throughput:
+rules   the Board predicates (is_sequence, is_same_*) and every compiled check of the scoring rules
+        (engine.RULE_CHECKS, e.g. check_3_horizontal) on curated boards:
+        empty, dense (full without combinations, every line is checked) and cascade (full, the
+        combination that resolves in the most steps of the boards tried)
+frames  the draw path of the game stage (dropcard.draw_game) with the full and the dirty rects
+        renderers, headless on the SDL dummy video driver
+games   complete headless games per second of the engine boards (on the default board and on a
+        BIG_BOARD, where the cost of the checks must not grow with the size) and of the batch simulator
+
+Boards, games and frames are built from fixed seeds so every run measures the same work.
+Results are written as JSON and can be compared with a baseline file of a previous run, the
+command fails if a result is worse than the baseline by more than the tolerance.
+
+Usage: python benchmark.py --output baseline.json
+       python benchmark.py --baseline baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from engine import Board, BoardLayout, Game, play_game, random_policy, BOARD_COLUMNS, BOARD_ROWS, DECK_SIZE, \
+    RULE_CHECKS
+from bitboard import BitBoard
+
+BOARD_SEED = 2021
+GAME_SEED = 7
+CASCADE_TRIES = 2000
+BIG_BOARD = (20, 30)  # columns, rows of the big board games
+BENCHMARKS = ('rules', 'frames', 'games')
+
+
+def full_board(rng, board_class=Board):
+    """ Return a board filled with random cards """
+    board = board_class()
+    for index, code in enumerate(rng.sample(range(DECK_SIZE), BOARD_COLUMNS * BOARD_ROWS)):
+        board.set_cell(index // BOARD_ROWS, index % BOARD_ROWS, code)
+    return board
+
+
+def cascade_steps(board):
+    """ Return the number of combinations found until board has none """
+    board = board.copy()
+    steps = 0
+    while board.check_board():
+        steps += 1
+    return steps
+
+
+def curated_boards(board_class=Board):
+    """ Return the benchmark boards: empty, dense and cascade """
+    rng = random.Random(BOARD_SEED)
+    dense = None
+    cascade = None
+    cascade_best = 0
+    for i in range(CASCADE_TRIES):
+        board = full_board(rng, board_class)
+        steps = cascade_steps(board)
+        if steps == 0 and dense is None:
+            dense = board
+        elif steps > cascade_best:
+            cascade, cascade_best = board, steps
+    return {'empty': board_class(), 'dense': dense, 'cascade': cascade}
+
+
+def time_per_call(func, args, repeat):
+    """ Return the best time in seconds of a call of func over repeat runs of all the args """
+    best = float('inf')
+    for i in range(repeat):
+        start = time.perf_counter()
+        for arg in args:
+            func(*arg)
+        best = min(best, (time.perf_counter() - start) / len(args))
+    return best
+
+
+def time_check(board, check, number, repeat):
+    """ Return the best time in seconds of a compiled check on copies of board (checks change the board) """
+    best = float('inf')
+    for i in range(repeat):
+        copies = [board.copy() for j in range(number)]
+        start = time.perf_counter()
+        for copy in copies:
+            copy.check_lines(check)
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def bench_rules(number=2000, repeat=5):
+    """ Return the micro benchmarks of the board rules, in microseconds per call """
+    results = {}
+    boards = curated_boards()
+    dense = boards['dense']
+    # Every line of 3 to 5 cards (vertical lines of 3 and 4) of the dense board
+    horizontal = [(col, row, n) for n in (3, 4, 5)
+                  for col in range(BOARD_COLUMNS - n + 1) for row in range(BOARD_ROWS)]
+    vertical = [(col, row, n) for n in (3, 4)
+                for col in range(BOARD_COLUMNS) for row in range(BOARD_ROWS - n + 1)]
+    calls = max(1, number // len(horizontal))
+    predicates = [
+        ('is_sequence_horizontal', dense.is_sequence, [line + (True,) for line in horizontal]),
+        ('is_sequence_vertical', dense.is_sequence, [line + (False,) for line in vertical]),
+        ('is_same_suit_horizontal', dense.is_same_suit_horizontal, horizontal),
+        ('is_same_number_horizontal', dense.is_same_number_horizontal, horizontal),
+        ('is_same_suit_vertical', dense.is_same_suit_vertical, vertical),
+        ('is_same_number_vertical', dense.is_same_number_vertical, vertical),
+    ]
+    for name, func, args in predicates:
+        results['rules.dense.' + name] = time_per_call(func, args * calls, repeat) * 1e6
+    for board_name, board in sorted(boards.items()):
+        for check in RULE_CHECKS:
+            name = 'check_%d_%s' % (check[1], 'horizontal' if check[0] else 'vertical')
+            results['rules.%s.%s' % (board_name, name)] = time_check(board, check, number, repeat) * 1e6
+    # check_board until there are no combinations left, on a copy of the board
+    for board_class in (Board, BitBoard):
+        for board_name, board in sorted(curated_boards(board_class).items()):
+            results['rules.%s.%s.resolve' % (board_name, board_class.__name__)] = time_per_call(
+                cascade_steps, [(board,)] * (number // 4), repeat) * 1e6
+    return dict((name, (value, 'us', 'lower')) for name, value in results.items())
+
+
+def bench_frames(frames=600):
+    """ Return the frame times of the game stage draw path in milliseconds: mean and 95th percentile """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    import assets
+    import dropcard
+    from render import FullRenderer, DirtyRenderer
+    from timeline import Timeline
+    if dropcard.win is None:
+        dropcard.init()
+    card_images = assets.load_card_images()
+    results = {}
+    for name, renderer_class in (('full', FullRenderer), ('dirty', DirtyRenderer)):
+        rng = random.Random(GAME_SEED)
+        game = Game(seed=GAME_SEED)
+        game.new_stage()
+        hud = dropcard.game_hud()
+        renderer = renderer_class(dropcard.win, hud.surface)
+        timeline = Timeline()
+        played_card = None
+        times = []
+        for frame in range(frames):
+            # One game tick per frame: the card falls at the fast speed
+            if game.game_over:
+                game = Game(seed=GAME_SEED + frame)
+                game.new_stage()
+            elif game.stage_cleared:
+                game.new_stage()
+            if game.active_card and game.active_card is not played_card:
+                played_card = game.active_card
+                random_policy(game, rng)
+            game.tick()
+            del game.events[:]
+            start = time.perf_counter()
+            dropcard.draw_game(renderer, hud, game, card_images, game.active_card.y if game.active_card else 0,
+                               timeline)
+            renderer.end()
+            times.append(time.perf_counter() - start)
+        times.sort()
+        results['frames.%s.mean' % name] = (sum(times) / len(times) * 1e3, 'ms', 'lower')
+        results['frames.%s.p95' % name] = (times[int(0.95 * len(times))] * 1e3, 'ms', 'lower')
+    return results
+
+
+def bench_games(games=200, batch_games=5000, repeat=3, big_games=50):
+    """ Return the complete games per second (best of repeat runs) of the engine boards, on the default board
+    and on a BIG_BOARD, and of the batch simulator """
+    def best_rate(play, number):
+        best = float('inf')
+        for i in range(repeat):
+            start = time.perf_counter()
+            play()
+            best = min(best, time.perf_counter() - start)
+        return number / best
+
+    def play_games(board_class, number=games, layout=None):
+        for seed in range(number):
+            rng = random.Random(seed)
+            play_game(lambda game: random_policy(game, rng), board_class=board_class, seed=seed, layout=layout)
+
+    results = {}
+    big_layout = BoardLayout(*BIG_BOARD)
+    for board_class in (Board, BitBoard):
+        results['games.%s' % board_class.__name__] = (best_rate(lambda: play_games(board_class), games),
+                                                     'games/s', 'higher')
+        results['games.%s.%dx%d' % ((board_class.__name__,) + BIG_BOARD)] = (
+            best_rate(lambda: play_games(board_class, big_games, big_layout), big_games), 'games/s', 'higher')
+    try:
+        import batch
+    except ImportError:
+        return results
+    results['games.batch'] = (best_rate(lambda: batch.play_games(batch_games, seed=GAME_SEED), batch_games),
+                              'games/s', 'higher')
+    return results
+
+
+def environment():
+    """ Return the versions of the benchmark environment """
+    info = {'python': platform.python_version(), 'implementation': platform.python_implementation(),
+            'machine': platform.machine(), 'system': platform.system()}
+    for module in ('pygame', 'numpy'):
+        try:
+            info[module] = __import__(module).__version__
+        except ImportError:
+            pass
+    return info
+
+
+def compare(results, baseline, tolerance):
+    """ Return the comparison of results with baseline results: (name, baseline value, value, change, regression)
+    of every result of both. change is the relative change, regression is True if it is worse than tolerance """
+    rows = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        value, base = results[name]['value'], baseline[name]['value']
+        change = value / base - 1 if base else 0.0
+        worse = change if results[name]['better'] == 'lower' else -change
+        rows.append((name, base, value, change, worse > tolerance))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the Drop Card Game benchmarks')
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=BENCHMARKS,
+                        help='benchmarks to run, all by default')
+    parser.add_argument('--output', metavar='FILE', help='write the results as JSON to FILE')
+    parser.add_argument('--baseline', metavar='FILE', help='compare with the results of a previous run')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='relative change over the baseline reported as a regression (default 0.15)')
+    parser.add_argument('--quick', action='store_true', help='fewer iterations, for a smoke run')
+    args = parser.parse_args(argv)
+    # Assets are loaded relative to the game directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    results = {}
+    if 'rules' in args.only:
+        results.update(bench_rules(200 if args.quick else 2000, 2 if args.quick else 5))
+    if 'frames' in args.only:
+        results.update(bench_frames(60 if args.quick else 600))
+    if 'games' in args.only:
+        results.update(bench_games(20 if args.quick else 200, 500 if args.quick else 5000, 1 if args.quick else 3,
+                                   5 if args.quick else 50))
+    results = dict((name, {'value': value, 'unit': unit, 'better': better})
+                   for name, (value, unit, better) in results.items())
+    for name in sorted(results):
+        print('%-50s %12.3f %s' % (name, results[name]['value'], results[name]['unit']))
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({'environment': environment(), 'results': results}, output_file, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        rows = compare(results, baseline, args.tolerance)
+        print('\n%-50s %12s %12s %8s' % ('compared with ' + args.baseline, 'baseline', 'now', 'change'))
+        for name, base, value, change, regression in rows:
+            print('%-50s %12.3f %12.3f %+7.1f%%%s' % (name, base, value, change * 100,
+                                                       '  REGRESSION' if regression else ''))
+        regressions = [row for row in rows if row[4]]
+        if regressions:
+            print('%d regressions over %.0f%%' % (len(regressions), args.tolerance * 100))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+""" Drop Card Game bot
+A player that searches the pack rotations and the columns of the active card with expectimax.
+Max nodes choose a rotation and a column, chance nodes average over the cards that may be
+drawn from the remaining deck (a sample of them, to bound the search). The search deepens
+one drop at a time until depth or the time budget is reached and plays the best choice of
+the deepest finished search. Choices are ordered by their immediate value and only the
+best width choices of a node are searched deeper. Drops (with their resolved combinations) and
+node values are cached in transposition tables, which are kept from one choice to the next.
+
+The bot can play headless (engine.play_game(Bot().play)) or in the game window (dropcard.py --autoplay).
+"""
+import random
+import time
+from engine import Board, BOARD_COLUMNS, BOARD_ROWS, EMPTY, CARD_SUIT, CARD_NUMBER, DECK_SIZE, DECK_SIZE_PER_SUIT
+from transposition import TranspositionTable, CARD_KEYS, LEVEL_KEY, cards_key, drop_keys, pack_key
+
+# Evaluation weights
+HEIGHT_WEIGHT = 6  # per squared column height
+CARD_WEIGHT = 20  # per card on the board, each one costs a penalty at the end of the stage
+PAIR_WEIGHT = 8  # per pair of related neighbour cards, they may become a combination
+GAME_OVER_VALUE = -1000000
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def related(code, other):
+    """ Return True if two cards have the same suit, the same number or continuing numbers """
+    return (CARD_SUIT[code] == CARD_SUIT[other] or
+            (CARD_NUMBER[code] - CARD_NUMBER[other]) % DECK_SIZE_PER_SUIT in (0, 1, DECK_SIZE_PER_SUIT - 1))
+
+
+# RELATED[code << 8 | other] is 1 if the cards are related, 0 if not or if any of them is EMPTY
+RELATED = bytearray(1 << 16)
+for _code in range(DECK_SIZE):
+    for _other in range(DECK_SIZE):
+        RELATED[_code << 8 | _other] = related(_code, _other)
+EMPTY_BYTE = bytes([EMPTY])
+
+
+def neighbour_cells(columns, rows):
+    """ Return the board cell index pairs of the neighbour cells of a board: below and on the right """
+    return ([(col * rows + row, col * rows + row + 1) for col in range(columns) for row in range(rows - 1)] +
+            [(col * rows + row, (col + 1) * rows + row) for col in range(columns - 1) for row in range(rows)])
+
+
+NEIGHBOURS = neighbour_cells(BOARD_COLUMNS, BOARD_ROWS)
+
+
+def evaluate(board, neighbours=NEIGHBOURS):
+    """ Return the heuristic value of a board. neighbours are the neighbour cells of its size """
+    cells = board.cells
+    rows = board.layout.rows
+    value = -CARD_WEIGHT * (len(cells) - cells.count(EMPTY))
+    value += PAIR_WEIGHT * sum([RELATED[cells[a] << 8 | cells[b]] for a, b in neighbours])
+    for index in range(0, len(cells), rows):
+        height = len(cells[index:index + rows].lstrip(EMPTY_BYTE))
+        value -= HEIGHT_WEIGHT * height * height
+    return value
+
+
+def stage_end_points(board, level):
+    """ Return the bonus or penalty points of the end of the stage """
+    cards = len(board.cells) - board.cells.count(EMPTY)
+    if not cards:
+        return 1000 + (level - 1) * 100
+    return -100 * level * cards
+
+
+def reachable_columns(game):
+    """ Return the columns the active card of game can move to from its row: any column above the board, only
+    the columns up to a card on its row once it is on the board (e.g. in a restored game). Cards may float over
+    gaps left by intersect removals, so a card on the board lands from its row (see Bot.land), not from the top """
+    card = game.active_card
+    cells = game.board.cells
+    rows = game.layout.rows
+    if card.board_y == -1:
+        return list(range(game.layout.columns))
+    first = last = card.x
+    while first > 0 and cells[(first - 1) * rows + card.board_y] == EMPTY:
+        first -= 1
+    while last < game.layout.columns - 1 and cells[(last + 1) * rows + card.board_y] == EMPTY:
+        last += 1
+    return list(range(first, last + 1))
+
+
+class Bot(object):
+    """ depth is the number of drops searched, time_budget the search time in seconds of a choice,
+    width the number of choices of a node searched deeper and samples the number of deck cards
+    a chance node averages over. The search runs on boards of board_class. The transposition tables
+    have 2 ** table_bits entries """
+    def __init__(self, depth=2, time_budget=0.008, width=5, samples=3, rng=None, board_class=Board,
+                 table_bits=12):
+        self.depth = depth
+        self.time_budget = time_budget
+        self.width = width
+        self.samples = samples
+        self.rng = rng if rng is not None else random.Random()
+        self.board_class = board_class
+        self.deadline = None
+        self.landings = TranspositionTable(table_bits)
+        self.values = TranspositionTable(table_bits)
+        self.nodes = 0
+        # The neighbour cells and the drop keys of the board size of the game played
+        self.layout = None
+        self.neighbours = NEIGHBOURS
+        self.drop_keys = drop_keys(BOARD_COLUMNS)
+
+    def land(self, board, code, col, start_row=0):
+        """ Return the board after code is dropped on col from start_row (as Game.drop drops a card on the board),
+        the points of its combinations and the value of the drop (points and board evaluation).
+        Return None, 0, GAME_OVER_VALUE if the column is full """
+        layout = board.layout
+        # Only the drops from the top are cached, the drops from a row are the few root choices of a restored card
+        key = board.zobrist ^ self.drop_keys[code * layout.columns + col]
+        result = self.landings.get(key) if start_row == 0 else None
+        if result is None:
+            cells = board.cells
+            row = start_row
+            while row < layout.rows and cells[col * layout.rows + row] == EMPTY:
+                row += 1
+            if row == start_row:
+                result = None, 0, GAME_OVER_VALUE
+            else:
+                board = board.copy()
+                board.set_cell(col, row - 1, code)
+                points = total = board.check_board()
+                while points:
+                    points = board.check_board()
+                    total += points
+                result = board, total, total + evaluate(board, self.neighbours)
+            if start_row == 0:
+                self.landings.put(key, result)
+        return result
+
+    def best_drop(self, board, code):
+        """ Return the value of the best column to drop code on """
+        key = board.zobrist ^ CARD_KEYS[code]
+        value = self.values.get(key, 1)
+        if value is None:
+            value = max([self.land(board, code, col)[2] for col in range(board.layout.columns)])
+            self.values.put(key, value, 1)
+        return value
+
+    def choices(self, board, hand, columns=None, start_row=0):
+        """ Return the choices of a hand (the pack cards and the active card) ordered by their immediate value:
+        (value, rotations, column, board, points, pack). rotations is the number of clockwise rotations.
+        The active card is dropped from start_row on columns (all the columns of the board if None) """
+        self.nodes += 1
+        if time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        choices = []
+        for rotations in range(len(hand)):
+            rotated = hand[len(hand) - rotations:] + hand[:len(hand) - rotations]
+            for col in columns if columns is not None else range(board.layout.columns):
+                new_board, points, value = self.land(board, rotated[-1], col, start_row)
+                choices.append((value, rotations, col, new_board, points, rotated[:-1]))
+        choices.sort(key=lambda choice: -choice[0])
+        return choices
+
+    def value(self, board, hand, deck, deck_key, depth, level):
+        """ Return the expectimax value of the best choice of hand. deck_key is the key of the deck cards """
+        if depth == 1:
+            # The order of the pack and the deck don't matter on the last drop, only the cards that can be played
+            key = board.zobrist ^ cards_key(hand)
+        else:
+            key = board.zobrist ^ pack_key(hand) ^ deck_key ^ level * LEVEL_KEY
+        value = self.values.get(key, depth)
+        if value is not None:
+            return value
+        if depth == 1:
+            if time.perf_counter() > self.deadline:
+                raise SearchTimeout()
+            self.nodes += 1
+            value = max([self.best_drop(board, code) for code in hand])
+        else:
+            choices = self.choices(board, hand)
+            if choices[0][0] == GAME_OVER_VALUE:
+                value = choices[0][0]
+            else:
+                value = max(self.expected(choice, deck, deck_key, depth - 1, level) for choice in choices[:self.width])
+        self.values.put(key, value, depth)
+        return value
+
+    def expected(self, choice, deck, deck_key, depth, level):
+        """ Return the value of a choice averaged over the next deck card """
+        value, rotations, col, board, points, pack = choice
+        if board is None:
+            return GAME_OVER_VALUE
+        if not pack:
+            return points + stage_end_points(board, level)
+        if not deck:
+            return points + self.value(board, pack, deck, deck_key, depth, level)
+        cards = deck if len(deck) <= self.samples else self.rng.sample(deck, self.samples)
+        total = 0
+        for card in cards:
+            rest = deck[:]
+            rest.remove(card)
+            total += self.value(board, [card] + pack, rest, deck_key ^ CARD_KEYS[card], depth, level)
+        return points + float(total) / len(cards)
+
+    def choose(self, game):
+        """ Return the rotations (clockwise) and the column to play the active card of game """
+        hand = game.pack.cards + [game.active_card.code]
+        deck = game.deck.cards
+        layout = game.board.layout
+        if layout is not self.layout:
+            self.layout = layout
+            self.neighbours = neighbour_cells(layout.columns, layout.rows)
+            self.drop_keys = drop_keys(layout.columns)
+            # Boards of different layouts may have the same key (the empty boards all have key 0)
+            self.landings.clear()
+            self.values.clear()
+        board = self.board_class(layout=layout)
+        for index, code in enumerate(game.board.cells):
+            if code != EMPTY:
+                board.set_cell(index // layout.rows, index % layout.rows, code)
+        # The game board has no combinations left, only the cards dropped by the search can make them
+        board.dirty = 0
+        columns = reachable_columns(game)
+        start_row = max(game.active_card.board_y, 0)
+        deck_key = cards_key(deck)
+        self.deadline = time.perf_counter() + self.time_budget
+        self.landings.new_search()
+        self.values.new_search()
+        self.nodes = 0
+        # The first drop is searched without a deadline so that there is always a choice
+        deadline, self.deadline = self.deadline, float('inf')
+        best = self.choices(board, hand, columns, start_row)[0]
+        self.deadline = deadline
+        for depth in range(2, self.depth + 1):
+            try:
+                choices = self.choices(board, hand, columns, start_row)
+                best = max(choices[:self.width],
+                           key=lambda choice: self.expected(choice, deck, deck_key, depth - 1, game.level))
+            except SearchTimeout:
+                break
+        return best[1], best[2]
+
+    def play(self, game):
+        """ Rotate the pack and move the active card of game to the chosen column. Use it as a play_game policy """
+        rotations, col = self.choose(game)
+        for i in range(rotations):
+            game.rotate_clockwise()
+        # A move fails only if the column can't be reached, which choose() doesn't choose
+        for i in range(game.active_card.x - col):
+            game.move_left()
+        for i in range(col - game.active_card.x):
+            game.move_right()
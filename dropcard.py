@@ -8,184 +8,53 @@ Info:
 Suits: H (Hearts), D (Diamonds), S (Spades), C (Clubs)
 Numbers: 1 (Ace), 2-10, 11 (Jack), 12 (Queen), 13 (King)
 """
+import argparse
 import os
-import random
+import time
 import pygame
+import assets
+from audio import AudioManager
+from bot import Bot
+from engine import Game, BOARD_COLUMNS, BOARD_ROWS, EMPTY, GAME_SPEED_NORMAL, STEPS_PER_ROW, EVENT_PLACE, \
+    EVENT_COMBINATION, EVENT_REMOVE, EVENT_BONUS, EVENT_PENALTY, SEED_BITS
+from hud import TextCache, Hud
+from profiler import FrameProfiler
+from render import FullRenderer, DirtyRenderer
+from replay import Replay, ReplayPlayer, apply_input, INPUT_LEFT, INPUT_RIGHT, INPUT_ROTATE_CLOCKWISE, \
+    INPUT_ROTATE_COUNTERCLOCKWISE, INPUT_QUIT
+from scores import ScoreLog, game_record
+import snapshot
+from timeline import Timeline
 
 # Game Parameters
 GAME_WIDTH = 800
 GAME_HEIGHT = 730
-GAME_SPEED_NORMAL = 10
-GAME_SPEED_FAST = 60
 BOARD_ZERO_X = 60
 BOARD_ZERO_Y = 200
 CARD_WIDTH = 85
 CARD_HEIGHT = 100
-ACTIVE_CARD_START_X = (CARD_WIDTH * 2) + BOARD_ZERO_X  # 230
-ACTIVE_CARD_START_Y = 60
-CARDS_IN_PACK = 3
-STEP = 10
-DECK_NUM_START = 1
-DECK_NUM_STOP = 13
-DECK_SUITS = ['H', 'D', 'C', 'S']
+STEP = CARD_HEIGHT // STEPS_PER_ROW  # pixels per engine fall step
+RENDER_FPS = 60  # frames per second drawn, independent of the game speed
+MAX_FRAME_TIME = 250  # ms of game time simulated at most per frame
+REMOVE_EFFECT_TIME = 80  # ms the removal effect is shown on a removed card
+CLEAR_CARD_TIME = 100  # ms the game holds after each remaining card is cleared at the end of a stage
+INTRO_STAGE_TIME = 1500  # ms the stage number is shown
+PROFILER_KEYS = (pygame.K_F3, pygame.K_F4)
+# Player inputs of the keys (pressed once)
+KEY_INPUTS = {pygame.K_LEFT: INPUT_LEFT, pygame.K_RIGHT: INPUT_RIGHT, pygame.K_LCTRL: INPUT_ROTATE_CLOCKWISE,
+              pygame.K_LALT: INPUT_ROTATE_COUNTERCLOCKWISE}
 
 
-# Game classes
-class Card(object):
-    def __init__(self, suit, number, image, x=ACTIVE_CARD_START_X, y=ACTIVE_CARD_START_Y):
-        self.suit = suit
-        self.number = number
-        self.image = image
-        self.x = x
-        self.y = y
-        self.board_x = 2
-        self.board_y = -1
-        self.limit = False
-        self.is_at_bottom = False
-
-    def __del__(self):
-        """ Display effect image on card removal """
-        if not (game_over or activeCard):
-            self.image = remove_card_image
-            win.blit(self.image, (self.x, self.y))
-            pygame.display.update()
-            if not clearing_the_stage:
-                pygame.time.delay(80)
-
-    def draw(self):
-        """ Draw cards on board """
-        self.set_card_board_coord()
-        win.blit(self.image, (self.x, self.y))
-
-    def set_card_board_coord(self):
-        """ Set board array index for cards according with card's position """
-        self.board_x = (self.x - BOARD_ZERO_X) // CARD_WIDTH
-        self.board_y = (self.y - BOARD_ZERO_Y + CARD_HEIGHT - STEP) // CARD_HEIGHT
-        pos_y_limit = (self.y - BOARD_ZERO_Y + CARD_HEIGHT) // CARD_HEIGHT
-        if pos_y_limit > self.board_y:
-            self.limit = True  # Card is in lower possible place (limit) on current row
-        else:
-            self.limit = False
+# Game fonts, loaded on first use
+def game_font():
+    return assets.font('postnobillscolombo-semibold.ttf', 32)
 
-    def can_move_down(self, board):
-        """ return True if cards can move down else return False """
-        # Εάν δεν είναι στο όριο τότε μπορεί να κινηθεί προς τα κάτω
-        if not self.limit:
-            return True
-        else:
-            # Εάν είναι στο όριο τότε:
-            # α. ελέγχουμε αν έχει φτάσει στον πάτο της πίστας
-            if self.board_y == 4:
-                self.is_at_bottom = True
-                return False
-            # β. ελέγχουμε αν έχει απο κάτω άλλο χαρτί
-            elif board.grid[self.board_x][self.board_y + 1] is not None:
-                return False
-            else:
-                return True
-
-    def can_move_left(self, board):
-        """ return True if cards can move left else return False """
-        if self.x > BOARD_ZERO_X:
-            if self.board_y == -1 or board.grid[self.board_x - 1][self.board_y] is None:
-                return True
-        return False
-
-    def can_move_right(self, board):
-        """ return True if cards can move right else return False """
-        if self.x < 400:  # CARD_WIDTH * 4 + BOARD_ZERO_X
-            if self.board_y == -1 or board.grid[self.board_x + 1][self.board_y] is None:
-                return True
-        return False
-
-    def relocate(self, new_board_x, new_board_y, board):
-        """ Relocate cards on board """
-        # Remove from old board position
-        board.grid[self.board_x][self.board_y] = None
-        # set card's new x, y
-        self.x = new_board_x * CARD_WIDTH + BOARD_ZERO_X
-        self.y = new_board_y * CARD_HEIGHT + BOARD_ZERO_Y
-        # set card's new board_x, board_y coordinates
-        self.board_x = new_board_x
-        self.board_y = new_board_y
-        # Place cards in new board position
-        board.grid[new_board_x][new_board_y] = self
-
-
-class Deck(object):
-    def __init__(self):
-        self.cards = []
-        self.populate(DECK_SUITS, DECK_NUM_START, DECK_NUM_STOP)
-
-    def populate(self, suits, num_start, num_stop):
-        """ Populate Deck """
-        for cardSuit in suits:
-            for cardNumber in range(num_start, num_stop + 1):
-                card_img = pygame.image.load(os.path.join('data', 'images', cardSuit + '-' + str(cardNumber) + '.png'))
-                self.cards.append(Card(cardSuit, cardNumber, card_img))
-
-    def get_one_card(self):
-        """ Return a random cards from the deck """
-        next_card = random.randrange(0, len(self.cards))
-        if len(self.cards):
-            return self.cards.pop(next_card)
-        else:
-            return False
-
-
-class Pack(object):
-    def __init__(self, number_of_cards, deck):
-        self.number_of_cards = number_of_cards
-        self.cards = []
-        self.deck = deck
-        self.populate()
-
-    def populate(self):
-        for x in range(self.number_of_cards):
-            self.cards.append(self.deck.get_one_card())
-
-    def rotate_clockwise(self):
-        """ Αλλάζει την ενεργή κάρτα δεξιόστροφα """
-        global activeCard
-        # Rotate only if cards has cards(s)
-        if len(self.cards) > 0:
-            # backup activeCard x, y
-            last_x = activeCard.x
-            last_y = activeCard.y
-            # Insert the activeCard at position 0
-            self.cards.insert(0, activeCard)
-            # set as activeCard the last cards of cards list
-            activeCard = self.cards.pop()
-            # restore activeCard x, y
-            activeCard.x = last_x
-            activeCard.y = last_y
-
-    def rotate_counterclockwise(self):
-        """ Αλλάζει την ενεργή κάρτα αριστερόστροφα """
-        global activeCard
-        # Rotate only if cards has cards(s)
-        if len(self.cards) > 0:
-            # backup activeCard x, y
-            last_x = activeCard.x
-            last_y = activeCard.y
-            # Insert the activeCard at the end
-            self.cards.append(activeCard)
-            # set as activeCard the first cards of cards list
-            activeCard = self.cards.pop(0)
-            # restore activeCard x, y
-            activeCard.x = last_x
-            activeCard.y = last_y
-
-    def draw(self):
-        pack_x = 170
-        pack_y = 30
-        pack_x_step = 30
-        for num in range(len(self.cards)):
-            self.cards[num].x = pack_x + (num * pack_x_step)
-            self.cards[num].y = pack_y
-            self.cards[num].draw()
+
+def reward_font():
+    return assets.font('postnobillscolombo-bold.ttf', 72)
 
 
+# Game classes
 class Reward(object):
     def __init__(self, col, row, value, color=(230, 230, 0)):
         self.col = col
@@ -195,9 +64,12 @@ class Reward(object):
         self.x = self.col * CARD_WIDTH + BOARD_ZERO_X
         self.y = self.row * CARD_HEIGHT + BOARD_ZERO_Y
 
-    def draw(self):
-        value_label = rewardFont.render(str(self.value), 1, self.color)
-        win.blit(value_label, (self.x, self.y))
+    def draw(self, target):
+        value_label = text_cache.render(reward_font(), str(self.value), self.color)
+        target.blit(value_label, (self.x, self.y))
+
+    def update(self):
+        """ Called on every game tick """
         # Move up until top of screen then remove self
         if self.y > -0:
             self.y -= 50
@@ -205,509 +77,226 @@ class Reward(object):
             rewards.pop(rewards.index(self))
 
 
-class Board(object):
-    def __init__(self):
-        self.grid = []
-        self.initialize()
-
-    def initialize(self):
-        """ Fill board 5x5 array with None """
-        for i in range(5):
-            self.grid.append([None, None, None, None, None])
-
-    def draw(self):
-        for i in range(5):
-            for j in range(5):
-                if self.grid[i][j] is not None:
-                    self.grid[i][j].draw()
-
-    def remove_and_scroll_down(self, col, row, columns):
-        # remove cards
-        for i in range(columns):
-            self.grid[col + i][row] = None
-        # scroll down the above cards
-        for x in range(col, col + columns):
-            for y in range(row - 1, -1, -1):
-                if self.grid[x][y]:
-                    self.grid[x][y].relocate(x, y + 1, self)
-
-    def check_board(self):
-        """ Game Logic. Check board for combinations """
-        """ Return True if combination found, card rearranged and need recheck, False otherwise """
-        if self.check_5_horizontal():
-            soundRemoveCards.play()
-            return True
-        elif self.check_4_horizontal():
-            soundRemoveCards.play()
-            return True
-        elif self.check_4_vertical():
-            soundRemoveCards.play()
-            return True
-        elif self.check_3_horizontal():
-            soundRemoveCards.play()
-            return True
-        elif self.check_3_vertical():
-            soundRemoveCards.play()
-            return True
-        return False
-
-    def check_5_horizontal(self):
-        """ Check 5 same suit horizontal """
-        global score
-        for row in range(5):
-            if self.grid[0][row] and self.grid[1][row] and self.grid[2][row] and self.grid[3][row] and \
-                    self.grid[4][row]:
-                if self.is_sequence(0, row, 5, True) and self.is_same_suit_horizontal(0, row, 5):
-                    # Found 5 sequence and same suit horizontal
-                    # Check for intersect on center column
-                    # row must be < 3 so that a 3 card column may exist
-                    if row < 3 and (self.is_same_number_vertical(2, row, 3) or
-                                    self.is_same_suit_vertical(2, row, 3) or
-                                    self.is_sequence(2, row, 3, True)):
-                        # Intersect Found
-                        points = 6000
-                        # remove intersected column
-                        for i in range(1, 3):
-                            self.grid[2][row + i] = None
-                    else:
-                        points = 2000
-                    score += points
-                    rewards.append(Reward(0, row, points))
-                    self.remove_and_scroll_down(0, row, 5)
-                    return True
-                elif self.is_sequence(0, row, 5, True):
-                    # Found 5 sequence horizontal
-                    # Check for intersect on center column
-                    if row < 3 and (self.is_same_number_vertical(2, row, 3)
-                                    or self.is_same_suit_vertical(2, row, 3)
-                                    or self.is_sequence(2, row, 3, False)):
-                        # Intersect Found
-                        points = 2000
-                        # remove intersected column
-                        for i in range(1, 3):
-                            self.grid[2][row + i] = None
-                    else:
-                        points = 500
-                    score += points
-                    rewards.append(Reward(0, row, points))
-                    self.remove_and_scroll_down(0, row, 5)
-                    return True
-                elif self.is_same_suit_horizontal(0, row, 5):
-                    # Found 5 same suit horizontal
-                    # Check for intersect on center column
-                    if row < 3 and (self.is_same_number_vertical(2, row, 3)
-                                    or self.is_same_suit_vertical(2, row, 3)
-                                    or self.is_sequence(2, row, 3, False)):
-                        # Intersect Found
-                        points = 1000
-                        # remove intersected column 2 cards. The 3rd will be removed with the intersected line)
-                        for i in range(1, 3):
-                            self.grid[2][row + i] = None
-                    else:
-                        points = 300
-                    score += points
-                    rewards.append(Reward(0, row, points))
-                    self.remove_and_scroll_down(0, row, 5)
-                    return True
-        return False
-
-    def check_4_horizontal(self):
-        """ Check 4 same suit horizontal """
-        global score
-        for col in range(2):
-            for row in range(5):
-                if self.grid[col][row] and self.grid[col + 1][row] and self.grid[col + 2][row] and \
-                        self.grid[col + 3][row]:
-                    if self.is_sequence(col, row, 4, True) and self.is_same_suit_horizontal(col, row, 4):
-                        # Found 4 sequence and same suit horizontal
-                        # Check for intersect in middle columns
-                        # row must be < 3 so that a 3 card column may exist
-                        if row < 3 and (self.is_same_number_vertical(col + 1, row, 3) or
-                                        self.is_same_suit_vertical(col + 1, row, 3) or
-                                        self.is_sequence(col + 1, row, 3, False)):
-                            # Intersect Found on left side of four
-                            points = 3000
-                            # remove intersected column
-                            for i in range(1, 3):
-                                self.grid[col + 1][row + i] = None
-                        elif row < 3 and (self.is_same_number_vertical(col + 2, row, 3) or
-                                          self.is_same_suit_vertical(col + 2, row, 3) or
-                                          self.is_sequence(col + 2, row, 3, False)):
-                            # Intersect Found on right side of four
-                            points = 3000
-                            # remove intersected column
-                            for i in range(1, 3):
-                                self.grid[col + 2][row + i] = None
-                        else:
-                            points = 1000
-                        score += points
-                        rewards.append(Reward(col, row, points))
-                        self.remove_and_scroll_down(col, row, 4)
-                        return True
-                    elif self.is_same_number_horizontal(col, row, 4):
-                        # Found 4 same number horizontal
-                        # Check for intersect in middle columns
-                        if row < 3 and (self.is_same_number_vertical(col + 1, row, 3) or
-                                        self.is_same_suit_vertical(col + 1, row, 3) or
-                                        self.is_sequence(col + 1, row, 3, False)):
-                            # Intersect Found on left side of four
-                            points = 1500
-                            # remove intersected column
-                            for i in range(1, 3):
-                                self.grid[col + 1][row + i] = None
-                        elif row < 3 and (self.is_same_number_vertical(col + 2, row, 3) or
-                                          self.is_same_suit_vertical(col + 2, row, 3) or
-                                          self.is_sequence(col + 2, row, 3, False)):
-                            # Intersect Found on right side of four
-                            points = 1500
-                            # remove intersected column
-                            for i in range(1, 3):
-                                self.grid[col + 2][row + i] = None
-                        else:
-                            points = 500
-                        score += points
-                        rewards.append(Reward(col, row, points))
-                        self.remove_and_scroll_down(col, row, 4)
-                        return True
-                    elif self.is_sequence(col, row, 4, True):
-                        # Found 4 sequence horizontal
-                        # Check for intersect in middle columns
-                        if row < 3 and (self.is_same_number_vertical(col + 1, row, 3) or
-                                        self.is_same_suit_vertical(col + 1, row, 3) or
-                                        self.is_sequence(col + 1, row, 3, False)):
-                            # Intersect Found on left side of four
-                            points = 1000
-                            # remove intersected column
-                            for i in range(1, 3):
-                                self.grid[col + 1][row + i] = None
-                        elif row < 3 and (self.is_same_number_vertical(col + 2, row, 3) or
-                                          self.is_same_suit_vertical(col + 2, row, 3) or
-                                          self.is_sequence(col + 2, row, 3, False)):
-                            # Intersect Found on right side of four
-                            points = 1000
-                            # remove intersected column
-                            for i in range(1, 3):
-                                self.grid[col + 2][row + i] = None
-                        else:
-                            points = 300
-                        score += points
-                        rewards.append(Reward(col, row, points))
-                        self.remove_and_scroll_down(col, row, 4)
-                        return True
-                    elif self.is_same_suit_horizontal(col, row, 4):
-                        # Found 4 same suit horizontal
-                        # Check for intersect in middle columns
-                        if row < 3 and (self.is_same_number_vertical(col + 1, row, 3) or
-                                        self.is_same_suit_vertical(col + 1, row, 3) or
-                                        self.is_sequence(col + 1, row, 3, False)):
-                            # Intersect Found on left side of four
-                            points = 500
-                            # remove intersected column
-                            for i in range(1, 3):
-                                self.grid[col + 1][row + i] = None
-                        elif row < 3 and (self.is_same_number_vertical(col + 2, row, 3) or
-                                          self.is_same_suit_vertical(col + 2, row, 3) or
-                                          self.is_sequence(col + 2, row, 3, False)):
-                            # Intersect Found on right side of four
-                            points = 500
-                            # remove intersected column
-                            for i in range(1, 3):
-                                self.grid[col + 2][row + i] = None
-                        else:
-                            points = 100
-                        score += points
-                        rewards.append(Reward(col, row, points))
-                        self.remove_and_scroll_down(col, row, 4)
-                        return True
-        return False
-
-    def check_4_vertical(self):
-        """ Check 4 same suit vertical """
-        global score
-        for col in range(5):
-            for row in range(2):
-                if self.grid[col][row] and self.grid[col][row + 1] and self.grid[col][row + 2] and \
-                        self.grid[col][row + 3]:
-                    if self.is_sequence(col, row, 4, False) and self.is_same_suit_vertical(col, row, 4):
-                        # Found 4 sequence and same suit vertical
-                        points = 1000
-                        score += points
-                        rewards.append(Reward(col, row, points))
-                        # remove cards
-                        for i in range(0, 4):
-                            self.grid[col][row + i] = None
-                        return True
-                    elif self.is_same_number_vertical(col, row, 4):
-                        # Found 4 same suit vertical
-                        points = 500
-                        score += points
-                        rewards.append(Reward(col, row, points))
-                        # remove cards
-                        for i in range(0, 4):
-                            self.grid[col][row + i] = None
-                        return True
-                    elif self.is_sequence(col, row, 4, False):
-                        # Found 4 sequence vertical
-                        points = 300
-                        score += points
-                        rewards.append(Reward(col, row, points))
-                        # remove cards
-                        for i in range(0, 4):
-                            self.grid[col][row + i] = None
-                        return True
-                    elif self.is_same_suit_vertical(col, row, 4):
-                        # Found 4 same suit vertical
-                        points = 100
-                        score += points
-                        rewards.append(Reward(col, row, points))
-                        # remove cards
-                        for i in range(0, 4):
-                            self.grid[col][row + i] = None
-                        return True
-        return False
-
-    def check_3_horizontal(self):
-        """ Check 3 same suit horizontal """
-        global score
-        for col in range(3):
-            for row in range(5):
-                if self.grid[col][row] and self.grid[col + 1][row] and self.grid[col + 2][row]:
-                    # Found 3 horizontal cards
-                    if self.is_sequence(col, row, 3, True) and self.is_same_suit_horizontal(col, row, 3):
-                        # Found 3 sequence and same suit horizontal
-                        # Check for intersect in either of 3 columns
-                        # row must be < 3 so that a 3 card column may exist
-                        if row < 3 and (self.is_same_number_vertical(col, row, 3) or
-                                        self.is_same_suit_vertical(col, row, 3) or
-                                        self.is_sequence(col, row, 3, False)):
-                            # Intersect Found on left side of four
-                            points = 1500
-                            # remove intersected column
-                            for i in range(1, 3):
-                                self.grid[col][row + i] = None
-                        elif row < 3 and (self.is_same_number_vertical(col + 1, row, 3) or
-                                          self.is_same_suit_vertical(col + 1, row, 3) or
-                                          self.is_sequence(col + 1, row, 3, False)):
-                            # Intersect Found on right side of four
-                            points = 1500
-                            # remove intersected column
-                            for i in range(1, 3):
-                                self.grid[col + 1][row + i] = None
-                        elif row < 3 and (self.is_same_number_vertical(col + 2, row, 3) or
-                                          self.is_same_suit_vertical(col + 2, row, 3) or
-                                          self.is_sequence(col + 2, row, 3, False)):
-                            # Intersect Found on right side of four
-                            points = 1500
-                            # remove intersected column
-                            for i in range(1, 3):
-                                self.grid[col + 2][row + i] = None
-                        else:
-                            points = 500
-                        score += points
-                        rewards.append(Reward(col, row, points))
-                        self.remove_and_scroll_down(col, row, 3)
-                        return True
-                    elif self.is_same_number_horizontal(col, row, 3):
-                        # Found 3 same number horizontal
-                        # Check for intersect in either of 3 columns
-                        if row < 3 and (self.is_same_number_vertical(col, row, 3) or
-                                        self.is_same_suit_vertical(col, row, 3) or
-                                        self.is_sequence(col, row, 3, False)):
-                            # Intersect Found on left side of four
-                            points = 1000
-                            # remove intersected column
-                            for i in range(1, 3):
-                                self.grid[col][row + i] = None
-                        elif row < 3 and (self.is_same_number_vertical(col + 1, row, 3) or
-                                          self.is_same_suit_vertical(col + 1, row, 3) or
-                                          self.is_sequence(col + 1, row, 3, False)):
-                            # Intersect Found on right side of four
-                            points = 1000
-                            # remove intersected column
-                            for i in range(1, 3):
-                                self.grid[col + 1][row + i] = None
-                        elif row < 3 and (self.is_same_number_vertical(col + 2, row, 3) or
-                                          self.is_same_suit_vertical(col + 2, row, 3) or
-                                          self.is_sequence(col + 2, row, 3, False)):
-                            # Intersect Found on right side of four
-                            points = 1000
-                            # remove intersected column
-                            for i in range(1, 3):
-                                self.grid[col + 2][row + i] = None
-                        else:
-                            points = 300
-                        score += points
-                        rewards.append(Reward(col, row, points))
-                        self.remove_and_scroll_down(col, row, 3)
-                        return True
-                    elif self.is_sequence(col, row, 3, True):
-                        # Found 3 on sequence
-                        # Check for intersect in either of 3 columns
-                        # row must be < 3 so that a 3 card column may exist
-                        if row < 3 and (self.is_same_number_vertical(col, row, 3) or
-                                        self.is_same_suit_vertical(col, row, 3) or
-                                        self.is_sequence(col, row, 3, False)):
-                            # Intersect Found on left side of four
-                            points = 600
-                            # remove intersected column
-                            for i in range(1, 3):
-                                self.grid[col][row + i] = None
-                        elif row < 3 and (self.is_same_number_vertical(col + 1, row, 3) or
-                                          self.is_same_suit_vertical(col + 1, row, 3) or
-                                          self.is_sequence(col + 1, row, 3, False)):
-                            # Intersect Found on right side of four
-                            points = 600
-                            # remove intersected column
-                            for i in range(1, 3):
-                                self.grid[col + 1][row + i] = None
-                        elif row < 3 and (self.is_same_number_vertical(col + 2, row, 3) or
-                                          self.is_same_suit_vertical(col + 2, row, 3) or
-                                          self.is_sequence(col + 2, row, 3, False)):
-                            # Intersect Found on right side of four
-                            points = 600
-                            # remove intersected column
-                            for i in range(1, 3):
-                                self.grid[col + 2][row + i] = None
-                        else:
-                            points = 100
-                        score += points
-                        rewards.append(Reward(col, row, points))
-                        self.remove_and_scroll_down(col, row, 3)
-                        return True
-                    elif self.is_same_suit_horizontal(col, row, 3):
-                        # Found 3 same suit horizontal
-                        # Check for intersect in either of 3 columns
-                        if row < 3 and (self.is_same_number_vertical(col, row, 3) or
-                                        self.is_same_suit_vertical(col, row, 3) or
-                                        self.is_sequence(col, row, 3, False)):
-                            # Intersect Found on left side of four
-                            points = 500
-                            # remove intersected column
-                            for i in range(1, 3):
-                                self.grid[col][row + i] = None
-                        elif row < 3 and (self.is_same_number_vertical(col + 1, row, 3) or
-                                          self.is_same_suit_vertical(col + 1, row, 3) or
-                                          self.is_sequence(col + 1, row, 3, False)):
-                            # Intersect Found on right side of four
-                            points = 500
-                            # remove intersected column
-                            for i in range(1, 3):
-                                self.grid[col + 1][row + i] = None
-                        elif row < 3 and (self.is_same_number_vertical(col + 2, row, 3) or
-                                          self.is_same_suit_vertical(col + 2, row, 3) or
-                                          self.is_sequence(col + 2, row, 3, False)):
-                            # Intersect Found on right side of four
-                            points = 500
-                            # remove intersected column
-                            for i in range(1, 3):
-                                self.grid[col + 2][row + i] = None
-                        else:
-                            points = 10
-                        score += points
-                        rewards.append(Reward(col, row, points))
-                        self.remove_and_scroll_down(col, row, 3)
-                        return True
-        return False
-
-    def check_3_vertical(self):
-        """ Check 3 same suit vertical """
-        global score
-        for col in range(5):
-            for row in range(3):
-                if self.grid[col][row] and self.grid[col][row + 1] and self.grid[col][row + 2]:
-                    if self.is_sequence(col, row, 3, False) and self.is_same_suit_vertical(col, row, 3):
-                        # Found 3 sequence and same suit vertical
-                        points = 500
-                        score += points
-                        rewards.append(Reward(col, row, points))
-                        # remove cards
-                        for i in range(0, 3):
-                            self.grid[col][row + i] = None
-                        return True
-                    elif self.is_same_number_vertical(col, row, 3):
-                        # Found 3 same number vertical
-                        points = 300
-                        score += points
-                        rewards.append(Reward(col, row, points))
-                        # remove cards
-                        for i in range(0, 3):
-                            self.grid[col][row + i] = None
-                        return True
-                    elif self.is_sequence(col, row, 3, False):
-                        # Found sequence of 3 vertical
-                        points = 100
-                        score += points
-                        rewards.append(Reward(col, row, points))
-                        # remove cards
-                        for i in range(0, 3):
-                            self.grid[col][row + i] = None
-                        return True
-                    elif self.is_same_suit_vertical(col, row, 3):
-                        # Found 3 same suit vertical
-                        points = 10
-                        score += points
-                        rewards.append(Reward(col, row, points))
-                        # remove cards
-                        for i in range(0, 3):
-                            self.grid[col][row + i] = None
-                        return True
-        return False
-
-    def is_same_suit_vertical(self, col, start_row, number_of_cards):
-        """ Return True if same suit vertical """
-        suit = self.grid[col][start_row].suit
-        for i in range(start_row + 1, start_row + number_of_cards):
-            if self.grid[col][i].suit != suit:
-                return False
-        return True
+# Drawing functions
+def draw_card(target, code, card_images, x, y):
+    """ Draw the card code at screen position x, y. target is the window or a renderer """
+    target.blit(card_images[code], (x, y))
 
-    def is_same_number_vertical(self, col, start_row, number_of_cards):
-        """ Return True if same number vertical """
-        number = self.grid[col][start_row].number
-        for i in range(start_row + 1, start_row + number_of_cards):
-            if self.grid[col][i].number != number:
-                return False
-        return True
 
-    def is_same_suit_horizontal(self, start_col, row, number_of_cards):
-        """ Return True if same suit horizontal """
-        suit = self.grid[start_col][row].suit
-        for i in range(start_col + 1, start_col + number_of_cards):
-            if self.grid[i][row].suit != suit:
-                return False
-        return True
+def draw_active_card(target, card, card_images, y):
+    """ Draw the falling card at its board column and y, the (interpolated) engine y of the card """
+    draw_card(target, card.code, card_images, card.x * CARD_WIDTH + BOARD_ZERO_X, int(y * STEP) + BOARD_ZERO_Y)
 
-    def is_same_number_horizontal(self, start_col, row, number_of_cards):
-        """ Return True if same number horizontal """
-        number = self.grid[start_col][row].number
-        for i in range(start_col + 1, start_col + number_of_cards):
-            if self.grid[i][row].number != number:
-                return False
-        return True
-
-    def is_sequence(self, col, row, number_of_cards, is_horizontal):
-        """ Returns True if cards in horizontal or vertical sequence """
-        seq = []
-        # Fill the list seq with card numbers
-        if is_horizontal:
-            # Put horizontal cards into list
-            for i in range(col, col + number_of_cards):
-                seq.append(self.grid[i][row].number)
-        else:
-            # Put vertical cards into list
-            for i in range(row, row + number_of_cards):
-                seq.append(self.grid[col][i].number)
-        # Check for sequence (normal: 2,3,4 or 4,3,2 - rotated: Q,K,A,2 or 3,2,A,K etc)
-        ascent = all((seq[i] == seq[i + 1] - 1 or seq[i] == seq[i + 1] + 12) for i in range(len(seq) - 1))
-        descent = all((seq[i] == seq[i + 1] + 1 or seq[i] == seq[i + 1] - 12) for i in range(len(seq) - 1))
-        return ascent or descent
+
+def draw_pack(target, pack, card_images):
+    pack_x = 170
+    pack_y = 30
+    pack_x_step = 30
+    for num in range(len(pack.cards)):
+        draw_card(target, pack.cards[num], card_images, pack_x + (num * pack_x_step), pack_y)
+
+
+def draw_board(target, board, card_images):
+    for i in range(BOARD_COLUMNS):
+        for j in range(BOARD_ROWS):
+            code = board.get_cell(i, j)
+            if code != EMPTY:
+                draw_card(target, code, card_images, i * CARD_WIDTH + BOARD_ZERO_X, j * CARD_HEIGHT + BOARD_ZERO_Y)
+
+
+def game_hud():
+    """ Return the background with the labels and values of cards left, stage, level and score """
+    labels = [('CARDS LEFT', (600, 60)), ('STAGE', (635, 190)), ('LEVEL', (635, 250)), ('SCORE', (630, 392))]
+    return Hud(assets.image('board.png', alpha=False), text_cache, game_font(),
+               [(text_cache.render(game_font(), text, (255, 255, 255)), pos) for text, pos in labels],
+               [(660, 92), (665, 218), (665, 275), (650, 422)])
+
+
+def draw_game(renderer, hud, game, card_images, active_y, timeline):
+    """ Begin a frame of the game stage on renderer and draw the HUD, the pack, the board, the active card
+    at active_y, the rewards and the effects of timeline. The caller ends the frame """
+    # Draw Cards Left, Stage, Level and Score on the background if changed
+    for rect in hud.update(game.cards_left(), game.stage, game.level, game.score):
+        renderer.mark_dirty(rect)
+    renderer.begin()
+
+    # Draw Card Pack
+    draw_pack(renderer, game.pack, card_images)
+
+    # Draw Cards on board
+    draw_board(renderer, game.board, card_images)
+
+    # Draw activeCard if exist
+    if game.active_card:
+        draw_active_card(renderer, game.active_card, card_images, active_y)
+    profiler.mark('draw')
+
+    # Draw reward if exist and stop playing until all rewards are gone
+    for reward in rewards:
+        reward.draw(renderer)
+
+    # Draw running effects
+    timeline.draw(renderer)
+    profiler.mark('rewards')
+
+
+def draw_intro(target, timeline):
+    """ Draw a frame of the intro of a stage: the rewards leaving and the stage label of timeline """
+    target.blit(assets.image('tiles.png', alpha=False), (0, 0))
+    for reward in rewards:
+        reward.draw(target)
+    timeline.draw(target)
+
+
+def stage_label(stage):
+    """ Return the draw function of the stage label tween of the intro """
+    label = text_cache.render(reward_font(), 'STAGE ' + str(stage), (255, 255, 255))
+    label_shadow = text_cache.render(reward_font(), 'STAGE ' + str(stage), (0, 0, 0))
+
+    def draw_stage_label(target, progress):
+        target.blit(label_shadow, (150, 400))
+        target.blit(label, (145, 395))
+    return draw_stage_label
+
+
+def draw_game_over(target):
+    target.blit(text_cache.render(reward_font(), 'GAME OVER', (0, 0, 0)), (105, 305))
+    target.blit(text_cache.render(reward_font(), 'GAME OVER', (255, 255, 0)), (100, 300))
+    target.blit(text_cache.render(game_font(), 'Press ENTER or ESC', (0, 0, 0)), (163, 403))
+    target.blit(text_cache.render(game_font(), 'Press ENTER or ESC', (255, 255, 255)), (160, 400))
+
+
+def profiler_key(key):
+    """ F3 shows or hides the frame profiler overlay, F4 saves the profiled frames as a Chrome trace """
+    if key == pygame.K_F3:
+        profiler.toggle()
+    elif key == pygame.K_F4 and profiler.frames:
+        path = 'frames-%s.json' % time.strftime('%Y%m%d-%H%M%S')
+        profiler.save_trace(path)
+        print('Frame trace saved to ' + path)
+
+
+def remove_card_effect(timeline, col, row):
+    """ Display effect image on card removal. The effects of removed cards are shown one after the other """
+    pos = (col * CARD_WIDTH + BOARD_ZERO_X, row * CARD_HEIGHT + BOARD_ZERO_Y)
+    timeline.queue(REMOVE_EFFECT_TIME, lambda target, progress: target.blit(assets.image('remove-card.png'), pos))
+
+
+def handle_game_events(game, timeline):
+    """ Play sounds, show rewards and start the effects for the events of the game engine """
+    for event in game.pop_events():
+        if event[0] == EVENT_PLACE:
+            audio.play('in-place.wav')
+        elif event[0] == EVENT_COMBINATION:
+            audio.play('remove-cards.wav')
+            rewards.append(Reward(event[1], event[2], event[3]))
+        elif event[0] == EVENT_REMOVE:
+            remove_card_effect(timeline, event[1], event[2])
+        elif event[0] == EVENT_BONUS:
+            rewards.append(Reward(event[1], event[2], "Bonus: " + str(event[3]), (0, 255, 0)))
+        elif event[0] == EVENT_PENALTY:
+            rewards.append(Reward(event[1], event[2], event[3], (255, 0, 0)))
+            audio.play('pop.wav')
+            # Hold the game (not the window) for a while after each remaining card is cleared
+            timeline.add(CLEAR_CARD_TIME, blocking=True)
+
+
+# Frame loops of the stages, shared by the window and export.py so exported frames are the frames players see
+class IntroFrames(object):
+    """ The frames of the intro of a stage: the rewards left by the last stage move on at the normal game speed,
+    then the stage label (see stage_label) is shown for INTRO_STAGE_TIME """
+    def __init__(self, draw_stage_label):
+        self.draw_stage_label = draw_stage_label
+        self.timeline = Timeline()
+        self.reward_time = 0
+        self.showing_stage = False
+
+    def done(self):
+        return self.showing_stage and self.timeline.is_idle()
+
+    def advance(self, elapsed):
+        """ Play a frame of elapsed ms """
+        self.timeline.update(elapsed)
+        # If exist clear all rewards, they move with the normal game speed
+        self.reward_time += elapsed
+        while rewards and self.reward_time >= 1000 // GAME_SPEED_NORMAL:
+            self.reward_time -= 1000 // GAME_SPEED_NORMAL
+            for reward in rewards[:]:
+                reward.update()
+        # Then display stage number
+        if not rewards and not self.showing_stage:
+            self.timeline.add(INTRO_STAGE_TIME, self.draw_stage_label)
+            self.showing_stage = True
+
+
+class StageFrames(object):
+    """ The frames of a stage of game. The game ticks with a fixed timestep: each frame runs the ticks due since
+    the last frame, and the falling card is drawn between its last two tick positions. Effects run on timeline
+    without blocking the frames. speed is the playback speed """
+    def __init__(self, game, speed=1):
+        self.game = game
+        self.speed = speed
+        self.timeline = Timeline()
+        self.tick_time = 0
+        self.tick_interval = 1
+        self.last_card = None
+        self.last_y = 0
+
+    def advance(self, elapsed, fast, player=None):
+        """ Play a frame of elapsed ms of game time: the ticks due with the card falling fast or not, their
+        events and rewards. player (a ReplayPlayer), if given, applies its inputs before each tick """
+        game = self.game
+        timeline = self.timeline
+        timeline.update(elapsed)
+        self.tick_time = min(self.tick_time + elapsed, MAX_FRAME_TIME * self.speed)
+        self.tick_interval = 1000.0 / (game.fall_speed(fast) * STEPS_PER_ROW)
+        if timeline.is_blocking():
+            self.tick_time = 0
+        while self.tick_time >= self.tick_interval and not timeline.is_blocking():
+            self.tick_time -= self.tick_interval
+            if player:
+                player.apply(game)
+            self.last_card = game.active_card
+            self.last_y = self.last_card.y if self.last_card else 0
+            # Move the active card, land it and check the board, or clear the stage from remaining cards
+            game.tick()
+            handle_game_events(game, timeline)
+            for reward in rewards[:]:
+                reward.update()
+
+    def active_y(self):
+        """ Return the y of the falling card to draw, between its last two tick positions """
+        card = self.game.active_card
+        y = card.y if card else 0
+        if card and card is self.last_card and y > self.last_y:
+            y = self.last_y + (y - self.last_y) * self.tick_time / self.tick_interval
+        return y
+
+
+def suspend(game):
+    """ Save the game to the suspend file, it is resumed on the next start. A game closed before its first
+    stage (it has no board yet) is not saved """
+    if suspend_path and not game.game_over and game.board is not None:
+        snapshot.save(game, suspend_path)
+
+
+def resume():
+    """ Return the game of the suspend file, which is removed so that the game is resumed once.
+    Return None if there is no suspended game """
+    if not suspend_path or not os.path.exists(suspend_path):
+        return None
+    try:
+        game = snapshot.load(suspend_path)
+    except ValueError as error:
+        print('%s: %s, starting a new game' % (suspend_path, error))
+        game = None
+    os.remove(suspend_path)
+    return game
 
 
 # Game functions (Stages)
 def start_stage():
     """ The Introduction Stage """
-    global score, stage, level, gameSpeed
-
     # Start Screen loop
     running = True
     while running:
@@ -718,191 +307,157 @@ def start_stage():
                 running = False
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_RETURN or event.key == pygame.K_KP_ENTER:
-                    # Start New Game
-                    score = 0
-                    stage = level = 1
-                    gameSpeed = GAME_SPEED_NORMAL
-                    pygame.mixer.music.play(-1)  # Start background music. -1 means infinite loop
+                    # Start New Game, or resume the suspended game. A resumed game is not recorded, its
+                    # replay would need the inputs from the start of the game
+                    game = resume()
+                    replay = None
+                    if game is None:
+                        game = Game(seed=seed)
+                        replay = Replay(game.seed) if record_path else None
+                    # Load the shared card images and decode the sounds before the first stage
+                    assets.load_card_images()
+                    audio.init()
+                    audio.play_music()  # Start background music in an infinite loop
                     start_next_stage = True
                     while start_next_stage:
                         # each iteration is a new stage
-                        intro_stage()
-                        start_next_stage = game_stage()
-                    pygame.mixer.music.stop()  # Stop background music
-        win.blit(startBg, (0, 0))
+                        start_next_stage = intro_stage(game, replay) and game_stage(game, replay)
+                    audio.stop_music()  # Stop background music
+                    if replay:
+                        replay.save(record_path)
+        win.blit(assets.image('start-screen.png', alpha=False), (0, 0))
         pygame.display.update()
 
 
-def game_stage():
-    """ The main Game Stage """
-    global score, stage, level, gameSpeed, game_over, clearing_the_stage, activeCard
-    # Initialize game control variables
-    game_over = False
-    game_over_played = False
-    clearing_the_stage = False
-    cards_to_clear = []
-
-    # Initialize Game Board 5x5 table
-    board = Board()
-
-    # Create Game Deck
-    deck = Deck()
+def playback_stage(replay):
+    """ Play a replay on the window, playback_speed times faster than the game """
+    game = Game(seed=replay.seed)
+    player = ReplayPlayer(replay)
+    assets.load_card_images()
+    audio.init()
+    audio.play_music()
+    while intro_stage(game) and game_stage(game, player=player):
+        pass
+    audio.stop_music()
 
-    # Create first 3 visible card pack
-    pack = Pack(CARDS_IN_PACK, deck)
 
-    # Create first activeCard
-    activeCard = deck.get_one_card()
+def game_stage(game, replay=None, player=None):
+    """ The main Game Stage. The inputs of the player are recorded on replay if given.
+    If player (a ReplayPlayer) is given the inputs come from its replay instead of the keyboard,
+    else if autoplay (a Bot) is set the bot plays """
+    game_over_played = False
+    speed = playback_speed if player else 1
+
+    def player_input(action):
+        if replay and not game.game_over:
+            replay.record(game.ticks, action)
+        apply_input(game, action)
+
+    # Initialize board, deck, pack and active card of the new stage, unless the game was resumed on its stage
+    if game.board is None or game.stage_cleared:
+        game.new_stage()
+    # Shared card images, loaded once
+    card_images = assets.load_card_images()
+    hud = game_hud()
+    # Redraw the whole window every frame, or only the areas that changed
+    if dirty_rects:
+        renderer = DirtyRenderer(win, hud.surface)
+    else:
+        renderer = FullRenderer(win, hud.surface)
+
+    frames = StageFrames(game, speed)
+    # The active card the bot has played
+    played_card = None
+    clock.tick()
 
     # Game loop
     running = True
     while running:
+        profiler.begin_frame()
         # Check for events
         for event in pygame.event.get():
             # Check for QUIT event
             if event.type == pygame.QUIT:
-                game_over = True
+                if not player:
+                    suspend(game)
+                player_input(INPUT_QUIT)
                 running = False
+            if event.type == pygame.KEYDOWN and event.key in PROFILER_KEYS:
+                profiler_key(event.key)
             # Check if key is Down (once)
-            if event.type == pygame.KEYDOWN and not game_over:
-                if event.key == pygame.K_LEFT and activeCard and activeCard.can_move_left(board):
-                    activeCard.x -= CARD_WIDTH
-                if event.key == pygame.K_RIGHT and activeCard and activeCard.can_move_right(board):
-                    activeCard.x += CARD_WIDTH
-                if event.key == pygame.K_LALT:
-                    pack.rotate_counterclockwise()
-                if event.key == pygame.K_LCTRL:
-                    pack.rotate_clockwise()
+            if event.type == pygame.KEYDOWN and not game.game_over:
+                if event.key in KEY_INPUTS and not player:
+                    player_input(KEY_INPUTS[event.key])
                 if event.key == pygame.K_p:  # Trigger paused
                     pause_stage()
+                    renderer.invalidate()
                 if event.key == pygame.K_ESCAPE:
-                    game_over = True
+                    if not player:
+                        suspend(game)
+                    player_input(INPUT_QUIT)
                     running = False
+        profiler.mark('events')
+
+        # The bot chooses the pack rotation and the column of each new active card and drops it fast
+        if autoplay and not player and game.active_card and game.active_card is not played_card \
+                and not game.game_over:
+            played_card = game.active_card
+            rotations, column = autoplay.choose(game)
+            for i in range(rotations):
+                player_input(INPUT_ROTATE_CLOCKWISE)
+            for i in range(abs(column - played_card.x)):
+                player_input(INPUT_LEFT if column < played_card.x else INPUT_RIGHT)
+        profiler.mark('bot')
 
         # Check keys pressed (continuously)
         keys = pygame.key.get_pressed()
-        if keys[pygame.K_DOWN]:
-            clock.tick(GAME_SPEED_FAST)
+        if player:
+            fast = player.fast
         else:
-            clock.tick(gameSpeed)
-
-        win.blit(gameBg, (0, 0))
-        # Draw Cards Left
-        win.blit(cardsLeftLabel, (600, 60))
-        cards_left_render = font.render(str(len(deck.cards) + len(pack.cards)), 1, (255, 255, 255))
-        win.blit(cards_left_render, (660, 92))
-        # Draw Stage
-        win.blit(stageLabel, (635, 190))
-        stage_render = font.render(str(stage), 1, (255, 255, 255))
-        win.blit(stage_render, (665, 218))
-        # Draw Level
-        win.blit(levelLabel, (635, 250))
-        level_render = font.render(str(level), 1, (255, 255, 255))
-        win.blit(level_render, (665, 275))
-        # Draw Score
-        win.blit(scoreLabel, (630, 392))
-        score_render = font.render(str(score), 1, (255, 255, 255))
-        win.blit(score_render, (650, 422))
-
-        # Draw Card Pack
-        pack.draw()
-
-        # Draw Cards on board
-        board.draw()
-
-        # Draw activeCard if exist
-        if activeCard:
-            activeCard.draw()
-
-            if activeCard.can_move_down(board):
-                activeCard.y += STEP
-            else:
-                # Check if active cards is not on top of 3 cards pack
-                if activeCard.board_y > -1:
-                    # activeCard is not outside of board
-                    # Place activeCard in current Board location
-                    board.grid[activeCard.board_x][activeCard.board_y] = activeCard
-                    soundPlaceActive.play()
-                    activeCard = None
-                    # Check board for combinations until all of them are scored
-                    need_recheck = board.check_board()
-                    while need_recheck:
-                        need_recheck = board.check_board()
-                    # Make next active card from pack if pack has card(s)
-                    if len(pack.cards):
-                        activeCard = pack.cards.pop()
-                        activeCard.x = ACTIVE_CARD_START_X
-                        activeCard.y = ACTIVE_CARD_START_Y
-                        # Fill pack with deck card if deck has card(s)
-                        if len(deck.cards):
-                            pack.cards.insert(0, deck.get_one_card())
-                    else:
-                        # Out of cards - Stage Over
-                        # Put all remaining cards in the list: cards_to_clear
-                        # Check empty stage to give bonus
-                        # and activate flag: clearing_the_stage
-                        for i in range(5):
-                            for j in range(5):
-                                if board.grid[i][j]:
-                                    cards_to_clear.append(board.grid[i][j])
-                        if not len(cards_to_clear):
-                            # Stage dont have remaining cards, give bonus
-                            points = 1000 + ((level - 1) * 100)
-                            score += points
-                            rewards.append(Reward(1, 5, "Bonus: " + str(points), (0, 255, 0)))
-                        clearing_the_stage = True
-                else:
-                    # Card on top of 5 cards pile - GAME OVER
-                    game_over = True
-
-        # Draw reward if exist and stop playing until all rewards are gone
-        for reward in rewards:
-            reward.draw()
+            fast = keys[pygame.K_DOWN] or autoplay is not None
+            if replay:
+                replay.record_fast(game.ticks, fast)
+        elapsed = clock.tick(RENDER_FPS) * speed
+        profiler.mark('wait')
+        frames.advance(elapsed, fast, player)
+        profiler.mark('update')
+
+        if game.stage_cleared:
+            return True  # return True means goto Next level
+
+        draw_game(renderer, hud, game, card_images, frames.active_y(), frames.timeline)
 
         # if game is over display message
-        if game_over:
-            pygame.mixer.music.stop()
-            win.blit(gameOverLabelShadow, (105, 305))
-            win.blit(gameOverLabel, (100, 300))
-            win.blit(enterOrEscLabelShadow, (163, 403))
-            win.blit(enterOrEscLabel, (160, 400))
+        if game.game_over:
+            audio.stop_music()
+            draw_game_over(renderer)
             if not game_over_played:
-                soundGameOver.play()
+                audio.play('game-over.wav')
                 game_over_played = True
+                # Only games the player played to the end are scored, submit() doesn't wait for the server
+                if running and not player and not autoplay:
+                    if leaderboard:
+                        leaderboard.submit_game(game, player_name)
+                    if score_log:
+                        score_log.append(game_record(game, player_name))
             if keys[pygame.K_RETURN] or keys[pygame.K_KP_ENTER] or keys[pygame.K_ESCAPE]:
                 return False  # Return False means Game Over return to start_stage
 
-        # If out of cards then clear stage from remaining cards
-        if clearing_the_stage:
-            if len(cards_to_clear):
-                card_to_clear = cards_to_clear.pop()
-                points = -100 * level
-                score += points
-                rewards.append(Reward(card_to_clear.board_x, card_to_clear.board_y, points, (255, 0, 0)))
-                board.grid[card_to_clear.board_x][card_to_clear.board_y] = None
-                soundMinusCards.play()
-                pygame.time.delay(100)
-            else:
-                # Stage cleared
-                clearing_the_stage = False
-                if score > 0:
-                    stage += 1
-                    level = stage // 3 + 1  # get level every 3 stages
-                    if stage % 10:
-                        gameSpeed += 2  # Increase game speed +2 on every stage
-                    else:
-                        gameSpeed = GAME_SPEED_NORMAL  # every 10 stages reset speed
-                    return True  # return True means goto Next level
-                else:
-                    game_over = True
-
-        pygame.display.update()
+        profiler.draw(renderer)
+        renderer.end()
+        profiler.mark('display')
+        profiler.end_frame()
     return False  # Return False means Game Over return to start_stage
 
 
 def pause_stage():
     """ The stage displayed when a user press the P (pause) key"""
-    pygame.mixer.music.pause()
+    audio.pause_music()
+    # The pause screen doesn't change, draw it once
+    win.blit(assets.image('board.png', alpha=False), (0, 0))
+    win.blit(text_cache.render(game_font(), "Press P to resume", (255, 255, 255)), (170, 80))
+    win.blit(text_cache.render(reward_font(), 'PAUSED', (0, 0, 0)), (160, 400))
+    win.blit(text_cache.render(reward_font(), 'PAUSED', (255, 255, 255)), (155, 395))
     game_paused = True
     while game_paused:
         for event in pygame.event.get():
@@ -913,90 +468,133 @@ def pause_stage():
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_p:
                     game_paused = False
-        win.blit(gameBg, (0, 0))
-        pause_render = font.render("Press P to resume", 1, (255, 255, 255))
-        win.blit(pause_render, (170, 80))
-        pause_label = rewardFont.render('PAUSED', 1, (255, 255, 255))
-        pause_label_shadow = rewardFont.render('PAUSED', 1, (0, 0, 0))
-        win.blit(pause_label_shadow, (160, 400))
-        win.blit(pause_label, (155, 395))
-
+        clock.tick(GAME_SPEED_NORMAL)
         pygame.display.update()
-    pygame.mixer.music.unpause()
+    audio.unpause_music()
 
 
-def intro_stage():
-    """ Stage that shows the stage number. Called before each stage begins """
-    # If exist clear all rewards
-    while rewards:
-        win.blit(intro_stage_image, (0, 0))
-        for reward in rewards:
-            reward.draw()
-        clock.tick(GAME_SPEED_NORMAL)
+def intro_stage(game, replay=None):
+    """ Stage that shows the stage number. Called before each stage begins.
+    Return False if the window was closed, which is recorded on replay if given """
+    frames = IntroFrames(stage_label(game.stage))
+    clock.tick()
+    while not frames.done():
+        for event in pygame.event.get():
+            # Check for QUIT event
+            if event.type == pygame.QUIT:
+                if replay:
+                    replay.record(game.ticks, INPUT_QUIT)
+                suspend(game)
+                return False
+        frames.advance(clock.tick(RENDER_FPS))
+        draw_intro(win, frames.timeline)
         pygame.display.update()
-    # Display stage number
-    win.blit(intro_stage_image, (0, 0))
-    stage_label = rewardFont.render('STAGE ' + str(stage), 1, (255, 255, 255))
-    stage_label_shadow = rewardFont.render('STAGE ' + str(stage), 1, (0, 0, 0))
-    win.blit(stage_label_shadow, (150, 400))
-    win.blit(stage_label, (145, 395))
-    pygame.display.update()
-    pygame.time.delay(1500)
-
-
-# Pre initialize sound to avoid delay
-pygame.mixer.pre_init(44100, -16, 1, 512)
-# Initialize pyGame
-pygame.init()
-clock = pygame.time.Clock()
-
-# Center Game Window in screen
-# https://www.pygame.org/wiki/SettingWindowPosition
-screenWidth = pygame.display.Info().current_w
-screenHeight = pygame.display.Info().current_h
-winX = (screenWidth - GAME_WIDTH) // 2
-winY = (screenHeight - GAME_HEIGHT) // 2
-os.environ['SDL_VIDEO_WINDOW_POS'] = '%d, %d' % (winX, winY)
-
-# Load icons, images and fonts
-icon = pygame.image.load(os.path.join('data', 'images', 'deck-icon.png'))
-startBg = pygame.image.load(os.path.join('data', 'images', 'start-screen.png'))
-gameBg = pygame.image.load(os.path.join('data', 'images', 'board.png'))
-intro_stage_image = pygame.image.load(os.path.join('data', 'images', 'tiles.png'))
-remove_card_image = pygame.image.load(os.path.join('data', 'images', 'remove-card.png'))
-font = pygame.font.Font(os.path.join('data', 'fonts', 'postnobillscolombo-semibold.ttf'), 32)
-rewardFont = pygame.font.Font(os.path.join('data', 'fonts', 'postnobillscolombo-bold.ttf'), 72)
-cardsLeftLabel = font.render('CARDS LEFT', 1, (255, 255, 255))
-stageLabel = font.render('STAGE', 1, (255, 255, 255))
-levelLabel = font.render('LEVEL', 1, (255, 255, 255))
-scoreLabel = font.render('SCORE', 1, (255, 255, 255))
-gameOverLabel = rewardFont.render('GAME OVER', 1, (255, 255, 0))
-gameOverLabelShadow = rewardFont.render('GAME OVER', 1, (0, 0, 0))
-enterOrEscLabel = font.render('Press ENTER or ESC', 1, (255, 255, 255))
-enterOrEscLabelShadow = font.render('Press ENTER or ESC', 1, (0, 0, 0))
-
-# Load music and sounds
-soundPlaceActive = pygame.mixer.Sound(os.path.join('data', 'sound', 'in-place.wav'))
-soundRemoveCards = pygame.mixer.Sound(os.path.join('data', 'sound', 'remove-cards.wav'))
-soundMinusCards = pygame.mixer.Sound(os.path.join('data', 'sound', 'pop.wav'))
-soundGameOver = pygame.mixer.Sound(os.path.join('data', 'sound', 'game-over.wav'))
-pygame.mixer.music.load(os.path.join('data', 'sound', 'music.wav'))
-
-# Screen properties
-win = pygame.display.set_mode((GAME_WIDTH, GAME_HEIGHT))
-pygame.display.set_caption('Drop Card Game')
-pygame.display.set_icon(icon)
+    return True
+
+
+def init():
+    """ Initialize pyGame and create the game window. Assets are loaded on first use """
+    global clock, win
+    pygame.display.init()
+    pygame.font.init()
+    clock = pygame.time.Clock()
+
+    # Center Game Window in screen
+    # https://www.pygame.org/wiki/SettingWindowPosition
+    screenWidth = pygame.display.Info().current_w
+    screenHeight = pygame.display.Info().current_h
+    winX = (screenWidth - GAME_WIDTH) // 2
+    winY = (screenHeight - GAME_HEIGHT) // 2
+    os.environ['SDL_VIDEO_WINDOW_POS'] = '%d, %d' % (winX, winY)
+
+    # Screen properties
+    win = pygame.display.set_mode((GAME_WIDTH, GAME_HEIGHT))
+    pygame.display.set_caption('Drop Card Game')
+    pygame.display.set_icon(assets.image('deck-icon.png'))
+
+
+def parse_seed(text):
+    """ Return the seed of text. Replays, snapshots and score logs store seeds of SEED_BITS bits """
+    value = int(text)
+    if not 0 <= value < 1 << SEED_BITS:
+        raise argparse.ArgumentTypeError('the seed must be 0 to 2**%d-1' % SEED_BITS)
+    return value
+
+
+def main(argv=None):
+    """ Parse the command line and start the game """
+    global dirty_rects, seed, record_path, playback_speed, autoplay, suspend_path, leaderboard, player_name, \
+        score_log
+    parser = argparse.ArgumentParser(description='Drop Card Game')
+    parser.add_argument('--dirty-rects', action='store_true',
+                        help='redraw and update only the changed areas of the window (for slow hardware)')
+    parser.add_argument('--seed', type=parse_seed, help='seed of the deck shuffles (random if not given)')
+    parser.add_argument('--record', metavar='FILE', help='save the replay of the last game played to FILE')
+    parser.add_argument('--replay', metavar='FILE', help='play the replay FILE')
+    parser.add_argument('--speed', type=float, default=1.0, help='playback speed of --replay e.g., 2 or 0.5')
+    parser.add_argument('--autoplay', action='store_true', help='let the bot play')
+    parser.add_argument('--suspend', metavar='FILE',
+                        help='save the game to FILE when the window is closed or Esc is pressed and resume it on '
+                             'the next start')
+    parser.add_argument('--profile', action='store_true',
+                        help='show the frame profiler (F3 toggles it, F4 saves a Chrome trace of the last frames)')
+    parser.add_argument('--leaderboard', metavar='HOST:PORT',
+                        help='send the score of every finished game to the leaderboard server at HOST:PORT')
+    parser.add_argument('--scores', metavar='FILE', help='log the score of every finished game to the score log FILE')
+    parser.add_argument('--name', default='Player', help='player name of the leaderboard and score log scores')
+    args = parser.parse_args(argv)
+    dirty_rects = args.dirty_rects
+    seed = args.seed
+    record_path = args.record
+    playback_speed = args.speed
+    # A replay is played from its seed, it is never suspended
+    suspend_path = None if args.replay else args.suspend
+    if args.autoplay:
+        autoplay = Bot()
+    if args.leaderboard:
+        # Imported only when it is used, it imports asyncio, which takes longer than the rest of the start
+        from leaderboard import LeaderboardClient, parse_address
+        try:
+            address = parse_address(args.leaderboard)
+        except ValueError:
+            parser.error('argument --leaderboard: invalid address %r' % args.leaderboard)
+        leaderboard = LeaderboardClient(*address)
+    if args.scores:
+        score_log = ScoreLog(args.scores)
+    player_name = args.name
+    if args.profile:
+        profiler.toggle()
+
+    init()
+    if args.replay:
+        playback_stage(Replay.load(args.replay))
+    else:
+        # Start Game
+        start_stage()
+
+    pygame.quit()
+    if leaderboard and leaderboard.close():
+        print('The leaderboard server could not be reached, scores were not sent')
+    if score_log:
+        score_log.close()
+
 
 # Initialize variables to be global
-activeCard = None
+clock = None
+win = None
 rewards = []
-score = 0
-stage = level = 1
-gameSpeed = GAME_SPEED_NORMAL
-game_over = clearing_the_stage = False
+text_cache = TextCache()
+dirty_rects = False
+seed = None
+record_path = None
+playback_speed = 1.0
+autoplay = None
+suspend_path = None
+profiler = FrameProfiler()
+audio = AudioManager()
+leaderboard = None
+player_name = None
+score_log = None
 
 if __name__ == '__main__':
-    # Start Game
-    start_stage()
-
-    pygame.quit()
+    main()
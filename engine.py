@@ -0,0 +1,737 @@
+""" Drop Card Game rules engine
+Pure python game logic without any pygame dependency. It is used by the pygame
+front-end (dropcard.py) and can also be used headless, e.g. for simulations.
+
+Info:
+Suits: H (Hearts), D (Diamonds), S (Spades), C (Clubs)
+Numbers: 1 (Ace), 2-10, 11 (Jack), 12 (Queen), 13 (King)
+Cards are stored as codes 0-51 (see card_code), CARD_SUIT and CARD_NUMBER give the suit index
+and the number of a code. The board is a bytearray of columns x rows (5x5 by default, see BoardLayout)
+card codes with EMPTY for no card.
+
+Coordinates:
+Card x is the board column (0-4 on the default board). Card y is the vertical position of the card
+in fall steps, where 0 is the top of the first board row and every row is
+STEPS_PER_ROW steps high. A card on the pack area has a negative y.
+"""
+import random
+
+# Engine Parameters
+BOARD_COLUMNS = 5  # size of the default board, other sizes are a BoardLayout
+BOARD_ROWS = 5
+STEPS_PER_ROW = 10
+ACTIVE_CARD_START_X = 2
+ACTIVE_CARD_START_Y = -14
+CARDS_IN_PACK = 3
+GAME_SPEED_NORMAL = 10
+GAME_SPEED_FAST = 60
+DECK_NUM_START = 1
+DECK_NUM_STOP = 13
+DECK_SUITS = ['H', 'D', 'C', 'S']
+SEED_BITS = 64
+VERIFY_CHECKS = False  # debug: check every check_board against a full scan of the board (slow)
+
+# Game events. Each event is a tuple with the event name as first item
+EVENT_PLACE = 'place'  # (EVENT_PLACE, col, row)
+EVENT_COMBINATION = 'combination'  # (EVENT_COMBINATION, col, row, points, rule), see Board.reward
+EVENT_REMOVE = 'remove'  # (EVENT_REMOVE, col, row)
+EVENT_BONUS = 'bonus'  # (EVENT_BONUS, col, row, points)
+EVENT_PENALTY = 'penalty'  # (EVENT_PENALTY, col, row, points)
+
+
+# Cards are small ints: code = suit index * DECK_SIZE_PER_SUIT + number - 1, e.g. 'H', 1 is 0 and 'S', 13 is 51
+DECK_SIZE_PER_SUIT = DECK_NUM_STOP - DECK_NUM_START + 1
+DECK_SIZE = len(DECK_SUITS) * DECK_SIZE_PER_SUIT
+EMPTY = 0xFF  # code of an empty board cell
+# Suit index and number of every card code
+CARD_SUIT = tuple(code // DECK_SIZE_PER_SUIT for code in range(DECK_SIZE))
+CARD_NUMBER = tuple(code % DECK_SIZE_PER_SUIT + DECK_NUM_START for code in range(DECK_SIZE))
+# Steps between the numbers of a sequence
+ASCENT = {1}
+DESCENT = {DECK_SIZE_PER_SUIT - 1}
+# Relations of neighbour cards, the bits of PAIR_RELATIONS[code << 8 | other] (0 if any of them is EMPTY).
+# The relation of a line is the AND of the relations of its neighbour cards
+RELATION_SAME_SUIT = 1
+RELATION_SAME_NUMBER = 2
+RELATION_ASCENT = 4  # other has the next number of code
+RELATION_DESCENT = 8  # other has the previous number of code
+ALL_RELATIONS = 15
+PAIR_RELATIONS = bytearray(1 << 16)
+for _code in range(DECK_SIZE):
+    for _other in range(DECK_SIZE):
+        _step = (CARD_NUMBER[_other] - CARD_NUMBER[_code]) % DECK_SIZE_PER_SUIT
+        PAIR_RELATIONS[_code << 8 | _other] = ((CARD_SUIT[_code] == CARD_SUIT[_other]) * RELATION_SAME_SUIT |
+                                               (_step == 0) * RELATION_SAME_NUMBER |
+                                               (_step in ASCENT) * RELATION_ASCENT |
+                                               (_step in DESCENT) * RELATION_DESCENT)
+# Relations of lines of 3 cards: TRIPLE_RELATIONS[a << 12 | b << 6 | c] is the relation of the cards a, b, c
+# in 6 bit cell codes (CELL_CODES[cell] is the card code, or 63 for EMPTY). A longer line is the AND of
+# the relations of overlapping lines of 3 cards. The 256 KB table is built a row of 64 cards at a time
+CELL_CODE_BITS = 6
+CELL_CODES = bytes(code if code < DECK_SIZE else (1 << CELL_CODE_BITS) - 1 for code in range(256))
+TRIPLE_RELATIONS = bytearray(1 << 3 * CELL_CODE_BITS)
+_and_tables = [bytes(value & relation for value in range(256)) for relation in range(ALL_RELATIONS + 1)]
+_pair_rows = [bytes(PAIR_RELATIONS[_code << 8 | _other] for _other in range(1 << CELL_CODE_BITS))
+              for _code in range(DECK_SIZE)]
+for _code in range(DECK_SIZE):
+    for _other in range(DECK_SIZE):
+        _start = (_code << CELL_CODE_BITS | _other) << CELL_CODE_BITS
+        TRIPLE_RELATIONS[_start:_start + (1 << CELL_CODE_BITS)] = _pair_rows[_other].translate(
+            _and_tables[PAIR_RELATIONS[_code << 8 | _other]])
+
+# Combination kinds: a line is of a kind if its relation matches
+SEQUENCE_SAME_SUIT = 'sequence and same suit'
+SAME_NUMBER = 'same number'
+SEQUENCE = 'sequence'
+SAME_SUIT = 'same suit'
+KINDS = {
+    SEQUENCE_SAME_SUIT: lambda relation: bool(relation & RELATION_SAME_SUIT and
+                                              relation & (RELATION_ASCENT | RELATION_DESCENT)),
+    SAME_NUMBER: lambda relation: bool(relation & RELATION_SAME_NUMBER),
+    SEQUENCE: lambda relation: bool(relation & (RELATION_ASCENT | RELATION_DESCENT)),
+    SAME_SUIT: lambda relation: bool(relation & RELATION_SAME_SUIT),
+}
+# Scoring rules in check order: (horizontal, number of cards, kind, points, intersect points).
+# The rules of the same orientation and number of cards are a check. check_board runs the checks in order,
+# a check scans its lines column by column and row by row and scores the first line that matches one of
+# its rules (the first rule matched, in table order). A horizontal line scores the intersect points if
+# one of its INTERSECT_COLUMNS is a 3 cards combination below the line, which is removed with the line
+SCORING_RULES = (
+    (True, 5, SEQUENCE_SAME_SUIT, 2000, 6000),
+    (True, 5, SEQUENCE, 500, 2000),
+    (True, 5, SAME_SUIT, 300, 1000),
+    (True, 4, SEQUENCE_SAME_SUIT, 1000, 3000),
+    (True, 4, SAME_NUMBER, 500, 1500),
+    (True, 4, SEQUENCE, 300, 1000),
+    (True, 4, SAME_SUIT, 100, 500),
+    (False, 4, SEQUENCE_SAME_SUIT, 1000, None),
+    (False, 4, SAME_NUMBER, 500, None),
+    (False, 4, SEQUENCE, 300, None),
+    (False, 4, SAME_SUIT, 100, None),
+    (True, 3, SEQUENCE_SAME_SUIT, 500, 1500),
+    (True, 3, SAME_NUMBER, 300, 1000),
+    (True, 3, SEQUENCE, 100, 600),
+    (True, 3, SAME_SUIT, 10, 500),
+    (False, 3, SEQUENCE_SAME_SUIT, 500, None),
+    (False, 3, SAME_NUMBER, 300, None),
+    (False, 3, SEQUENCE, 100, None),
+    (False, 3, SAME_SUIT, 10, None),
+)
+# Columns of a horizontal line (from its first card) checked in order for an intersect column.
+# A longer line (a rule of a custom layout) is checked for its center column
+INTERSECT_COLUMNS = {5: (2,), 4: (1, 2), 3: (0, 1, 2)}
+# A 5 sequence and same suit line always intersects when a column fits below it
+# (its center column is checked for a horizontal sequence, which is part of the line)
+ALWAYS_INTERSECT = ((5, SEQUENCE_SAME_SUIT),)
+
+
+def zobrist_keys(size):
+    """ Return the Zobrist keys of a board of size cells: keys[index << 8 | code] is the key of the card code
+    on the cell index, 0 for EMPTY. The key of a board (Board.zobrist) is the XOR of the keys of its cells.
+    The keys of a cell are the same on boards of any size """
+    rng = random.Random(0)
+    keys = [0] * (size << 8)
+    for index in range(size):
+        for code in range(DECK_SIZE):
+            keys[index << 8 | code] = rng.getrandbits(64)
+    return keys
+
+
+def line_cells(col, row, number_of_cards, horizontal, rows=BOARD_ROWS):
+    """ Return the cell indexes of a line starting at col, row and going right or down """
+    if horizontal:
+        return [(col + i) * rows + row for i in range(number_of_cards)]
+    return [col * rows + row + i for i in range(number_of_cards)]
+
+
+def compile_line(cells):
+    """ Return the cell mask, the pair mask (the first cell of each pair of neighbours) and the cell index triples
+    (overlapping lines of 3 cards, see TRIPLE_RELATIONS) of a line of 3 or more cells """
+    starts = sorted(set(list(range(0, len(cells) - 2, 2)) + [len(cells) - 3]))
+    triples = tuple(tuple(cells[start:start + 3]) for start in starts)
+    return sum(1 << index for index in cells), sum(1 << index for index in cells[:-1]), triples
+
+
+def compile_rules(rules=SCORING_RULES, columns=BOARD_COLUMNS, rows=BOARD_ROWS):
+    """ Compile scoring rules for a board of columns x rows. Return the checks in order:
+    (horizontal, number of cards, lines, scores, cell lines). lines are the lines of the check in scan order:
+    (mask, pair mask, triples, col, row, intersects), see compile_line. The intersects of a horizontal line are
+    the 3 cards columns below it: (triples, pair mask, cells removed with the line as (col, row)).
+    scores[relation] is (points, intersect points, always intersect, rule) of the first rule a line of that
+    relation matches, rule is its (horizontal, number of cards, kind), None if there is none. cell_lines[index] is
+    the mask of the lines (bit i is lines[i]) through the cell index, so a board finds the lines of its changed
+    cells without scanning all of them """
+    checks = []
+    for horizontal, number_of_cards, kind, points, intersect_points in rules:
+        if not 3 <= number_of_cards <= (columns if horizontal else rows):
+            raise ValueError('A line of %d cards does not fit a %dx%d board' % (number_of_cards, columns, rows))
+        if not checks or checks[-1][:2] != (horizontal, number_of_cards):
+            lines = []
+            cell_lines = [0] * (columns * rows)
+            for col in range(columns - number_of_cards + 1 if horizontal else columns):
+                for row in range(rows if horizontal else rows - number_of_cards + 1):
+                    intersects = []
+                    if horizontal and row < rows - 2:
+                        for intersect_col in INTERSECT_COLUMNS.get(number_of_cards, ((number_of_cards - 1) // 2,)):
+                            mask, pair_mask, triples = compile_line(line_cells(col + intersect_col, row, 3, False,
+                                                                               rows))
+                            removed = [(col + intersect_col, row + i) for i in range(1, 3)]
+                            intersects.append((triples, pair_mask, removed))
+                    cells = line_cells(col, row, number_of_cards, horizontal, rows)
+                    for index in cells:
+                        cell_lines[index] |= 1 << len(lines)
+                    lines.append(compile_line(cells) + (col, row, intersects))
+            checks.append((horizontal, number_of_cards, lines, [None] * (ALL_RELATIONS + 1), cell_lines))
+        scores = checks[-1][3]
+        always_intersect = (number_of_cards, kind) in ALWAYS_INTERSECT
+        for relation in range(ALL_RELATIONS + 1):
+            if scores[relation] is None and KINDS[kind](relation):
+                scores[relation] = (points, intersect_points, always_intersect,
+                                    (horizontal, number_of_cards, kind))
+    return checks
+
+
+class BoardLayout(object):
+    """ The size of a board, columns x rows, and its scoring rules compiled for that size. The boards and
+    the games of a size share a layout, e.g. BoardLayout(20, 30) for an endless variant. The cell col, row is
+    cells[col * rows + row] and bit col * rows + row of the cell masks. Raise ValueError if a rule doesn't fit """
+    def __init__(self, columns=BOARD_COLUMNS, rows=BOARD_ROWS, rules=SCORING_RULES):
+        self.columns = columns
+        self.rows = rows
+        self.size = columns * rows
+        self.all_cells = (1 << self.size) - 1
+        self.start_column = columns // 2  # the active card starts on the center column
+        self.checks = compile_rules(rules, columns, rows)
+        self.zobrist = zobrist_keys(self.size)
+        self.line_triples = {}
+
+    def triples(self, col, row, number_of_cards, horizontal):
+        """ Return the cell index triples of a line (see compile_line) """
+        key = (col, row, number_of_cards, horizontal)
+        triples = self.line_triples.get(key)
+        if triples is None:
+            triples = compile_line(line_cells(col, row, number_of_cards, horizontal, self.rows))[2]
+            self.line_triples[key] = triples
+        return triples
+
+
+# The default 5x5 board, its compiled scoring rules, Zobrist keys and mask of all cells
+DEFAULT_LAYOUT = BoardLayout()
+RULE_CHECKS = DEFAULT_LAYOUT.checks
+ZOBRIST = DEFAULT_LAYOUT.zobrist
+ALL_CELLS = DEFAULT_LAYOUT.all_cells
+
+
+def card_code(suit, number):
+    """ Return the code of the card suit ('H', 'D', 'C' or 'S'), number """
+    return DECK_SUITS.index(suit) * DECK_SIZE_PER_SUIT + number - DECK_NUM_START
+
+
+def card_name(code):
+    """ Return the name of a card code e.g., 'H-1' """
+    return DECK_SUITS[CARD_SUIT[code]] + '-' + str(CARD_NUMBER[code])
+
+
+# Engine classes
+class Card(object):
+    """ The active (falling) card. Cards on the deck, the pack and the board are card codes only """
+    __slots__ = ('code', 'x', 'y', 'board_x', 'board_y', 'limit', 'is_at_bottom')
+
+    def __init__(self, code, x=ACTIVE_CARD_START_X, y=ACTIVE_CARD_START_Y):
+        self.code = code
+        self.x = x
+        self.y = y
+        self.board_x = x
+        self.board_y = -1
+        self.limit = False
+        self.is_at_bottom = False
+
+    def set_card_board_coord(self):
+        """ Set board array index for cards according with card's position """
+        self.board_x = self.x
+        self.board_y = (self.y + STEPS_PER_ROW - 1) // STEPS_PER_ROW
+        # Card is in lower possible place (limit) on current row
+        self.limit = self.y % STEPS_PER_ROW == 0
+
+    def can_move_down(self, board):
+        """ return True if cards can move down else return False """
+        # If the card is not at the limit of its row it can move down
+        if not self.limit:
+            return True
+        else:
+            # If the card is at the limit then:
+            # a. check if it reached the bottom of the board
+            rows = board.layout.rows
+            if self.board_y == rows - 1:
+                self.is_at_bottom = True
+                return False
+            # b. check if there is another card below it
+            elif board.cells[self.board_x * rows + self.board_y + 1] != EMPTY:
+                return False
+            else:
+                return True
+
+    def can_move_left(self, board):
+        """ return True if cards can move left else return False """
+        if self.x > 0:
+            if self.board_y == -1 or board.cells[(self.x - 1) * board.layout.rows + self.board_y] == EMPTY:
+                return True
+        return False
+
+    def can_move_right(self, board):
+        """ return True if cards can move right else return False """
+        if self.x < board.layout.columns - 1:
+            if self.board_y == -1 or board.cells[(self.x + 1) * board.layout.rows + self.board_y] == EMPTY:
+                return True
+        return False
+
+
+class Deck(object):
+    __slots__ = ('cards', 'rng')
+
+    def __init__(self, rng=random):
+        self.cards = []
+        self.rng = rng
+        self.populate(DECK_SUITS, DECK_NUM_START, DECK_NUM_STOP)
+
+    def populate(self, suits, num_start, num_stop):
+        """ Populate Deck """
+        for cardSuit in suits:
+            for cardNumber in range(num_start, num_stop + 1):
+                self.cards.append(card_code(cardSuit, cardNumber))
+
+    def get_one_card(self):
+        """ Return a random card code from the deck, None if the deck is empty """
+        if len(self.cards):
+            return self.cards.pop(self.rng.randrange(0, len(self.cards)))
+        else:
+            return None
+
+
+class Pack(object):
+    __slots__ = ('number_of_cards', 'cards', 'deck')
+
+    def __init__(self, number_of_cards, deck):
+        self.number_of_cards = number_of_cards
+        self.cards = []
+        self.deck = deck
+        self.populate()
+
+    def populate(self):
+        for x in range(self.number_of_cards):
+            self.cards.append(self.deck.get_one_card())
+
+    def rotate_clockwise(self, active_card):
+        """ Change the active card clockwise. Return the active card """
+        # Rotate only if cards has cards(s)
+        if len(self.cards) > 0 and active_card:
+            # Put the active card at position 0 and make the last card of the pack the active card.
+            # The active card keeps its position
+            self.cards.insert(0, active_card.code)
+            active_card.code = self.cards.pop()
+        return active_card
+
+    def rotate_counterclockwise(self, active_card):
+        """ Change the active card counterclockwise. Return the active card """
+        # Rotate only if cards has cards(s)
+        if len(self.cards) > 0 and active_card:
+            # Put the active card at the end and make the first card of the pack the active card
+            self.cards.append(active_card.code)
+            active_card.code = self.cards.pop(0)
+        return active_card
+
+
+class Board(object):
+    """ The board cells are a bytearray of card codes (EMPTY if there is no card). The cell col, row
+    is cells[col * layout.rows + row], layout is the size and the rules of the board (DEFAULT_LAYOUT if None).
+    zobrist is the Zobrist key of the cells, kept up to date by set_cell. dirty is the mask of the cells
+    changed since check_board last found no combination: a line without dirty cells is not a combination,
+    so check_board checks only the lines through dirty cells """
+    __slots__ = ('cells', 'zobrist', 'events', 'dirty', 'layout')
+
+    def __init__(self, events=None, layout=None):
+        self.layout = layout if layout is not None else DEFAULT_LAYOUT
+        self.cells = bytearray([EMPTY]) * self.layout.size
+        self.zobrist = 0
+        self.dirty = 0
+        self.events = events if events is not None else []
+
+    def copy(self, events=None):
+        """ Return a copy of the board that records its events on events """
+        board = self.__class__(events, self.layout)
+        board.cells[:] = self.cells
+        board.zobrist = self.zobrist
+        board.dirty = self.dirty
+        return board
+
+    def get_cell(self, col, row):
+        """ Return the card code at col, row or EMPTY """
+        return self.cells[col * self.layout.rows + row]
+
+    def reward(self, col, row, points, rule):
+        """ Record a combination found at col, row. rule is the scoring rule matched and whether the line
+        intersected: (horizontal, number of cards, kind, intersect) """
+        self.events.append((EVENT_COMBINATION, col, row, points, rule))
+
+    def set_cell(self, col, row, code):
+        """ Put card code (or EMPTY) at col, row. Every change of the cells goes through here """
+        layout = self.layout
+        index = col * layout.rows + row
+        self.zobrist ^= layout.zobrist[index << 8 | self.cells[index]] ^ layout.zobrist[index << 8 | code]
+        self.cells[index] = code
+        self.dirty |= 1 << index
+
+    def clear_cell(self, col, row):
+        """ Remove the card at col, row """
+        if self.cells[col * self.layout.rows + row] != EMPTY:
+            self.set_cell(col, row, EMPTY)
+            self.events.append((EVENT_REMOVE, col, row))
+
+    def remove_and_scroll_down(self, col, row, columns):
+        # remove cards
+        for i in range(columns):
+            self.clear_cell(col + i, row)
+        # scroll down the above cards
+        cells = self.cells
+        rows = self.layout.rows
+        for x in range(col, col + columns):
+            for y in range(row - 1, -1, -1):
+                code = cells[x * rows + y]
+                if code != EMPTY:
+                    self.set_cell(x, y, EMPTY)
+                    self.set_cell(x, y + 1, code)
+
+    def is_filled_horizontal(self, col, row, number_of_cards):
+        """ Return True if there are number_of_cards cards on the right of col, row (included) """
+        rows = self.layout.rows
+        index = col * rows + row
+        return EMPTY not in self.cells[index:index + number_of_cards * rows:rows]
+
+    def is_filled_vertical(self, col, row, number_of_cards):
+        """ Return True if there are number_of_cards cards below col, row (included) """
+        index = col * self.layout.rows + row
+        return EMPTY not in self.cells[index:index + number_of_cards]
+
+    def check_board(self):
+        """ Game Logic. Check board for combinations """
+        """ Return the points of the combination found (cards are rearranged and need recheck), 0 otherwise """
+        if VERIFY_CHECKS:
+            full_scan = self.copy([])
+            full_scan.dirty = self.layout.all_cells
+            expected = full_scan.check_combinations()
+            events = len(self.events)
+        points = self.check_combinations()
+        if VERIFY_CHECKS and (points != expected or self.cells != full_scan.cells or
+                              self.events[events:] != full_scan.events):
+            raise AssertionError('check_board found %d points, a full scan %d' % (points, expected))
+        if not points:
+            self.dirty = 0
+        return points
+
+    def check_combinations(self):
+        """ Find, score and remove the first combination of the lines with dirty cells. Return its points or 0 """
+        for check in self.layout.checks:
+            points = self.check_lines(check)
+            if points:
+                return points
+        return 0
+
+    def check_lines(self, check):
+        """ Find, score and remove the first combination of the lines with dirty cells of a compiled check
+        (see compile_rules). Return its points or 0 """
+        horizontal, number_of_cards, lines, scores, cell_lines = check
+        cells = self.cells.translate(CELL_CODES)
+        dirty_lines = self.dirty_lines(cell_lines)
+        while dirty_lines:
+            line_bit = dirty_lines & -dirty_lines
+            dirty_lines ^= line_bit
+            line = lines[line_bit.bit_length() - 1]
+            relation = ALL_RELATIONS
+            for a, b, c in line[2]:
+                relation &= TRIPLE_RELATIONS[(cells[a] << CELL_CODE_BITS | cells[b]) << CELL_CODE_BITS | cells[c]]
+                if not relation:
+                    break
+            score = scores[relation]
+            if score is not None:
+                return self.score_line(horizontal, number_of_cards, line, score)
+        return 0
+
+    def dirty_lines(self, cell_lines):
+        """ Return the mask of the lines through dirty cells of a compiled check, given its cell lines
+        (see compile_rules). The lines are found from the dirty cells, not by a scan of all the lines """
+        dirty = self.dirty
+        lines = 0
+        while dirty:
+            cell_bit = dirty & -dirty
+            dirty ^= cell_bit
+            lines |= cell_lines[cell_bit.bit_length() - 1]
+        return lines
+
+    def line_relation(self, triples):
+        """ Return the relation of the cards of a line, given as cell index triples (see compile_line) """
+        cells = self.cells.translate(CELL_CODES)
+        relation = ALL_RELATIONS
+        for a, b, c in triples:
+            relation &= TRIPLE_RELATIONS[(cells[a] << CELL_CODE_BITS | cells[b]) << CELL_CODE_BITS | cells[c]]
+        return relation
+
+    def score_line(self, horizontal, number_of_cards, line, score):
+        """ Score and remove the combination of a line (see compile_rules). Return its points """
+        mask, pair_mask, triples, col, row, intersects = line
+        points, intersect_points, always_intersect, rule = score
+        intersect = False
+        if horizontal:
+            for intersect_triples, intersect_pair_mask, removed in intersects:
+                if always_intersect or self.line_relation(intersect_triples):
+                    # Intersect Found, remove the intersected column. Its 1st card is removed with the line
+                    points = intersect_points
+                    intersect = True
+                    for intersect_col, intersect_row in removed:
+                        self.clear_cell(intersect_col, intersect_row)
+                    break
+            self.reward(col, row, points, rule + (intersect,))
+            self.remove_and_scroll_down(col, row, number_of_cards)
+        else:
+            self.reward(col, row, points, rule + (intersect,))
+            # remove cards
+            for i in range(number_of_cards):
+                self.clear_cell(col, row + i)
+        return points
+
+    def is_same_suit_vertical(self, col, start_row, number_of_cards):
+        """ Return True if same suit vertical """
+        relation = self.line_relation(self.layout.triples(col, start_row, number_of_cards, False))
+        return bool(relation & RELATION_SAME_SUIT)
+
+    def is_same_number_vertical(self, col, start_row, number_of_cards):
+        """ Return True if same number vertical """
+        relation = self.line_relation(self.layout.triples(col, start_row, number_of_cards, False))
+        return bool(relation & RELATION_SAME_NUMBER)
+
+    def is_same_suit_horizontal(self, start_col, row, number_of_cards):
+        """ Return True if same suit horizontal """
+        relation = self.line_relation(self.layout.triples(start_col, row, number_of_cards, True))
+        return bool(relation & RELATION_SAME_SUIT)
+
+    def is_same_number_horizontal(self, start_col, row, number_of_cards):
+        """ Return True if same number horizontal """
+        relation = self.line_relation(self.layout.triples(start_col, row, number_of_cards, True))
+        return bool(relation & RELATION_SAME_NUMBER)
+
+    def is_sequence(self, col, row, number_of_cards, is_horizontal):
+        """ Returns True if cards in horizontal or vertical sequence (normal: 2,3,4 or 4,3,2 - rotated: Q,K,A,2 or
+        3,2,A,K etc). A missing card breaks the sequence """
+        relation = self.line_relation(self.layout.triples(col, row, number_of_cards, is_horizontal))
+        return bool(relation & (RELATION_ASCENT | RELATION_DESCENT))
+
+
+class Game(object):
+    """ The state of a game: score, stage, level, speed and the current stage's board, deck and pack.
+    The deck of every game draws from its own random generator, seeded with seed (a random seed if None),
+    so the same seed and the same inputs always play the same game. rng replaces the seeded generator.
+    The boards are of layout, the default 5x5 board if None """
+    __slots__ = ('seed', 'rng', 'board_class', 'layout', 'events', 'ticks', 'score', 'stage', 'level', 'game_speed',
+                 'board', 'deck', 'pack', 'active_card', 'game_over', 'clearing_the_stage', 'stage_cleared',
+                 'cards_to_clear')
+
+    def __init__(self, rng=None, board_class=Board, seed=None, layout=None):
+        if rng is None:
+            if seed is None:
+                seed = random.getrandbits(SEED_BITS)
+            rng = random.Random(seed)
+        self.seed = seed
+        self.rng = rng
+        self.board_class = board_class
+        self.layout = layout if layout is not None else DEFAULT_LAYOUT
+        self.ticks = 0  # number of ticks played, the time base of replays
+        self.events = []
+        self.score = 0
+        self.stage = self.level = 1
+        self.game_speed = GAME_SPEED_NORMAL
+        self.board = None
+        self.deck = None
+        self.pack = None
+        self.active_card = None
+        self.game_over = False
+        self.clearing_the_stage = False
+        self.stage_cleared = False
+        self.cards_to_clear = []
+
+    def new_stage(self):
+        """ Initialize board, deck, pack and active card for a new stage """
+        self.game_over = False
+        self.clearing_the_stage = False
+        self.stage_cleared = False
+        self.cards_to_clear = []
+        # Initialize Game Board, 5x5 table by default
+        self.board = self.board_class(self.events, self.layout)
+        # Create Game Deck
+        self.deck = Deck(self.rng)
+        # Create first 3 visible card pack
+        self.pack = Pack(CARDS_IN_PACK, self.deck)
+        # Create first active card
+        self.active_card = Card(self.deck.get_one_card(), self.layout.start_column)
+
+    def fall_speed(self, fast=False):
+        """ Return the falling speed of the active card in cells per second.
+        game_speed (or GAME_SPEED_FAST if fast) is the number of ticks per second """
+        return float(GAME_SPEED_FAST if fast else self.game_speed) / STEPS_PER_ROW
+
+    def cards_left(self):
+        """ Return the number of cards not yet played on this stage """
+        return len(self.deck.cards) + len(self.pack.cards)
+
+    def pop_events(self):
+        """ Return and forget the events recorded since the last call """
+        events = self.events[:]
+        del self.events[:]
+        return events
+
+    def move_left(self):
+        if self.active_card and self.active_card.can_move_left(self.board):
+            self.active_card.x -= 1
+
+    def move_right(self):
+        if self.active_card and self.active_card.can_move_right(self.board):
+            self.active_card.x += 1
+
+    def rotate_clockwise(self):
+        self.active_card = self.pack.rotate_clockwise(self.active_card)
+
+    def rotate_counterclockwise(self):
+        self.active_card = self.pack.rotate_counterclockwise(self.active_card)
+
+    def tick(self):
+        """ Advance the game by one frame: move the active card one step down or land it,
+        or remove one remaining card while clearing the stage """
+        if self.game_over or self.stage_cleared:
+            return
+        self.ticks += 1
+        if self.active_card:
+            self.active_card.set_card_board_coord()
+            if self.active_card.can_move_down(self.board):
+                self.active_card.y += 1
+            else:
+                self.land()
+        if self.clearing_the_stage:
+            self.clear_step()
+
+    def drop(self):
+        """ Drop the active card straight down, land it and resolve the stage if it was the last card.
+        Used by headless players that choose the column before the card falls """
+        if self.game_over or self.stage_cleared or not self.active_card:
+            return
+        card = self.active_card
+        card.set_card_board_coord()
+        cells = self.board.cells
+        rows = self.layout.rows
+        column = card.x * rows
+        # The card stops above the first card in its column (or at the bottom)
+        row = card.board_y if card.board_y > -1 else 0
+        while row < rows and cells[column + row] == EMPTY:
+            row += 1
+        card.y = (row - 1) * STEPS_PER_ROW
+        card.set_card_board_coord()
+        self.land()
+        while self.clearing_the_stage:
+            self.clear_step()
+
+    def land(self):
+        """ Place the active card on the board and check for combinations """
+        card = self.active_card
+        # Check if active cards is not on top of 3 cards pack
+        if card.board_y > -1:
+            # active card is not outside of board
+            # Place active card in current Board location
+            self.board.set_cell(card.board_x, card.board_y, card.code)
+            self.events.append((EVENT_PLACE, card.board_x, card.board_y))
+            self.active_card = None
+            # Check board for combinations until all of them are scored
+            points = self.board.check_board()
+            while points:
+                self.score += points
+                points = self.board.check_board()
+            # Make next active card from pack if pack has card(s)
+            if len(self.pack.cards):
+                self.active_card = Card(self.pack.cards.pop(), self.layout.start_column)
+                # Fill pack with deck card if deck has card(s)
+                if len(self.deck.cards):
+                    self.pack.cards.insert(0, self.deck.get_one_card())
+            else:
+                # Out of cards - Stage Over
+                # Put the board coordinates of all remaining cards in the list: cards_to_clear
+                # Check empty stage to give bonus
+                # and activate flag: clearing_the_stage
+                for i in range(self.layout.columns):
+                    for j in range(self.layout.rows):
+                        if self.board.get_cell(i, j) != EMPTY:
+                            self.cards_to_clear.append((i, j))
+                if not len(self.cards_to_clear):
+                    # Stage dont have remaining cards, give bonus
+                    points = 1000 + ((self.level - 1) * 100)
+                    self.score += points
+                    self.events.append((EVENT_BONUS, 1, 5, points))
+                self.clearing_the_stage = True
+        else:
+            # Card on top of 5 cards pile - GAME OVER
+            self.game_over = True
+
+    def clear_step(self):
+        """ Remove one remaining card with a penalty, or finish the stage when no cards remain """
+        if len(self.cards_to_clear):
+            col, row = self.cards_to_clear.pop()
+            points = -100 * self.level
+            self.score += points
+            self.board.clear_cell(col, row)
+            self.events.append((EVENT_PENALTY, col, row, points))
+        else:
+            # Stage cleared
+            self.clearing_the_stage = False
+            if self.score > 0:
+                self.next_stage()
+            else:
+                self.game_over = True
+
+    def next_stage(self):
+        """ Advance stage, level and game speed """
+        self.stage += 1
+        self.level = self.stage // 3 + 1  # get level every 3 stages
+        if self.stage % 10:
+            self.game_speed += 2  # Increase game speed +2 on every stage
+        else:
+            self.game_speed = GAME_SPEED_NORMAL  # every 10 stages reset speed
+        self.stage_cleared = True
+
+
+def random_policy(game, rng=random):
+    """ A headless player that rotates the pack and moves the active card to a random column """
+    for i in range(rng.randrange(0, len(game.pack.cards) + 1)):
+        game.rotate_clockwise()
+    column = rng.randrange(0, game.layout.columns)
+    for i in range(game.active_card.x - column):
+        game.move_left()
+    for i in range(column - game.active_card.x):
+        game.move_right()
+
+
+def play_game(policy=random_policy, rng=None, max_stages=None, board_class=Board, seed=None, on_events=None,
+              game=None, layout=None):
+    """ Play a complete game headless on a board of layout (the default 5x5 board if None). policy is called
+    with the game before each card drops and on_events, if given, with the events of each drop. game, if given,
+    is played on from its state (e.g., a restored snapshot) instead of a new game """
+    if game is None:
+        game = Game(rng, board_class, seed, layout)
+    while True:
+        if game.board is None or game.stage_cleared:
+            game.new_stage()
+        # A restored game may be clearing the stage (it was suspended between ticks)
+        while game.clearing_the_stage:
+            game.clear_step()
+        while not (game.game_over or game.stage_cleared):
+            policy(game)
+            game.drop()
+            if on_events is not None:
+                on_events(game.events)
+            del game.events[:]
+        if game.game_over or (max_stages and game.stage > max_stages):
+            return game
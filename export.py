@@ -0,0 +1,227 @@
+""" Drop Card Game frame export
+Renders a replay to numbered frame files for gameplay videos: PNG images or raw RGB frames (GAME_WIDTH *
+GAME_HEIGHT * 3 bytes, rows from the top) that a video encoder reads. The frames are drawn on an offscreen
+surface by the draw code of the game window (dropcard.draw_game, the HUD, the rewards and the effects) under
+the SDL dummy video driver, so no window is opened and they match what players see.
+
+A replay is played as the window plays it (dropcard.playback_stage), by the same frame loops
+(dropcard.IntroFrames and dropcard.StageFrames): the intro of every stage, the stages and GAME_OVER_TIME of
+the game over screen, with a fixed frame time of 1000 / fps ms instead of the clock of the window. Playing
+frames without drawing them costs little next to drawing and saving them, so the frame range is split in
+chunks over worker processes and every worker plays the replay from the start and draws the frames of its
+chunks only. PNG frames are compressed at a fast zlib level (--compression), raw frames are faster still to
+save.
+
+Usage: python export.py game.replay frames/
+       python export.py game.replay frames/ --format rgb --workers 4
+       cat frames/*.rgb | ffmpeg -f rawvideo -pix_fmt rgb24 -s 800x730 -r 60 -i - game.mp4
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import struct
+import time
+import zlib
+import pygame
+import assets
+import dropcard
+from engine import Game
+from render import OffscreenRenderer
+from replay import Replay, ReplayPlayer
+
+EXPORT_FPS = dropcard.RENDER_FPS
+GAME_OVER_TIME = 3000  # ms of the game over screen at the end of the export
+FORMATS = ('png', 'rgb')
+PNG_COMPRESSION = 1  # zlib level of the PNG frames, higher levels are smaller and much slower to save
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+CHUNK_FRAMES = 300  # frames drawn by a worker job
+
+
+class FramePlayer(object):
+    """ Plays a replay as the window plays it, one frame of 1000 / fps ms at a time. If surface is given
+    the frames from start on are drawn on it, frames() yields the number of each frame once it is drawn """
+    def __init__(self, replay, surface=None, fps=EXPORT_FPS, start=0):
+        self.replay = replay
+        self.surface = surface
+        self.frame_time = 1000.0 / fps
+        self.start = start
+        self.frame = 0
+
+    def drawing(self):
+        return self.surface is not None and self.frame >= self.start
+
+    def frames(self):
+        # The rewards of the window are module globals of dropcard
+        del dropcard.rewards[:]
+        game = Game(seed=self.replay.seed)
+        player = ReplayPlayer(self.replay)
+        while True:
+            for frame in self.intro_frames(game):
+                yield frame
+            cleared = []
+            for frame in self.stage_frames(game, player, cleared):
+                yield frame
+            if not cleared:
+                return
+
+    def intro_frames(self, game):
+        """ The frames of dropcard.intro_stage """
+        frames = dropcard.IntroFrames(dropcard.stage_label(game.stage) if self.surface is not None else None)
+        while not frames.done():
+            frames.advance(self.frame_time)
+            if self.drawing():
+                dropcard.draw_intro(self.surface, frames.timeline)
+            yield self.frame
+            self.frame += 1
+
+    def stage_frames(self, game, player, cleared):
+        """ The frames of dropcard.game_stage played by player. cleared gets True if the stage was cleared """
+        if game.board is None or game.stage_cleared:
+            game.new_stage()
+        if self.surface is not None:
+            card_images = assets.load_card_images()
+            hud = dropcard.game_hud()
+            renderer = OffscreenRenderer(self.surface, hud.surface)
+        frames = dropcard.StageFrames(game)
+        game_over_time = 0
+        while game_over_time < GAME_OVER_TIME:
+            frames.advance(self.frame_time, player.fast, player)
+            if game.stage_cleared:
+                cleared.append(True)
+                return
+            if self.drawing():
+                dropcard.draw_game(renderer, hud, game, card_images, frames.active_y(), frames.timeline)
+                if game.game_over:
+                    dropcard.draw_game_over(renderer)
+                renderer.end()
+            elif self.surface is not None:
+                # Values are drawn over the previous ones, update the HUD as if the frames before were drawn
+                hud.update(game.cards_left(), game.stage, game.level, game.score)
+            if game.game_over:
+                game_over_time += self.frame_time
+            yield self.frame
+            self.frame += 1
+
+
+def count_frames(replay, fps=EXPORT_FPS):
+    """ Return the number of frames of a replay """
+    count = 0
+    for frame in FramePlayer(replay, fps=fps).frames():
+        count += 1
+    return count
+
+
+def frame_path(output, frame, frame_format):
+    return os.path.join(output, 'frame-%06d.%s' % (frame, frame_format))
+
+
+def png_chunk(kind, body):
+    return struct.pack('>I', len(body)) + kind + body + struct.pack('>I', zlib.crc32(kind + body) & 0xFFFFFFFF)
+
+
+def png_bytes(data, width, height, compression=PNG_COMPRESSION):
+    """ Return the PNG image of RGB data: 8 bits per channel, rows not filtered. pygame.image.save always
+    compresses PNG images at a high level, which takes several times longer than drawing a frame """
+    stride = width * 3
+    rows = b''.join([b'\x00' + data[offset:offset + stride] for offset in range(0, len(data), stride)])
+    return (PNG_SIGNATURE + png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+            png_chunk(b'IDAT', zlib.compress(rows, compression)) + png_chunk(b'IEND', b''))
+
+
+def save_frame(surface, path, frame_format, compression=PNG_COMPRESSION):
+    data = pygame.image.tobytes(surface, 'RGB')
+    if frame_format == 'png':
+        data = png_bytes(data, surface.get_width(), surface.get_height(), compression)
+    with open(path, 'wb') as frame_file:
+        frame_file.write(data)
+
+
+def init_worker():
+    """ Workers ignore Ctrl+C, the main process stops them. They draw with the dummy video driver """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    # SDL would catch the SIGTERM of Pool.terminate() as a quit event
+    os.environ['SDL_NO_SIGNAL_HANDLERS'] = '1'
+    # Assets are loaded relative to the game directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    dropcard.init()
+
+
+def export_chunk(job):
+    """ Worker: draw and save the frames start to stop of a replay. Return the number of frames saved """
+    replay, start, stop, fps, output, frame_format, compression = job
+    surface = pygame.Surface((dropcard.GAME_WIDTH, dropcard.GAME_HEIGHT), 0, dropcard.win)
+    saved = 0
+    for frame in FramePlayer(replay, surface, fps, start).frames():
+        if frame >= stop:
+            break
+        if frame >= start:
+            save_frame(surface, frame_path(output, frame, frame_format), frame_format, compression)
+            saved += 1
+    return saved
+
+
+def export(replay, output, fps=EXPORT_FPS, frame_format='png', start=0, stop=None, workers=None,
+           chunk=CHUNK_FRAMES, progress=None, compression=PNG_COMPRESSION):
+    """ Save the frames start to stop (to the last frame if None) of a replay in the output directory.
+    Return the number of frames saved. progress, if given, is called with the frames saved and to save """
+    stop = min(stop, count_frames(replay, fps)) if stop is not None else count_frames(replay, fps)
+    if not os.path.isdir(output):
+        os.makedirs(output)
+    # The output directory is given to workers that run in the game directory
+    output = os.path.abspath(output)
+    jobs = [(replay, first, min(first + chunk, stop), fps, output, frame_format, compression)
+            for first in range(start, stop, chunk)]
+    total = max(stop - start, 0)
+    saved = 0
+    if not jobs:
+        return saved
+    pool = multiprocessing.Pool(min(workers or os.cpu_count(), len(jobs)), init_worker)
+    try:
+        for frames in pool.imap_unordered(export_chunk, jobs):
+            saved += frames
+            if progress is not None:
+                progress(saved, total)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return saved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render a Drop Card Game replay to numbered frame files')
+    parser.add_argument('replay', metavar='FILE')
+    parser.add_argument('output', metavar='DIRECTORY', help='directory of the frame files, created if needed')
+    parser.add_argument('--format', choices=FORMATS, default='png',
+                        help='png images or raw rgb frames (%dx%d, 3 bytes per pixel)' % (
+                            dropcard.GAME_WIDTH, dropcard.GAME_HEIGHT))
+    parser.add_argument('--compression', type=int, choices=range(10), default=PNG_COMPRESSION, metavar='0-9',
+                        help='zlib level of the png frames (default %d)' % PNG_COMPRESSION)
+    parser.add_argument('--fps', type=int, default=EXPORT_FPS, help='frames per second of game time')
+    parser.add_argument('--start', type=int, default=0, help='first frame to save')
+    parser.add_argument('--stop', type=int, default=None, help='save the frames before this one, all by default')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, the number of cores by default')
+    parser.add_argument('--chunk', type=int, default=CHUNK_FRAMES, help='frames sent to a worker at a time')
+    args = parser.parse_args(argv)
+    replay = Replay.load(args.replay)
+
+    def progress(saved, total):
+        print('\r%d/%d frames' % (saved, total), end='', flush=True)
+
+    start = time.perf_counter()
+    try:
+        saved = export(replay, args.output, args.fps, args.format, args.start, args.stop, args.workers, args.chunk,
+                       progress, args.compression)
+    except KeyboardInterrupt:
+        print('\nInterrupted')
+        return
+    elapsed = time.perf_counter() - start
+    if saved:
+        print()
+    print('%d frames (%.1f s of game) saved in %.1f s' % (saved, saved / float(args.fps), elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+""" Drop Card Game text and HUD
+TextCache keeps the most recently rendered texts so the same text is rasterized only once.
+Hud composes the game background with the HUD labels and values into one surface that
+changes only when a value changes.
+"""
+from collections import OrderedDict
+import pygame
+
+TEXT_CACHE_SIZE = 256
+
+
+class TextCache(object):
+    def __init__(self, size=TEXT_CACHE_SIZE):
+        self.size = size
+        self.surfaces = OrderedDict()
+
+    def render(self, font, text, color):
+        """ Return the rendered text, from the cache if it was rendered before """
+        key = (font, text, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = font.render(text, 1, color)
+            self.surfaces[key] = surface
+            # Forget the least recently used text
+            if len(self.surfaces) > self.size:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
+
+
+class Hud(object):
+    def __init__(self, background, text_cache, font, labels, fields, color=(255, 255, 255)):
+        """ labels is a list of (label surface, position) and fields a list of value positions """
+        self.background = background
+        self.text_cache = text_cache
+        self.font = font
+        self.color = color
+        self.fields = fields
+        self.surface = background.copy()
+        for label, pos in labels:
+            self.surface.blit(label, pos)
+        self.values = [None] * len(fields)
+        self.rects = [pygame.Rect(pos, (0, 0)) for pos in fields]
+
+    def update(self, *values):
+        """ Draw the values that changed. Return the list of the changed areas """
+        changed = []
+        for i, value in enumerate(values):
+            if value != self.values[i]:
+                old_rect = self.rects[i]
+                # Restore the background under the old value and draw the new one
+                self.surface.blit(self.background, old_rect, old_rect)
+                self.rects[i] = self.surface.blit(self.text_cache.render(self.font, str(value), self.color),
+                                                  self.fields[i])
+                self.values[i] = value
+                changed.append(old_rect)
+                changed.append(self.rects[i])
+        return changed
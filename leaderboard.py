@@ -0,0 +1,441 @@
+""" Drop Card Game leaderboard
+The leaderboard server keeps the best top_k scores of every seed and day (the UTC day the game ended) and of
+every day over all seeds in memory. Every flush_interval seconds, if a score was added, it saves them to its
+data file: the scores are written to a temporary file, synced and renamed over the data file, so a crash leaves
+the previous or the new file, never a partial one. The file is written by a thread, serving doesn't wait for
+the disk. The server runs on asyncio, one task per connection, so thousands of kiosks can stay connected.
+
+Protocol: JSON lines over TCP, one response line per request line
+    {"op": "submit", "scores": [SCORE, ...]}                  -> {"ok": true, "added": N}
+    {"op": "top", "seed": SEED or null, "day": DAY, "k": K}  -> {"ok": true, "scores": [SCORE, ...]}
+SCORE is a game_score(): name, score, stage, level, seed, ticks, time (seconds since the epoch at the end of
+the game) and id. N is the number of scores that made a board. A score is added once per id, so a batch sent
+again after a lost response doesn't add its scores twice. DAY is YYYY-MM-DD, today if not given, and a null
+SEED is the board of all the seeds of the day.
+An invalid request gets {"ok": false, "error": MESSAGE}.
+
+The game submits its scores with a LeaderboardClient: submit() only queues a score and a background thread
+sends the queued scores in batches. Scores stay queued while the server can't be reached.
+
+Usage: python leaderboard.py serve --data leaderboard.json
+       python leaderboard.py top --seed 42
+       python leaderboard.py loadtest --clients 2000
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+HOST = '127.0.0.1'
+PORT = 8765
+TOP_K = 100  # scores kept per board
+FLUSH_INTERVAL = 5.0  # seconds between saves of the scores
+BACKLOG = 4096  # pending connections of the server socket
+MAX_LINE = 1 << 20  # bytes of a request line
+BATCH_SIZE = 50  # scores sent by a client at most per request
+BATCH_INTERVAL = 1.0  # seconds a client waits for a full batch before it sends the scores queued
+RETRY_DELAY = 1.0  # seconds a client waits before it connects again, doubled on every failure
+MAX_RETRY_DELAY = 60.0
+TIMEOUT = 5.0  # seconds of client connections and requests
+MAX_TIME = 253402300800  # seconds since the epoch of the year 10000, the end of the days of the boards
+SCORE_FIELDS = (('name', str), ('score', int), ('stage', int), ('level', int), ('ticks', int),
+                ('time', (int, float)), ('id', str))
+
+
+def score_day(score):
+    """ Return the UTC day of the end of the game of a score """
+    return time.strftime('%Y-%m-%d', time.gmtime(score['time']))
+
+
+def game_score(game, name):
+    """ Return the score of a finished game for the leaderboard """
+    return {'name': name, 'score': game.score, 'stage': game.stage, 'level': game.level, 'seed': game.seed,
+            'ticks': game.ticks, 'time': time.time(), 'id': uuid.uuid4().hex}
+
+
+def check_score(score):
+    """ Return score with the fields of a game_score() only. Raise ValueError if a field is missing or invalid """
+    if not isinstance(score, dict):
+        raise ValueError('A score must be an object')
+    checked = {}
+    for name, field_type in SCORE_FIELDS:
+        value = score.get(name)
+        if not isinstance(value, field_type) or isinstance(value, bool):
+            raise ValueError('Invalid score field %s' % name)
+        checked[name] = value
+    # Not a NaN either, which JSON allows
+    if not 0 <= checked['time'] < MAX_TIME:
+        raise ValueError('Invalid score field time')
+    seed = score.get('seed')
+    if not check_seed(seed):
+        raise ValueError('Invalid score field seed')
+    checked['seed'] = seed
+    return checked
+
+
+def check_seed(seed):
+    """ Return True if seed is the seed of a board: an int or None (the board of all the seeds) """
+    return seed is None or isinstance(seed, int) and not isinstance(seed, bool)
+
+
+class LeaderboardServer(object):
+    """ The top_k scores of every board in memory, saved to path (if given) every flush_interval seconds.
+    boards maps (seed, day) to a list of (-score, order, score) in order, order is the order of arrival.
+    changes counts the changes of the boards, saved_changes the changes in the file """
+    def __init__(self, path=None, top_k=TOP_K, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.top_k = top_k
+        self.flush_interval = flush_interval
+        self.boards = {}
+        self.order = 0
+        self.changes = self.saved_changes = 0
+        self.server = None
+        self.flush_task = None
+        self.flush_lock = asyncio.Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    def add(self, score):
+        """ Add a checked score to the boards of its seed and day and of its day, where it is one of the top_k
+        scores. Return True if it was added to a board, False if it wasn't or if it was added before """
+        day = score_day(score)
+        self.order += 1
+        entry = (-score['score'], self.order, score)
+        added = False
+        for seed in (score['seed'], None) if score['seed'] is not None else (None,):
+            board = self.boards.setdefault((seed, day), [])
+            if len(board) >= self.top_k and entry > board[-1]:
+                continue
+            # A score sent again has the same points, look for its id among the scores of the same points only
+            index = bisect.bisect_left(board, entry[:1])
+            while index < len(board) and board[index][0] == entry[0]:
+                if board[index][2]['id'] == score['id']:
+                    break
+                index += 1
+            else:
+                bisect.insort(board, entry)
+                del board[self.top_k:]
+                self.changes += 1
+                added = True
+        return added
+
+    def top(self, seed=None, day=None, k=10):
+        """ Return the best k scores of the board of seed (all the seeds if None) and day (today if None) """
+        board = self.boards.get((seed, day or time.strftime('%Y-%m-%d', time.gmtime())), [])
+        return [entry[2] for entry in board[:k]]
+
+    def request(self, request):
+        """ Return the response of a request """
+        if not isinstance(request, dict):
+            raise ValueError('A request must be an object')
+        op = request.get('op')
+        if op == 'submit':
+            scores = request.get('scores')
+            if not isinstance(scores, list):
+                raise ValueError('scores must be a list')
+            # Check the whole batch first, an invalid batch adds no score
+            scores = [check_score(score) for score in scores]
+            return {'ok': True, 'added': sum(self.add(score) for score in scores)}
+        if op == 'top':
+            k = request.get('k', 10)
+            if not isinstance(k, int) or not 0 < k <= self.top_k:
+                raise ValueError('k must be 1 to %d' % self.top_k)
+            seed = request.get('seed')
+            if not check_seed(seed):
+                raise ValueError('seed must be an integer or null')
+            day = request.get('day')
+            if day is not None and not isinstance(day, str):
+                raise ValueError('day must be YYYY-MM-DD or null')
+            return {'ok': True, 'scores': self.top(seed, day, k)}
+        raise ValueError('Unknown op %r' % (op,))
+
+    async def handle(self, reader, writer):
+        """ Serve the requests of a connection until it is closed """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = self.request(json.loads(line))
+                except ValueError as error:
+                    response = {'ok': False, 'error': str(error)}
+                except Exception as error:
+                    # Any other request error is refused too, a client would send the request again forever
+                    # if the connection was dropped
+                    response = {'ok': False, 'error': 'Invalid request: %s' % error.__class__.__name__}
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            # The connection was lost or the request line is longer than MAX_LINE
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host=HOST, port=PORT):
+        """ Listen on host and port (any free port if 0) and start the flushes. Return the asyncio server """
+        self.server = await asyncio.start_server(self.handle, host, port, limit=MAX_LINE, backlog=BACKLOG)
+        self.flush_task = asyncio.ensure_future(self.flush_loop())
+        return self.server
+
+    async def close(self):
+        """ Stop serving and save the scores """
+        self.server.close()
+        await self.server.wait_closed()
+        self.flush_task.cancel()
+        try:
+            await self.flush_task
+        except asyncio.CancelledError:
+            pass
+        await self.flush()
+
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as error:
+                # The scores stay changed, the next flush saves them again
+                print('The leaderboard could not be saved to %s: %s' % (self.path, error))
+
+    async def flush(self):
+        """ Save the scores if a score was added since the last save. Flushes run one at a time """
+        async with self.flush_lock:
+            changes = self.changes
+            if not self.path or changes == self.saved_changes:
+                return
+            # The boards are copied here, the thread writes the copy while the server adds scores
+            data = json.dumps(self.dump())
+            write = asyncio.get_running_loop().run_in_executor(None, write_file, self.path, data)
+            try:
+                await asyncio.shield(write)
+            except asyncio.CancelledError:
+                # The thread writes on, the next flush waits for it
+                await write
+                raise
+            self.saved_changes = changes
+
+    def dump(self):
+        return {'version': 1, 'boards': [{'seed': seed, 'day': day, 'scores': [entry[2] for entry in board]}
+                                         for (seed, day), board in sorted(self.boards.items(), key=str)]}
+
+    def load(self):
+        with open(self.path) as data_file:
+            data = json.load(data_file)
+        for board in data['boards']:
+            entries = self.boards[(board['seed'], board['day'])] = []
+            for score in board['scores']:
+                self.order += 1
+                entries.append((-score['score'], self.order, score))
+
+
+def write_file(path, data):
+    """ Replace the file at path with data: write, sync and rename a temporary file """
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w') as data_file:
+        data_file.write(data)
+        data_file.flush()
+        os.fsync(data_file.fileno())
+    os.replace(temporary_path, path)
+
+
+class LeaderboardClient(object):
+    """ Sends scores to the leaderboard server at host, port from a background thread. submit() queues a
+    score and returns at once, the thread sends the queued scores when batch_size of them are queued or after
+    batch_interval seconds, over one connection it keeps open. sent and refused count the scores sent """
+    def __init__(self, host=HOST, port=PORT, batch_size=BATCH_SIZE, batch_interval=BATCH_INTERVAL, timeout=TIMEOUT):
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.timeout = timeout
+        self.pending = []
+        self.sent = 0
+        self.refused = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.connection = None
+        self.connection_file = None
+        self.thread = threading.Thread(target=self.run, name='leaderboard', daemon=True)
+        self.thread.start()
+
+    def submit(self, score):
+        """ Queue a game_score() to send """
+        with self.condition:
+            self.pending.append(score)
+            if len(self.pending) >= self.batch_size:
+                self.condition.notify()
+
+    def submit_game(self, game, name):
+        """ Queue the game_score() of a finished game to send """
+        self.submit(game_score(game, name))
+
+    def close(self, timeout=TIMEOUT):
+        """ Send the queued scores, waiting timeout seconds at most. Return the number of scores not sent """
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join(timeout)
+        with self.condition:
+            return len(self.pending)
+
+    def run(self):
+        """ Thread: send the queued scores in batches """
+        retry_delay = RETRY_DELAY
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.closed or len(self.pending) >= self.batch_size,
+                                        self.batch_interval)
+                batch = self.pending[:self.batch_size]
+                if not batch and self.closed:
+                    break
+            if not batch:
+                continue
+            try:
+                response = self.send(batch)
+            except (OSError, ValueError):
+                self.disconnect()
+                if self.closed:
+                    break
+                # Wait before connecting again, close() ends the wait
+                with self.condition:
+                    self.condition.wait_for(lambda: self.closed, retry_delay)
+                retry_delay = min(retry_delay * 2, MAX_RETRY_DELAY)
+                continue
+            retry_delay = RETRY_DELAY
+            with self.condition:
+                del self.pending[:len(batch)]
+                # Scores the server refuses would be refused again, they are dropped
+                if response.get('ok'):
+                    self.sent += len(batch)
+                else:
+                    self.refused += len(batch)
+        self.disconnect()
+
+    def send(self, batch):
+        """ Send a batch of scores and return the response. Raise OSError or ValueError if the server can't be
+        reached or the response is lost """
+        if self.connection is None:
+            self.connection = socket.create_connection((self.host, self.port), self.timeout)
+            self.connection_file = self.connection.makefile('rb')
+        self.connection.sendall(json.dumps({'op': 'submit', 'scores': batch}).encode() + b'\n')
+        line = self.connection_file.readline()
+        if not line:
+            raise OSError('Connection closed by the leaderboard server')
+        return json.loads(line)
+
+    def disconnect(self):
+        if self.connection is not None:
+            self.connection_file.close()
+            self.connection.close()
+            self.connection = None
+
+
+def query_top(host=HOST, port=PORT, seed=None, day=None, k=10, timeout=TIMEOUT):
+    """ Return the best k scores of a board of the server (see LeaderboardServer.top) """
+    with socket.create_connection((host, port), timeout) as connection:
+        connection.sendall(json.dumps({'op': 'top', 'seed': seed, 'day': day, 'k': k}).encode() + b'\n')
+        response = json.loads(connection.makefile('rb').readline())
+    if not response.get('ok'):
+        raise ValueError(response.get('error'))
+    return response['scores']
+
+
+def parse_address(text):
+    """ Return the host and port of HOST:PORT, PORT or HOST """
+    host, separator, port = text.rpartition(':')
+    if not separator:
+        return (HOST, int(text)) if text.isdigit() else (text, PORT)
+    return host or HOST, int(port)
+
+
+async def load_client(host, port, batches, batch_size, latencies):
+    """ Load test client: send batches of scores on one connection, append the time of every request """
+    reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE)
+    for i in range(batches):
+        scores = [{'name': 'load', 'score': (i * batch_size + j) * 7 % 5000, 'stage': 1, 'level': 1,
+                   'seed': j % 10, 'ticks': 1000, 'time': time.time(), 'id': uuid.uuid4().hex}
+                  for j in range(batch_size)]
+        start = time.perf_counter()
+        writer.write(json.dumps({'op': 'submit', 'scores': scores}).encode() + b'\n')
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - start)
+        if not response['ok']:
+            raise ValueError(response['error'])
+    writer.close()
+
+
+async def load_test(clients, batches, batch_size, path=None):
+    """ Start a server on a free loopback port and connect clients to it at once, each one sends batches of
+    batch_size scores. Return the time of the test and the time of every request """
+    server = LeaderboardServer(path)
+    port = (await server.start(HOST, 0)).sockets[0].getsockname()[1]
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[load_client(HOST, port, batches, batch_size, latencies) for i in range(clients)])
+    elapsed = time.perf_counter() - start
+    await server.close()
+    return elapsed, latencies
+
+
+def print_scores(scores):
+    for rank, score in enumerate(scores, 1):
+        print('%3d %-20s %8d  stage %d level %d  seed %s' % (rank, score['name'], score['score'], score['stage'],
+                                                             score['level'], score['seed']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Drop Card Game leaderboard server')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help='run the leaderboard server')
+    serve.add_argument('--address', type=parse_address, default=(HOST, PORT), metavar='HOST:PORT',
+                       help='address to listen on (default %s:%d)' % (HOST, PORT))
+    serve.add_argument('--data', default='leaderboard.json', metavar='FILE', help='file the scores are saved to')
+    serve.add_argument('--top', type=int, default=TOP_K, help='scores kept per board (default %d)' % TOP_K)
+    serve.add_argument('--flush-interval', type=float, default=FLUSH_INTERVAL,
+                       help='seconds between saves of the scores (default %g)' % FLUSH_INTERVAL)
+    top = commands.add_parser('top', help='print the best scores of a board')
+    top.add_argument('--address', type=parse_address, default=(HOST, PORT), metavar='HOST:PORT')
+    top.add_argument('--seed', type=int, default=None, help='seed of the board, all the seeds if not given')
+    top.add_argument('--day', default=None, metavar='YYYY-MM-DD', help='UTC day of the board, today if not given')
+    top.add_argument('-k', type=int, default=10, help='number of scores')
+    load = commands.add_parser('loadtest', help='measure a server on loopback with many concurrent clients')
+    load.add_argument('--clients', type=int, default=1000)
+    load.add_argument('--batches', type=int, default=10, help='requests per client')
+    load.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='scores per request')
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        server = LeaderboardServer(args.data, args.top, args.flush_interval)
+
+        async def serve_forever():
+            await server.start(*args.address)
+            print('Leaderboard serving on %s:%d' % args.address)
+            try:
+                await server.server.serve_forever()
+            finally:
+                await server.close()
+        try:
+            asyncio.run(serve_forever())
+        except KeyboardInterrupt:
+            pass
+    elif args.command == 'top':
+        print_scores(query_top(args.address[0], args.address[1], args.seed, args.day, args.k))
+    else:
+        elapsed, latencies = asyncio.run(load_test(args.clients, args.batches, args.batch_size))
+        latencies.sort()
+        print('%d clients, %d requests, %d scores in %.2f s: %.0f scores/s' % (
+            args.clients, len(latencies), len(latencies) * args.batch_size, elapsed,
+            len(latencies) * args.batch_size / elapsed))
+        print('request ms: p50 %.1f p99 %.1f max %.1f' % (latencies[len(latencies) // 2] * 1e3,
+                                                          latencies[int(0.99 * len(latencies))] * 1e3,
+                                                          latencies[-1] * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+""" Drop Card Game frame profiler
+Times the phases of every frame of the game loop. The loop calls begin_frame() at the start of a
+frame, mark(phase) at the end of each phase (a phase lasts from the previous mark) and end_frame().
+The timings of the last frames are kept in a ring buffer. They are shown by an overlay (FPS,
+50th and 99th percentile frame time and a bar per phase) and can be saved as a Chrome trace
+(chrome://tracing or https://ui.perfetto.dev).
+
+When the profiler is disabled the calls return at once, so the game loop can always call them.
+"""
+from collections import deque
+import json
+import time
+import pygame
+
+PROFILE_FRAMES = 600  # frames kept in the ring buffer
+OVERLAY_INTERVAL = 0.5  # seconds between overlay updates, rendering it costs time too
+OVERLAY_POS = (560, 480)  # below the HUD
+OVERLAY_SIZE = 230
+OVERLAY_FONT_SIZE = 20
+BAR_SCALE = 20  # pixels per ms
+PHASE_COLORS = [(230, 80, 80), (80, 200, 80), (80, 140, 240), (230, 200, 60), (200, 90, 220), (60, 210, 210),
+                (240, 140, 40), (160, 160, 160)]
+
+
+def percentile(values, fraction):
+    """ Return the value at fraction (0-1) of the sorted values, nearest rank """
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class FrameProfiler(object):
+    """ Phase timings of the last frames. Times are time.perf_counter() seconds """
+    def __init__(self, frames=PROFILE_FRAMES, enabled=False):
+        self.enabled = enabled
+        self.frames = deque(maxlen=frames)  # (frame start, [(phase, phase end), ...], frame end)
+        self.phases = []  # the phase names in order of their first mark
+        self.start = None
+        self.marks = None
+        self.overlay = None
+        self.overlay_time = 0
+        self.font = None
+
+    def toggle(self):
+        """ Enable or disable the profiler. The frames of a previous run are forgotten """
+        self.enabled = not self.enabled
+        self.frames.clear()
+        self.overlay = None
+        self.start = None
+
+    def begin_frame(self):
+        if self.enabled:
+            self.start = time.perf_counter()
+            self.marks = []
+
+    def mark(self, phase):
+        """ End the current phase of the frame """
+        if self.enabled and self.start is not None:
+            self.marks.append((phase, time.perf_counter()))
+
+    def end_frame(self):
+        if self.enabled and self.start is not None:
+            end = time.perf_counter()
+            for phase, mark_time in self.marks:
+                if phase not in self.phases:
+                    self.phases.append(phase)
+            self.frames.append((self.start, self.marks, end))
+            self.start = None
+
+    def phase_times(self, frame):
+        """ Return the durations in seconds of the phases of a frame by phase name """
+        start, marks, end = frame
+        durations = {}
+        for phase, mark_time in marks:
+            durations[phase] = durations.get(phase, 0) + mark_time - start
+            start = mark_time
+        return durations
+
+    def stats(self, exclude=('wait',)):
+        """ Return the FPS, the 50th and 99th percentile frame time and the mean time of each phase
+        (times in ms). Phases in exclude (the time waiting for the next frame) are not in the frame time """
+        if len(self.frames) < 2:
+            return None
+        frame_times = []
+        totals = dict((phase, 0.0) for phase in self.phases)
+        for frame in self.frames:
+            durations = self.phase_times(frame)
+            for phase, duration in durations.items():
+                totals[phase] += duration
+            frame_times.append((frame[2] - frame[0] - sum(durations.get(phase, 0) for phase in exclude)) * 1e3)
+        frame_times.sort()
+        elapsed = self.frames[-1][2] - self.frames[0][0]
+        return {'fps': (len(self.frames) - 1) / elapsed if elapsed else 0.0,
+                'p50': percentile(frame_times, 0.5),
+                'p99': percentile(frame_times, 0.99),
+                'phases': [(phase, totals[phase] * 1e3 / len(self.frames)) for phase in self.phases
+                           if phase not in exclude]}
+
+    def draw(self, target):
+        """ Draw the overlay on target (the window or a renderer). It is rendered again every OVERLAY_INTERVAL """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self.overlay is None or now - self.overlay_time >= OVERLAY_INTERVAL:
+            if self.font is None:
+                self.font = pygame.font.Font(None, OVERLAY_FONT_SIZE)
+            self.overlay = self.render_overlay(self.font)
+            self.overlay_time = now
+        if self.overlay is not None:
+            target.blit(self.overlay, OVERLAY_POS)
+
+    def render_overlay(self, font):
+        stats = self.stats()
+        if stats is None:
+            return None
+        line_height = font.get_linesize()
+        surface = pygame.Surface((OVERLAY_SIZE, line_height * (len(stats['phases']) + 2) + 4), pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 160))
+        surface.blit(font.render('FPS %.0f' % stats['fps'], True, (255, 255, 255)), (4, 2))
+        surface.blit(font.render('frame p50 %.2f p99 %.2f ms' % (stats['p50'], stats['p99']), True, (255, 255, 255)),
+                     (4, line_height + 2))
+        for i, (phase, duration) in enumerate(stats['phases']):
+            y = line_height * (i + 2) + 2
+            surface.blit(font.render('%s %.2f' % (phase, duration), True, (255, 255, 255)), (4, y))
+            width = max(1, min(int(duration * BAR_SCALE), OVERLAY_SIZE - 104))
+            surface.fill(PHASE_COLORS[i % len(PHASE_COLORS)], (100, y + 2, width, line_height - 4))
+        return surface
+
+    def trace(self):
+        """ Return the frames as a Chrome trace: a complete event per frame and per phase, times in us """
+        events = []
+        for frame in self.frames:
+            start, marks, end = frame
+            events.append({'name': 'frame', 'ph': 'X', 'pid': 1, 'tid': 1, 'ts': start * 1e6,
+                           'dur': (end - start) * 1e6})
+            for phase, mark_time in marks:
+                events.append({'name': phase, 'ph': 'X', 'pid': 1, 'tid': 1, 'ts': start * 1e6,
+                               'dur': (mark_time - start) * 1e6})
+                start = mark_time
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def save_trace(self, path):
+        with open(path, 'w') as trace_file:
+            json.dump(self.trace(), trace_file)
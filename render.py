@@ -0,0 +1,93 @@
+""" Drop Card Game renderers
+A renderer is the blit target of a frame. Call begin(), blit() everything the frame shows
+(in drawing order) and end() to show it on the display.
+
+FullRenderer redraws the background and updates the whole window every frame.
+DirtyRenderer remembers what was drawn on the previous frame and only redraws and updates
+the areas that changed: the old and new rect of every image that moved, appeared,
+disappeared or changed, and the areas of the background marked as changed.
+OffscreenRenderer draws every frame on a surface that is not shown, e.g. to save the frames.
+"""
+import pygame
+
+
+class FullRenderer(object):
+    def __init__(self, surface, background):
+        self.surface = surface
+        self.background = background
+
+    def begin(self):
+        """ Start a new frame """
+        self.surface.blit(self.background, (0, 0))
+
+    def blit(self, image, pos, key=None):
+        """ Draw image at pos """
+        self.surface.blit(image, pos)
+
+    def invalidate(self):
+        """ The window was drawn by someone else, redraw everything on the next frame """
+        pass
+
+    def mark_dirty(self, rect):
+        """ The background changed in rect, redraw it on the next frame """
+        pass
+
+    def end(self):
+        """ Show the frame """
+        pygame.display.update()
+
+
+class DirtyRenderer(FullRenderer):
+    def __init__(self, surface, background):
+        FullRenderer.__init__(self, surface, background)
+        self.items = []
+        self.last_keys = set()
+        self.marked = []
+        self.full_redraw = True
+
+    def begin(self):
+        self.items = []
+
+    def blit(self, image, pos, key=None):
+        """ Draw image at pos. Images are compared by key, or by image if there is no key.
+        Use a key (e.g. the rendered text) for images that are created again every frame """
+        rect = pygame.Rect(pos, image.get_size())
+        self.items.append((key if key is not None else image, image, rect))
+
+    def invalidate(self):
+        self.full_redraw = True
+
+    def mark_dirty(self, rect):
+        self.marked.append(pygame.Rect(rect))
+
+    def end(self):
+        keys = dict(((key, tuple(rect)), rect) for key, image, rect in self.items)
+        if self.full_redraw:
+            self.surface.blit(self.background, (0, 0))
+            for key, image, rect in self.items:
+                self.surface.blit(image, rect)
+            pygame.display.update()
+            self.full_redraw = False
+        else:
+            # Areas of the images that are not drawn the same way as on the previous frame
+            dirty = [rect for item, rect in keys.items() if item not in self.last_keys]
+            dirty += [pygame.Rect(item[1]) for item in self.last_keys if item not in keys]
+            dirty += self.marked
+            for dirty_rect in dirty:
+                # Redraw the background and every image over the dirty area only
+                self.surface.set_clip(dirty_rect)
+                self.surface.blit(self.background, dirty_rect, dirty_rect)
+                for key, image, rect in self.items:
+                    if rect.colliderect(dirty_rect):
+                        self.surface.blit(image, rect)
+            self.surface.set_clip(None)
+            if dirty:
+                pygame.display.update(dirty)
+        self.last_keys = set(keys)
+        self.marked = []
+
+
+class OffscreenRenderer(FullRenderer):
+    def end(self):
+        """ The frame is on the surface, nothing is shown """
+        pass
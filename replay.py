@@ -0,0 +1,152 @@
+""" Drop Card Game replays
+A replay is the seed of a game and the inputs of the player, each one stamped with the game tick
+it was applied before. Playing the inputs on a game with the same seed plays the same game again,
+so a replay is enough to reproduce a bug report or to verify a score.
+
+File format (little endian): the magic b'DCRP', the format version (1 byte), the seed (8 bytes)
+and then one varint per input: the ticks since the previous input shifted left by INPUT_BITS,
+OR the input.
+
+Usage: python replay.py FILE... plays the replays headless and prints their score
+"""
+import argparse
+import struct
+from engine import Game, Board
+
+REPLAY_MAGIC = b'DCRP'
+REPLAY_VERSION = 1
+HEADER = struct.Struct('<4sBQ')
+
+# Inputs
+INPUT_LEFT = 0
+INPUT_RIGHT = 1
+INPUT_ROTATE_CLOCKWISE = 2
+INPUT_ROTATE_COUNTERCLOCKWISE = 3
+INPUT_FAST_ON = 4  # the down key is pressed, the card falls fast
+INPUT_FAST_OFF = 5
+INPUT_QUIT = 6  # the player quit the game
+INPUT_BITS = 3
+
+
+def apply_input(game, action):
+    """ Apply a player input to the game """
+    if action == INPUT_LEFT:
+        game.move_left()
+    elif action == INPUT_RIGHT:
+        game.move_right()
+    elif action == INPUT_ROTATE_CLOCKWISE:
+        game.rotate_clockwise()
+    elif action == INPUT_ROTATE_COUNTERCLOCKWISE:
+        game.rotate_counterclockwise()
+    elif action == INPUT_QUIT:
+        game.game_over = True
+
+
+class Replay(object):
+    def __init__(self, seed, inputs=None):
+        self.seed = seed
+        self.inputs = inputs if inputs is not None else []  # list of (tick, input)
+        self.fast = False
+
+    def record(self, tick, action):
+        """ Record an input applied before the tick """
+        self.inputs.append((tick, action))
+
+    def record_fast(self, tick, fast):
+        """ Record a change of the fast (down key) state """
+        if fast != self.fast:
+            self.record(tick, INPUT_FAST_ON if fast else INPUT_FAST_OFF)
+            self.fast = fast
+
+    def dumps(self):
+        """ Return the replay as bytes """
+        data = bytearray(HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.seed))
+        last_tick = 0
+        for tick, action in self.inputs:
+            value = (tick - last_tick) << INPUT_BITS | action
+            last_tick = tick
+            # varint: 7 bits per byte, the high bit is set on all bytes but the last
+            while value > 0x7F:
+                data.append(value & 0x7F | 0x80)
+                value >>= 7
+            data.append(value)
+        return bytes(data)
+
+    @classmethod
+    def loads(cls, data):
+        """ Return the replay of bytes. Raise ValueError if data is not a replay of a supported version """
+        if len(data) < HEADER.size:
+            raise ValueError('Not a replay')
+        magic, version, seed = HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC:
+            raise ValueError('Not a replay')
+        if version != REPLAY_VERSION:
+            raise ValueError('Unsupported replay version %d' % version)
+        inputs = []
+        tick = value = shift = 0
+        for byte in bytearray(data[HEADER.size:]):
+            value |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                tick += value >> INPUT_BITS
+                inputs.append((tick, value & ((1 << INPUT_BITS) - 1)))
+                value = shift = 0
+        if shift:
+            raise ValueError('Truncated replay')
+        return cls(seed, inputs)
+
+    def save(self, path):
+        with open(path, 'wb') as replay_file:
+            replay_file.write(self.dumps())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as replay_file:
+            return cls.loads(replay_file.read())
+
+
+class ReplayPlayer(object):
+    """ Plays the inputs of a replay on a game """
+    def __init__(self, replay):
+        self.replay = replay
+        self.position = 0
+        self.fast = False
+
+    def apply(self, game):
+        """ Apply the inputs stamped with the current tick of the game """
+        inputs = self.replay.inputs
+        while self.position < len(inputs) and inputs[self.position][0] <= game.ticks:
+            action = inputs[self.position][1]
+            self.position += 1
+            if action == INPUT_FAST_ON or action == INPUT_FAST_OFF:
+                self.fast = action == INPUT_FAST_ON
+            elif not game.game_over:
+                apply_input(game, action)
+
+
+def play_replay(replay, board_class=Board):
+    """ Play a replay headless, as fast as possible. Return the game when it is over """
+    game = Game(board_class=board_class, seed=replay.seed)
+    player = ReplayPlayer(replay)
+    game.new_stage()
+    while True:
+        player.apply(game)
+        if game.game_over:
+            return game
+        game.tick()
+        del game.events[:]
+        if game.stage_cleared:
+            game.new_stage()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play Drop Card Game replays headless and print their score')
+    parser.add_argument('replays', nargs='+', metavar='FILE')
+    args = parser.parse_args(argv)
+    for path in args.replays:
+        game = play_replay(Replay.load(path))
+        print('%s: seed %d score %d stage %d ticks %d' % (path, game.seed, game.score, game.stage, game.ticks))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+""" Drop Card Game score log
+A local score database for offline play: every finished game is appended to a log file as a fixed size record
+with a CRC32 checksum. The log is never rewritten in place, a crash can only leave a partial last record, which
+is cut off the next time the log is opened. Records with a wrong checksum are skipped.
+
+Opening the log reads it once, sequentially from an mmap, and builds the indexes in memory: the best top_size
+records in order (the top 10 is a slice of it, O(k) however many games were logged) and the best record of every
+player. A log of compact_records records or more is compacted when it is closed, never while games are
+appended: the records of the indexes and the last keep_records records are written to a new log, which is
+synced and renamed over the old one.
+
+File format (little endian): the magic b'DCSL', the format version (1 byte) and the RECORD structs: CRC32 of the
+rest of the record, time the game ended (seconds since the epoch), seed, score, stage, level, ticks (the length
+of the game), flags and the player name (UTF-8, NAME_SIZE bytes at most).
+
+Usage: python scores.py FILE prints the best scores of a log, --player NAME the best score of a player
+       python scores.py FILE --compact
+"""
+import argparse
+import bisect
+import heapq
+import mmap
+import os
+import struct
+import time
+import zlib
+
+SCORES_MAGIC = b'DCSL'
+SCORES_VERSION = 1
+HEADER = struct.Struct('<4sB')
+RECORD = struct.Struct('<IdQiHHIB16s')
+NAME_SIZE = 16
+FLAG_NO_SEED = 1
+TOP_SIZE = 100  # records of the top index
+COMPACT_RECORDS = 1 << 20  # records of the log that start a compaction
+KEEP_RECORDS = 1 << 18  # last records kept by a compaction, besides the records of the indexes
+
+
+def game_record(game, name, end_time=None):
+    """ Return the record of a finished game: (score, stage, level, seed, ticks, time, name) """
+    return (game.score, game.stage, game.level, game.seed, game.ticks, time.time() if end_time is None else end_time,
+            name)
+
+
+def pack_record(record):
+    score, stage, level, seed, ticks, end_time, name = record
+    data = RECORD.pack(0, end_time, seed or 0, score, stage, level, ticks, FLAG_NO_SEED if seed is None else 0,
+                       name.encode('utf-8')[:NAME_SIZE])
+    return struct.pack('<I', zlib.crc32(data[4:])) + data[4:]
+
+
+def records_end(size):
+    """ Return the offset after the last complete record of a log of size bytes """
+    return HEADER.size + (size - HEADER.size) // RECORD.size * RECORD.size
+
+
+def fields_record(fields):
+    """ Return the record of the unpacked RECORD fields """
+    checksum, end_time, seed, score, stage, level, ticks, flags, name = fields
+    return (score, stage, level, None if flags & FLAG_NO_SEED else seed, ticks, end_time,
+            name.rstrip(b'\0').decode('utf-8', 'ignore'))
+
+
+def iter_records(data):
+    """ Yield (offset, record) of the complete records of log data in order, record is None if its checksum is
+    wrong """
+    crc32 = zlib.crc32
+    unpack_from = RECORD.unpack_from
+    for offset in range(HEADER.size, records_end(len(data)), RECORD.size):
+        fields = unpack_from(data, offset)
+        if crc32(data[offset + 4:offset + RECORD.size]) != fields[0]:
+            yield offset, None
+        else:
+            yield offset, fields_record(fields)
+
+
+class ScoreLog(object):
+    """ The score log at path, created if it doesn't exist. top_entries is the top index: (-score, order,
+    record) of the best top_size records in order, order is the position of the record in the log. bests maps
+    every player name to the (order, record) of its best record """
+    def __init__(self, path, top_size=TOP_SIZE, compact_records=COMPACT_RECORDS, keep_records=KEEP_RECORDS):
+        self.path = path
+        self.top_size = top_size
+        self.compact_records = compact_records
+        self.keep_records = keep_records
+        self.top_entries = []
+        self.bests = {}
+        self.records = 0
+        self.corrupt = 0
+        self.log_file = None
+        self.open()
+
+    def open(self):
+        """ Read the log and build the indexes. Raise ValueError if the file is not a score log """
+        self.top_entries = []
+        self.bests = {}
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            with open(self.path, 'wb') as log_file:
+                log_file.write(HEADER.pack(SCORES_MAGIC, SCORES_VERSION))
+        with open(self.path, 'rb') as log_file:
+            size = os.fstat(log_file.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError('Not a score log')
+            with mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                magic, version = HEADER.unpack_from(data)
+                if magic != SCORES_MAGIC:
+                    raise ValueError('Not a score log')
+                if version != SCORES_VERSION:
+                    raise ValueError('Unsupported score log version %d' % version)
+                self.index(data)
+        self.log_file = open(self.path, 'r+b')
+        end = records_end(size)
+        if end != size:
+            # A partial record of an interrupted append
+            self.log_file.truncate(end)
+        self.log_file.seek(end)
+
+    def index(self, data):
+        """ Build the indexes of the records of log data. This is the loop of iter_records inlined: records are
+        unpacked in one pass and made into record tuples only when they enter an index """
+        end = records_end(len(data))
+        view = memoryview(data)[:end]
+        crc32 = zlib.crc32
+        size = RECORD.size
+        corrupt = 0
+        # Best (score, order) of every raw name
+        best_scores = {}
+        # Min heap of the best top_size records: (score, -order, fields)
+        heap = []
+        top_size = self.top_size
+        offsets = range(HEADER.size, end, size)
+        try:
+            for order, fields in zip(offsets, RECORD.iter_unpack(view[HEADER.size:])):
+                if crc32(view[order + 4:order + size]) != fields[0]:
+                    corrupt += 1
+                    continue
+                score = fields[3]
+                best = best_scores.get(fields[8])
+                if best is None or score > best[0]:
+                    best_scores[fields[8]] = score, order, fields
+                if len(heap) < top_size:
+                    heapq.heappush(heap, (score, -order, fields))
+                elif score > heap[0][0]:
+                    # On equal scores the record logged first stays
+                    heapq.heapreplace(heap, (score, -order, fields))
+        finally:
+            view.release()
+        self.records = len(offsets) - corrupt
+        self.corrupt = corrupt
+        self.bests = {}
+        for score, order, fields in best_scores.values():
+            record = fields_record(fields)
+            best = self.bests.get(record[6])
+            # Raw names that decode to the same name
+            if best is None or score > best[1][0] or score == best[1][0] and order < best[0]:
+                self.bests[record[6]] = order, record
+        self.top_entries = sorted((-score, -negative_order, fields_record(fields))
+                                  for score, negative_order, fields in heap)
+
+    def close(self):
+        """ Close the log, compact it first if it has compact_records records or more """
+        if self.log_file is None:
+            return
+        if self.records >= self.compact_records:
+            self.compact()
+        self.log_file.close()
+        self.log_file = None
+
+    def append(self, record):
+        """ Append a game_record() to the log, it is on the disk when append returns, and add it to the indexes """
+        # The name as it is read back from the log
+        record = record[:6] + (record[6].encode('utf-8')[:NAME_SIZE].decode('utf-8', 'ignore'),)
+        order = self.log_file.tell()
+        self.log_file.write(pack_record(record))
+        self.log_file.flush()
+        os.fsync(self.log_file.fileno())
+        self.records += 1
+        best = self.bests.get(record[6])
+        if best is None or record[0] > best[1][0]:
+            self.bests[record[6]] = order, record
+        entry = (-record[0], order, record)
+        if len(self.top_entries) < self.top_size or entry < self.top_entries[-1]:
+            bisect.insort(self.top_entries, entry)
+            del self.top_entries[self.top_size:]
+
+    def top(self, k=10):
+        """ Return the best k records (k at most top_size), the first logged first on equal scores """
+        return [entry[2] for entry in self.top_entries[:k]]
+
+    def best(self, name):
+        """ Return the best record of a player, None if the player has no record """
+        best = self.bests.get(name)
+        return best[1] if best else None
+
+    def compact(self):
+        """ Rewrite the log with the records of the indexes and the last keep_records records only """
+        self.log_file.flush()
+        with mmap.mmap(self.log_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            keep = set(entry[1] for entry in self.top_entries)
+            keep.update(order for order, record in self.bests.values())
+            first_recent = len(data) - self.keep_records * RECORD.size
+            temporary_path = self.path + '.tmp'
+            with open(temporary_path, 'wb') as compact_file:
+                compact_file.write(HEADER.pack(SCORES_MAGIC, SCORES_VERSION))
+                for order, record in iter_records(data):
+                    if record is not None and (order >= first_recent or order in keep):
+                        compact_file.write(data[order:order + RECORD.size])
+                compact_file.flush()
+                os.fsync(compact_file.fileno())
+        self.log_file.close()
+        os.replace(temporary_path, self.path)
+        self.open()
+
+
+def print_records(records):
+    for rank, (score, stage, level, seed, ticks, end_time, name) in enumerate(records, 1):
+        print('%3d %-16s %8d  stage %d level %d  seed %s  %s' % (
+            rank, name, score, stage, level, seed, time.strftime('%Y-%m-%d %H:%M', time.localtime(end_time))))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Print the best scores of a Drop Card Game score log')
+    parser.add_argument('log', metavar='FILE')
+    parser.add_argument('-k', type=int, default=10, help='number of scores (at most %d)' % TOP_SIZE)
+    parser.add_argument('--player', metavar='NAME', help='print the best score of a player')
+    parser.add_argument('--compact', action='store_true', help='compact the log')
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    log = ScoreLog(args.log)
+    print('%d games of %d players read in %.2f s%s' % (log.records, len(log.bests), time.perf_counter() - start,
+                                                      ', %d corrupt records skipped' % log.corrupt if log.corrupt
+                                                      else ''))
+    if args.compact:
+        log.compact()
+        print('compacted to %d games' % log.records)
+    if args.player:
+        best = log.best(args.player)
+        print_records([best] if best else [])
+    else:
+        print_records(log.top(args.k))
+    log.close()
+
+
+if __name__ == '__main__':
+    main()
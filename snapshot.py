@@ -0,0 +1,228 @@
+""" Drop Card Game snapshots
+A snapshot is the complete state of a game: the board, the deck and the pack in order, the active card
+and its position, score, stage, level, speed, the state of the end of stage clearing, the events not
+handled yet (the pending rewards) and the state of the random generator of the deck. Restoring a snapshot
+continues the same game, so a game can be suspended and resumed, or a simulation can start from a real
+mid-game position. Only card codes are saved, never pygame objects.
+
+File format (little endian): the magic b'DCSS', the format version (1 byte), the STATE struct, the board
+cells (columns * rows bytes), the deck and the pack (a count byte and 1 byte per card), the cards to clear
+(a COUNT and 2 bytes col, row per cell), the events (a COUNT and EVENT struct each) and the random
+generator state (RNG_STATE, followed by a double if it has a pending gauss value). The EVENT of a combination
+is followed by the RULE it matched. Versions 1 and 2 are read too, their combinations have no rule (None).
+Version 1 had 5x5 boards only: its counts of the cards to clear and of the events are 1 byte and the position
+of the active card is signed bytes.
+
+Usage: python snapshot.py FILE... prints the state of the snapshots, with --play it plays them on headless
+"""
+import argparse
+import random
+import struct
+from engine import Board, BoardLayout, Card, Deck, Game, Pack, play_game, CARDS_IN_PACK, DEFAULT_LAYOUT, EMPTY, \
+    EVENT_PLACE, EVENT_COMBINATION, EVENT_REMOVE, EVENT_BONUS, EVENT_PENALTY, SEQUENCE_SAME_SUIT, SAME_NUMBER, \
+    SEQUENCE, SAME_SUIT
+
+SNAPSHOT_MAGIC = b'DCSS'
+SNAPSHOT_VERSION = 3
+HEADER = struct.Struct('<4sB')
+COUNT = struct.Struct('<H')
+# seed, ticks, score, stage, level, game speed, flags, board columns, board rows,
+# active card code, x, y, board_x, board_y
+STATE = struct.Struct('<QIiHHHBBBBBhBh')
+STATES = {1: struct.Struct('<QIiHHHBBBBbbbb'), 2: STATE, 3: STATE}  # by version
+EVENT = struct.Struct('<Bbbi')  # event, col, row, points
+RULE = struct.Struct('<BBB')  # rule flags, number of cards, kind of a combination
+RNG_STATE = struct.Struct('<625I')  # random.Random state: 624 words and the position
+GAUSS = struct.Struct('<d')
+
+# State flags
+FLAG_GAME_OVER = 1
+FLAG_CLEARING_THE_STAGE = 2
+FLAG_STAGE_CLEARED = 4
+FLAG_ACTIVE_CARD = 8
+FLAG_LIMIT = 16
+FLAG_AT_BOTTOM = 32
+FLAG_NO_SEED = 64
+FLAG_GAUSS = 128
+FLAGS = (('game_over', FLAG_GAME_OVER), ('clearing_the_stage', FLAG_CLEARING_THE_STAGE),
+         ('stage_cleared', FLAG_STAGE_CLEARED))
+# Events by number. Events with points have EVENT_POINTS set on their number
+EVENTS = (EVENT_PLACE, EVENT_COMBINATION, EVENT_REMOVE, EVENT_BONUS, EVENT_PENALTY)
+EVENT_NUMBERS = dict((event, number) for number, event in enumerate(EVENTS))
+EVENT_POINTS = 0x80
+# Combination rules: flags and kinds by number
+RULE_HORIZONTAL = 1
+RULE_INTERSECT = 2
+KINDS = (SEQUENCE_SAME_SUIT, SAME_NUMBER, SEQUENCE, SAME_SUIT)
+KIND_NUMBERS = dict((kind, number) for number, kind in enumerate(KINDS))
+
+
+def dumps(game):
+    """ Return the snapshot of a game as bytes. Raise ValueError if the game has not started (it has no board)
+    or if its random generator can't be saved """
+    if game.board is None:
+        raise ValueError('The game has not started')
+    try:
+        version, words, gauss = game.rng.getstate()
+    except (AttributeError, ValueError):
+        raise ValueError('The random generator of the game can not be saved')
+    if version != 3 or len(words) != RNG_STATE.size // 4:
+        raise ValueError('Unsupported random generator state version %d' % version)
+    flags = 0
+    for name, flag in FLAGS:
+        if getattr(game, name):
+            flags |= flag
+    card = game.active_card
+    if card:
+        flags |= FLAG_ACTIVE_CARD | card.limit * FLAG_LIMIT | card.is_at_bottom * FLAG_AT_BOTTOM
+    if game.seed is None:
+        flags |= FLAG_NO_SEED
+    if gauss is not None:
+        flags |= FLAG_GAUSS
+    data = bytearray(HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION))
+    data += STATE.pack(game.seed or 0, game.ticks, game.score, game.stage, game.level, game.game_speed, flags,
+                       game.layout.columns, game.layout.rows, card.code if card else EMPTY, card.x if card else 0,
+                       card.y if card else 0, card.board_x if card else 0, card.board_y if card else 0)
+    data += game.board.cells
+    for cards in (game.deck.cards, game.pack.cards):
+        data.append(len(cards))
+        data += bytes(cards)
+    data += COUNT.pack(len(game.cards_to_clear))
+    for col, row in game.cards_to_clear:
+        data += bytes((col, row))
+    data += COUNT.pack(len(game.events))
+    for event in game.events:
+        number = EVENT_NUMBERS[event[0]]
+        if len(event) > 3:
+            data += EVENT.pack(number | EVENT_POINTS, event[1], event[2], event[3])
+            if event[0] == EVENT_COMBINATION:
+                horizontal, number_of_cards, kind, intersect = event[4]
+                data += RULE.pack(horizontal * RULE_HORIZONTAL | intersect * RULE_INTERSECT, number_of_cards,
+                                  KIND_NUMBERS[kind])
+        else:
+            data += EVENT.pack(number, event[1], event[2], 0)
+    data += RNG_STATE.pack(*words)
+    if gauss is not None:
+        data += GAUSS.pack(gauss)
+    return bytes(data)
+
+
+def loads(data, board_class=Board, layout=None):
+    """ Return the game of a snapshot, its board is a board_class of layout (the default layout or a layout of the
+    size of the snapshot if None). Raise ValueError if data is not a snapshot of a supported version or of the
+    size of layout """
+    if len(data) < HEADER.size:
+        raise ValueError('Not a snapshot')
+    magic, version = HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError('Not a snapshot')
+    if version not in STATES:
+        raise ValueError('Unsupported snapshot version %d' % version)
+    # Size of the counts of the cards to clear and of the events
+    count_size = 1 if version == 1 else COUNT.size
+
+    def read_count(offset, size):
+        return data[offset] if size == 1 else COUNT.unpack_from(data, offset)[0]
+
+    try:
+        (seed, ticks, score, stage, level, game_speed, flags, columns, rows,
+         code, x, y, board_x, board_y) = STATES[version].unpack_from(data, HEADER.size)
+        if layout is None:
+            layout = DEFAULT_LAYOUT if (columns, rows) == (DEFAULT_LAYOUT.columns, DEFAULT_LAYOUT.rows) else \
+                BoardLayout(columns, rows)
+        elif (columns, rows) != (layout.columns, layout.rows):
+            raise ValueError('Snapshot of a %dx%d board' % (columns, rows))
+        offset = HEADER.size + STATES[version].size
+        cells = data[offset:offset + columns * rows]
+        offset += columns * rows
+        lists = []
+        for item_size, size in ((1, 1), (1, 1), (2, count_size)):
+            count = read_count(offset, size)
+            lists.append(data[offset + size:offset + size + count * item_size])
+            offset += size + count * item_size
+        deck_cards, pack_cards, clear_cells = lists
+        events = []
+        count = read_count(offset, count_size)
+        offset += count_size
+        for i in range(count):
+            number, col, row, points = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            if number & EVENT_POINTS:
+                event = EVENTS[number & ~EVENT_POINTS]
+                if event != EVENT_COMBINATION:
+                    events.append((event, col, row, points))
+                elif version < 3:
+                    events.append((event, col, row, points, None))
+                else:
+                    rule_flags, number_of_cards, kind = RULE.unpack_from(data, offset)
+                    offset += RULE.size
+                    events.append((event, col, row, points, (bool(rule_flags & RULE_HORIZONTAL), number_of_cards,
+                                                             KINDS[kind], bool(rule_flags & RULE_INTERSECT))))
+            else:
+                events.append((EVENTS[number], col, row))
+        words = RNG_STATE.unpack_from(data, offset)
+        gauss = GAUSS.unpack_from(data, offset + RNG_STATE.size)[0] if flags & FLAG_GAUSS else None
+    except (IndexError, struct.error):
+        raise ValueError('Truncated snapshot')
+    if len(cells) != columns * rows:
+        raise ValueError('Truncated snapshot')
+
+    rng = random.Random(0)
+    game = Game(rng, board_class, None if flags & FLAG_NO_SEED else seed, layout)
+    game.ticks = ticks
+    game.score = score
+    game.stage = stage
+    game.level = level
+    game.game_speed = game_speed
+    for name, flag in FLAGS:
+        setattr(game, name, bool(flags & flag))
+    game.board = board_class(game.events, layout)
+    for index, cell in enumerate(bytearray(cells)):
+        if cell != EMPTY:
+            game.board.set_cell(index // rows, index % rows, cell)
+    game.deck = Deck(rng)
+    game.deck.cards[:] = bytearray(deck_cards)
+    game.pack = Pack(0, game.deck)
+    game.pack.number_of_cards = CARDS_IN_PACK
+    game.pack.cards[:] = bytearray(pack_cards)
+    if flags & FLAG_ACTIVE_CARD:
+        card = game.active_card = Card(code, x, y)
+        card.board_x = board_x
+        card.board_y = board_y
+        card.limit = bool(flags & FLAG_LIMIT)
+        card.is_at_bottom = bool(flags & FLAG_AT_BOTTOM)
+    clear_cells = bytearray(clear_cells)
+    game.cards_to_clear = list(zip(clear_cells[::2], clear_cells[1::2]))
+    game.events.extend(events)
+    # The deck draws from here on as if the game had not been interrupted
+    rng.setstate((3, words, gauss))
+    return game
+
+
+def save(game, path):
+    with open(path, 'wb') as snapshot_file:
+        snapshot_file.write(dumps(game))
+
+
+def load(path, board_class=Board, layout=None):
+    with open(path, 'rb') as snapshot_file:
+        return loads(snapshot_file.read(), board_class, layout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Print the state of Drop Card Game snapshots')
+    parser.add_argument('snapshots', nargs='+', metavar='FILE')
+    parser.add_argument('--play', action='store_true', help='play the games on with the random policy')
+    args = parser.parse_args(argv)
+    for path in args.snapshots:
+        game = load(path)
+        print('%s: seed %s score %d stage %d level %d cards left %d ticks %d%s' % (
+            path, game.seed, game.score, game.stage, game.level, game.cards_left(), game.ticks,
+            ' game over' if game.game_over else ''))
+        if args.play and not game.game_over:
+            game = play_game(game=game)
+            print('  played on: score %d stage %d' % (game.score, game.stage))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,625 @@
+""" Drop Card Game scoring rules test
+Checks the compiled scoring rules of every board backend against the hand-written check_* methods the rules
+replaced, kept here as ReferenceBoard: engine.Board, bitboard.BitBoard and batch.BatchGame (if NumPy is
+installed) must find the same combinations in the same order, with the same points, removed cards and events,
+on seeded random 5x5 boards, floating cards (cards with empty cells below them) included. The reference events
+have no scoring rule, the rule of a combination event must score its points. The checks of the lines through
+changed cells only are verified against full scans with engine.VERIFY_CHECKS on played games.
+
+Usage: python -m unittest test_rules
+"""
+import random
+import unittest
+import engine
+from bitboard import BitBoard
+from engine import ALL_CELLS, Board, BOARD_COLUMNS, BOARD_ROWS, CARD_NUMBER, CARD_SUIT, DECK_SIZE, \
+    DECK_SIZE_PER_SUIT, EMPTY, EVENT_COMBINATION, EVENT_REMOVE, SCORING_RULES, play_game, random_policy
+try:
+    import numpy
+    import batch
+except ImportError:
+    numpy = None
+
+ASCENT = {1}
+DESCENT = {DECK_SIZE_PER_SUIT - 1}
+BOARDS = 5000  # random boards of each test
+GAMES = 100  # games played with VERIFY_CHECKS on by each board class
+# Points and intersect points of the scoring rules by (horizontal, number of cards, kind)
+RULE_POINTS = dict((rule[:3], rule[3:]) for rule in SCORING_RULES)
+
+
+class ReferenceBoard(object):
+    """ The check_* methods of the engine before the scoring rules were compiled, scanning the whole board """
+    def __init__(self, cells):
+        self.cells = bytearray(cells)
+        self.events = []
+
+    def get_cell(self, col, row):
+        """ Return the card code at col, row or EMPTY """
+        return self.cells[col * BOARD_ROWS + row]
+
+    def reward(self, col, row, points):
+        """ Record a combination found at col, row """
+        self.events.append((EVENT_COMBINATION, col, row, points))
+
+    def set_cell(self, col, row, code):
+        """ Put card code (or EMPTY) at col, row. Every change of the cells goes through here """
+        self.cells[col * BOARD_ROWS + row] = code
+
+    def clear_cell(self, col, row):
+        """ Remove the card at col, row """
+        if self.cells[col * BOARD_ROWS + row] != EMPTY:
+            self.set_cell(col, row, EMPTY)
+            self.events.append((EVENT_REMOVE, col, row))
+
+    def remove_and_scroll_down(self, col, row, columns):
+        # remove cards
+        for i in range(columns):
+            self.clear_cell(col + i, row)
+        # scroll down the above cards
+        cells = self.cells
+        for x in range(col, col + columns):
+            for y in range(row - 1, -1, -1):
+                code = cells[x * BOARD_ROWS + y]
+                if code != EMPTY:
+                    self.set_cell(x, y, EMPTY)
+                    self.set_cell(x, y + 1, code)
+
+    def is_filled_horizontal(self, col, row, number_of_cards):
+        """ Return True if there are number_of_cards cards on the right of col, row (included) """
+        index = col * BOARD_ROWS + row
+        return EMPTY not in self.cells[index:index + number_of_cards * BOARD_ROWS:BOARD_ROWS]
+
+    def is_filled_vertical(self, col, row, number_of_cards):
+        """ Return True if there are number_of_cards cards below col, row (included) """
+        index = col * BOARD_ROWS + row
+        return EMPTY not in self.cells[index:index + number_of_cards]
+
+    def check_combinations(self):
+        """ Find, score and remove the first combination of the board. Return its points or 0 """
+        return (self.check_5_horizontal() or self.check_4_horizontal() or self.check_4_vertical() or
+                self.check_3_horizontal() or self.check_3_vertical())
+
+    def check_5_horizontal(self):
+        """ Check 5 same suit horizontal """
+        for row in range(5):
+            if self.is_filled_horizontal(0, row, 5):
+                if self.is_sequence(0, row, 5, True) and self.is_same_suit_horizontal(0, row, 5):
+                    # Found 5 sequence and same suit horizontal
+                    # Check for intersect on center column
+                    # row must be < 3 so that a 3 card column may exist
+                    if row < 3 and (self.is_same_number_vertical(2, row, 3) or
+                                    self.is_same_suit_vertical(2, row, 3) or
+                                    self.is_sequence(2, row, 3, True)):
+                        # Intersect Found
+                        points = 6000
+                        # remove intersected column
+                        for i in range(1, 3):
+                            self.clear_cell(2, row + i)
+                    else:
+                        points = 2000
+                    self.reward(0, row, points)
+                    self.remove_and_scroll_down(0, row, 5)
+                    return points
+                elif self.is_sequence(0, row, 5, True):
+                    # Found 5 sequence horizontal
+                    # Check for intersect on center column
+                    if row < 3 and (self.is_same_number_vertical(2, row, 3)
+                                    or self.is_same_suit_vertical(2, row, 3)
+                                    or self.is_sequence(2, row, 3, False)):
+                        # Intersect Found
+                        points = 2000
+                        # remove intersected column
+                        for i in range(1, 3):
+                            self.clear_cell(2, row + i)
+                    else:
+                        points = 500
+                    self.reward(0, row, points)
+                    self.remove_and_scroll_down(0, row, 5)
+                    return points
+                elif self.is_same_suit_horizontal(0, row, 5):
+                    # Found 5 same suit horizontal
+                    # Check for intersect on center column
+                    if row < 3 and (self.is_same_number_vertical(2, row, 3)
+                                    or self.is_same_suit_vertical(2, row, 3)
+                                    or self.is_sequence(2, row, 3, False)):
+                        # Intersect Found
+                        points = 1000
+                        # remove intersected column 2 cards. The 3rd will be removed with the intersected line)
+                        for i in range(1, 3):
+                            self.clear_cell(2, row + i)
+                    else:
+                        points = 300
+                    self.reward(0, row, points)
+                    self.remove_and_scroll_down(0, row, 5)
+                    return points
+        return 0
+
+    def check_4_horizontal(self):
+        """ Check 4 same suit horizontal """
+        for col in range(2):
+            for row in range(5):
+                if self.is_filled_horizontal(col, row, 4):
+                    if self.is_sequence(col, row, 4, True) and self.is_same_suit_horizontal(col, row, 4):
+                        # Found 4 sequence and same suit horizontal
+                        # Check for intersect in middle columns
+                        # row must be < 3 so that a 3 card column may exist
+                        if row < 3 and (self.is_same_number_vertical(col + 1, row, 3) or
+                                        self.is_same_suit_vertical(col + 1, row, 3) or
+                                        self.is_sequence(col + 1, row, 3, False)):
+                            # Intersect Found on left side of four
+                            points = 3000
+                            # remove intersected column
+                            for i in range(1, 3):
+                                self.clear_cell(col + 1, row + i)
+                        elif row < 3 and (self.is_same_number_vertical(col + 2, row, 3) or
+                                          self.is_same_suit_vertical(col + 2, row, 3) or
+                                          self.is_sequence(col + 2, row, 3, False)):
+                            # Intersect Found on right side of four
+                            points = 3000
+                            # remove intersected column
+                            for i in range(1, 3):
+                                self.clear_cell(col + 2, row + i)
+                        else:
+                            points = 1000
+                        self.reward(col, row, points)
+                        self.remove_and_scroll_down(col, row, 4)
+                        return points
+                    elif self.is_same_number_horizontal(col, row, 4):
+                        # Found 4 same number horizontal
+                        # Check for intersect in middle columns
+                        if row < 3 and (self.is_same_number_vertical(col + 1, row, 3) or
+                                        self.is_same_suit_vertical(col + 1, row, 3) or
+                                        self.is_sequence(col + 1, row, 3, False)):
+                            # Intersect Found on left side of four
+                            points = 1500
+                            # remove intersected column
+                            for i in range(1, 3):
+                                self.clear_cell(col + 1, row + i)
+                        elif row < 3 and (self.is_same_number_vertical(col + 2, row, 3) or
+                                          self.is_same_suit_vertical(col + 2, row, 3) or
+                                          self.is_sequence(col + 2, row, 3, False)):
+                            # Intersect Found on right side of four
+                            points = 1500
+                            # remove intersected column
+                            for i in range(1, 3):
+                                self.clear_cell(col + 2, row + i)
+                        else:
+                            points = 500
+                        self.reward(col, row, points)
+                        self.remove_and_scroll_down(col, row, 4)
+                        return points
+                    elif self.is_sequence(col, row, 4, True):
+                        # Found 4 sequence horizontal
+                        # Check for intersect in middle columns
+                        if row < 3 and (self.is_same_number_vertical(col + 1, row, 3) or
+                                        self.is_same_suit_vertical(col + 1, row, 3) or
+                                        self.is_sequence(col + 1, row, 3, False)):
+                            # Intersect Found on left side of four
+                            points = 1000
+                            # remove intersected column
+                            for i in range(1, 3):
+                                self.clear_cell(col + 1, row + i)
+                        elif row < 3 and (self.is_same_number_vertical(col + 2, row, 3) or
+                                          self.is_same_suit_vertical(col + 2, row, 3) or
+                                          self.is_sequence(col + 2, row, 3, False)):
+                            # Intersect Found on right side of four
+                            points = 1000
+                            # remove intersected column
+                            for i in range(1, 3):
+                                self.clear_cell(col + 2, row + i)
+                        else:
+                            points = 300
+                        self.reward(col, row, points)
+                        self.remove_and_scroll_down(col, row, 4)
+                        return points
+                    elif self.is_same_suit_horizontal(col, row, 4):
+                        # Found 4 same suit horizontal
+                        # Check for intersect in middle columns
+                        if row < 3 and (self.is_same_number_vertical(col + 1, row, 3) or
+                                        self.is_same_suit_vertical(col + 1, row, 3) or
+                                        self.is_sequence(col + 1, row, 3, False)):
+                            # Intersect Found on left side of four
+                            points = 500
+                            # remove intersected column
+                            for i in range(1, 3):
+                                self.clear_cell(col + 1, row + i)
+                        elif row < 3 and (self.is_same_number_vertical(col + 2, row, 3) or
+                                          self.is_same_suit_vertical(col + 2, row, 3) or
+                                          self.is_sequence(col + 2, row, 3, False)):
+                            # Intersect Found on right side of four
+                            points = 500
+                            # remove intersected column
+                            for i in range(1, 3):
+                                self.clear_cell(col + 2, row + i)
+                        else:
+                            points = 100
+                        self.reward(col, row, points)
+                        self.remove_and_scroll_down(col, row, 4)
+                        return points
+        return 0
+
+    def check_4_vertical(self):
+        """ Check 4 same suit vertical """
+        for col in range(5):
+            for row in range(2):
+                if self.is_filled_vertical(col, row, 4):
+                    if self.is_sequence(col, row, 4, False) and self.is_same_suit_vertical(col, row, 4):
+                        # Found 4 sequence and same suit vertical
+                        points = 1000
+                        self.reward(col, row, points)
+                        # remove cards
+                        for i in range(0, 4):
+                            self.clear_cell(col, row + i)
+                        return points
+                    elif self.is_same_number_vertical(col, row, 4):
+                        # Found 4 same suit vertical
+                        points = 500
+                        self.reward(col, row, points)
+                        # remove cards
+                        for i in range(0, 4):
+                            self.clear_cell(col, row + i)
+                        return points
+                    elif self.is_sequence(col, row, 4, False):
+                        # Found 4 sequence vertical
+                        points = 300
+                        self.reward(col, row, points)
+                        # remove cards
+                        for i in range(0, 4):
+                            self.clear_cell(col, row + i)
+                        return points
+                    elif self.is_same_suit_vertical(col, row, 4):
+                        # Found 4 same suit vertical
+                        points = 100
+                        self.reward(col, row, points)
+                        # remove cards
+                        for i in range(0, 4):
+                            self.clear_cell(col, row + i)
+                        return points
+        return 0
+
+    def check_3_horizontal(self):
+        """ Check 3 same suit horizontal """
+        for col in range(3):
+            for row in range(5):
+                if self.is_filled_horizontal(col, row, 3):
+                    # Found 3 horizontal cards
+                    if self.is_sequence(col, row, 3, True) and self.is_same_suit_horizontal(col, row, 3):
+                        # Found 3 sequence and same suit horizontal
+                        # Check for intersect in either of 3 columns
+                        # row must be < 3 so that a 3 card column may exist
+                        if row < 3 and (self.is_same_number_vertical(col, row, 3) or
+                                        self.is_same_suit_vertical(col, row, 3) or
+                                        self.is_sequence(col, row, 3, False)):
+                            # Intersect Found on left side of four
+                            points = 1500
+                            # remove intersected column
+                            for i in range(1, 3):
+                                self.clear_cell(col, row + i)
+                        elif row < 3 and (self.is_same_number_vertical(col + 1, row, 3) or
+                                          self.is_same_suit_vertical(col + 1, row, 3) or
+                                          self.is_sequence(col + 1, row, 3, False)):
+                            # Intersect Found on right side of four
+                            points = 1500
+                            # remove intersected column
+                            for i in range(1, 3):
+                                self.clear_cell(col + 1, row + i)
+                        elif row < 3 and (self.is_same_number_vertical(col + 2, row, 3) or
+                                          self.is_same_suit_vertical(col + 2, row, 3) or
+                                          self.is_sequence(col + 2, row, 3, False)):
+                            # Intersect Found on right side of four
+                            points = 1500
+                            # remove intersected column
+                            for i in range(1, 3):
+                                self.clear_cell(col + 2, row + i)
+                        else:
+                            points = 500
+                        self.reward(col, row, points)
+                        self.remove_and_scroll_down(col, row, 3)
+                        return points
+                    elif self.is_same_number_horizontal(col, row, 3):
+                        # Found 3 same number horizontal
+                        # Check for intersect in either of 3 columns
+                        if row < 3 and (self.is_same_number_vertical(col, row, 3) or
+                                        self.is_same_suit_vertical(col, row, 3) or
+                                        self.is_sequence(col, row, 3, False)):
+                            # Intersect Found on left side of four
+                            points = 1000
+                            # remove intersected column
+                            for i in range(1, 3):
+                                self.clear_cell(col, row + i)
+                        elif row < 3 and (self.is_same_number_vertical(col + 1, row, 3) or
+                                          self.is_same_suit_vertical(col + 1, row, 3) or
+                                          self.is_sequence(col + 1, row, 3, False)):
+                            # Intersect Found on right side of four
+                            points = 1000
+                            # remove intersected column
+                            for i in range(1, 3):
+                                self.clear_cell(col + 1, row + i)
+                        elif row < 3 and (self.is_same_number_vertical(col + 2, row, 3) or
+                                          self.is_same_suit_vertical(col + 2, row, 3) or
+                                          self.is_sequence(col + 2, row, 3, False)):
+                            # Intersect Found on right side of four
+                            points = 1000
+                            # remove intersected column
+                            for i in range(1, 3):
+                                self.clear_cell(col + 2, row + i)
+                        else:
+                            points = 300
+                        self.reward(col, row, points)
+                        self.remove_and_scroll_down(col, row, 3)
+                        return points
+                    elif self.is_sequence(col, row, 3, True):
+                        # Found 3 on sequence
+                        # Check for intersect in either of 3 columns
+                        # row must be < 3 so that a 3 card column may exist
+                        if row < 3 and (self.is_same_number_vertical(col, row, 3) or
+                                        self.is_same_suit_vertical(col, row, 3) or
+                                        self.is_sequence(col, row, 3, False)):
+                            # Intersect Found on left side of four
+                            points = 600
+                            # remove intersected column
+                            for i in range(1, 3):
+                                self.clear_cell(col, row + i)
+                        elif row < 3 and (self.is_same_number_vertical(col + 1, row, 3) or
+                                          self.is_same_suit_vertical(col + 1, row, 3) or
+                                          self.is_sequence(col + 1, row, 3, False)):
+                            # Intersect Found on right side of four
+                            points = 600
+                            # remove intersected column
+                            for i in range(1, 3):
+                                self.clear_cell(col + 1, row + i)
+                        elif row < 3 and (self.is_same_number_vertical(col + 2, row, 3) or
+                                          self.is_same_suit_vertical(col + 2, row, 3) or
+                                          self.is_sequence(col + 2, row, 3, False)):
+                            # Intersect Found on right side of four
+                            points = 600
+                            # remove intersected column
+                            for i in range(1, 3):
+                                self.clear_cell(col + 2, row + i)
+                        else:
+                            points = 100
+                        self.reward(col, row, points)
+                        self.remove_and_scroll_down(col, row, 3)
+                        return points
+                    elif self.is_same_suit_horizontal(col, row, 3):
+                        # Found 3 same suit horizontal
+                        # Check for intersect in either of 3 columns
+                        if row < 3 and (self.is_same_number_vertical(col, row, 3) or
+                                        self.is_same_suit_vertical(col, row, 3) or
+                                        self.is_sequence(col, row, 3, False)):
+                            # Intersect Found on left side of four
+                            points = 500
+                            # remove intersected column
+                            for i in range(1, 3):
+                                self.clear_cell(col, row + i)
+                        elif row < 3 and (self.is_same_number_vertical(col + 1, row, 3) or
+                                          self.is_same_suit_vertical(col + 1, row, 3) or
+                                          self.is_sequence(col + 1, row, 3, False)):
+                            # Intersect Found on right side of four
+                            points = 500
+                            # remove intersected column
+                            for i in range(1, 3):
+                                self.clear_cell(col + 1, row + i)
+                        elif row < 3 and (self.is_same_number_vertical(col + 2, row, 3) or
+                                          self.is_same_suit_vertical(col + 2, row, 3) or
+                                          self.is_sequence(col + 2, row, 3, False)):
+                            # Intersect Found on right side of four
+                            points = 500
+                            # remove intersected column
+                            for i in range(1, 3):
+                                self.clear_cell(col + 2, row + i)
+                        else:
+                            points = 10
+                        self.reward(col, row, points)
+                        self.remove_and_scroll_down(col, row, 3)
+                        return points
+        return 0
+
+    def check_3_vertical(self):
+        """ Check 3 same suit vertical """
+        for col in range(5):
+            for row in range(3):
+                if self.is_filled_vertical(col, row, 3):
+                    if self.is_sequence(col, row, 3, False) and self.is_same_suit_vertical(col, row, 3):
+                        # Found 3 sequence and same suit vertical
+                        points = 500
+                        self.reward(col, row, points)
+                        # remove cards
+                        for i in range(0, 3):
+                            self.clear_cell(col, row + i)
+                        return points
+                    elif self.is_same_number_vertical(col, row, 3):
+                        # Found 3 same number vertical
+                        points = 300
+                        self.reward(col, row, points)
+                        # remove cards
+                        for i in range(0, 3):
+                            self.clear_cell(col, row + i)
+                        return points
+                    elif self.is_sequence(col, row, 3, False):
+                        # Found sequence of 3 vertical
+                        points = 100
+                        self.reward(col, row, points)
+                        # remove cards
+                        for i in range(0, 3):
+                            self.clear_cell(col, row + i)
+                        return points
+                    elif self.is_same_suit_vertical(col, row, 3):
+                        # Found 3 same suit vertical
+                        points = 10
+                        self.reward(col, row, points)
+                        # remove cards
+                        for i in range(0, 3):
+                            self.clear_cell(col, row + i)
+                        return points
+        return 0
+
+    def is_same_suit_vertical(self, col, start_row, number_of_cards):
+        """ Return True if same suit vertical """
+        cells = self.cells
+        index = col * BOARD_ROWS
+        suit = CARD_SUIT[cells[index + start_row]]
+        for i in range(start_row + 1, start_row + number_of_cards):
+            if cells[index + i] == EMPTY or CARD_SUIT[cells[index + i]] != suit:
+                return False
+        return True
+
+    def is_same_number_vertical(self, col, start_row, number_of_cards):
+        """ Return True if same number vertical """
+        cells = self.cells
+        index = col * BOARD_ROWS
+        number = CARD_NUMBER[cells[index + start_row]]
+        for i in range(start_row + 1, start_row + number_of_cards):
+            if cells[index + i] == EMPTY or CARD_NUMBER[cells[index + i]] != number:
+                return False
+        return True
+
+    def is_same_suit_horizontal(self, start_col, row, number_of_cards):
+        """ Return True if same suit horizontal """
+        cells = self.cells
+        suit = CARD_SUIT[cells[start_col * BOARD_ROWS + row]]
+        for i in range(start_col + 1, start_col + number_of_cards):
+            if CARD_SUIT[cells[i * BOARD_ROWS + row]] != suit:
+                return False
+        return True
+
+    def is_same_number_horizontal(self, start_col, row, number_of_cards):
+        """ Return True if same number horizontal """
+        cells = self.cells
+        number = CARD_NUMBER[cells[start_col * BOARD_ROWS + row]]
+        for i in range(start_col + 1, start_col + number_of_cards):
+            if CARD_NUMBER[cells[i * BOARD_ROWS + row]] != number:
+                return False
+        return True
+
+    def is_sequence(self, col, row, number_of_cards, is_horizontal):
+        """ Returns True if cards in horizontal or vertical sequence """
+        # Fill the list seq with card numbers
+        if is_horizontal:
+            # Put horizontal cards into list
+            codes = self.cells[col * BOARD_ROWS + row:(col + number_of_cards) * BOARD_ROWS:BOARD_ROWS]
+        else:
+            # Put vertical cards into list. A missing card (e.g. under a floating card) breaks the sequence
+            codes = self.cells[col * BOARD_ROWS + row:col * BOARD_ROWS + row + number_of_cards]
+            if EMPTY in codes:
+                return False
+        seq = [CARD_NUMBER[code] for code in codes]
+        # Check for sequence (normal: 2,3,4 or 4,3,2 - rotated: Q,K,A,2 or 3,2,A,K etc).
+        # Every step of an ascent is +1 and every step of a descent -1, modulo 13
+        steps = set((seq[i + 1] - seq[i]) % DECK_SIZE_PER_SUIT for i in range(len(seq) - 1))
+        return steps == ASCENT or steps == DESCENT
+
+
+def plant_line(cells, rng):
+    """ Put a line of 3 to 5 cards of the same suit, the same number, a sequence or a sequence of the same suit
+    at a random place of a board """
+    horizontal = rng.random() < 0.5
+    number_of_cards = rng.randint(3, 5)
+    suit = rng.randrange(DECK_SIZE // DECK_SIZE_PER_SUIT)
+    number = rng.randrange(DECK_SIZE_PER_SUIT)
+    same_suit, step = rng.choice(((True, 0), (False, 1), (False, -1), (True, 1), (True, -1)))
+    col = rng.randint(0, BOARD_COLUMNS - number_of_cards) if horizontal else rng.randrange(BOARD_COLUMNS)
+    row = rng.randrange(BOARD_ROWS) if horizontal else rng.randint(0, BOARD_ROWS - number_of_cards)
+    for i in range(number_of_cards):
+        card_suit = suit if same_suit else rng.randrange(DECK_SIZE // DECK_SIZE_PER_SUIT)
+        code = card_suit * DECK_SIZE_PER_SUIT + (number + i * step) % DECK_SIZE_PER_SUIT
+        if horizontal:
+            cells[(col + i) * BOARD_ROWS + row] = code
+        else:
+            cells[col * BOARD_ROWS + row + i] = code
+
+
+def random_board(rng):
+    """ Return the cells of a random board. Cards are drawn from a few suits and numbers so that most boards have
+    combinations, some columns have floating cards and half of the boards have a planted line """
+    suits = rng.sample(range(DECK_SIZE // DECK_SIZE_PER_SUIT), rng.randint(1, 4))
+    first = rng.randrange(DECK_SIZE_PER_SUIT)
+    numbers = [(first + i) % DECK_SIZE_PER_SUIT for i in range(rng.randint(2, DECK_SIZE_PER_SUIT))]
+    cells = bytearray([EMPTY]) * (BOARD_COLUMNS * BOARD_ROWS)
+    for col in range(BOARD_COLUMNS):
+        height = rng.randint(0, BOARD_ROWS)
+        for row in range(BOARD_ROWS - height, BOARD_ROWS):
+            if row == BOARD_ROWS - 1 or rng.random() > 0.1:
+                cells[col * BOARD_ROWS + row] = rng.choice(suits) * DECK_SIZE_PER_SUIT + rng.choice(numbers)
+    if rng.random() < 0.5:
+        plant_line(cells, rng)
+    return cells
+
+
+def reference_checks(cells):
+    """ Return the (points, cells, events) of every check of a board until no combination is found """
+    board = ReferenceBoard(cells)
+    checks = []
+    while True:
+        del board.events[:]
+        points = board.check_combinations()
+        checks.append((points, bytes(board.cells), list(board.events)))
+        if not points:
+            return checks
+
+
+class RulesTest(unittest.TestCase):
+    def assert_backend(self, board_class):
+        rng = random.Random(18)
+        combinations = 0
+        for i in range(BOARDS):
+            cells = random_board(rng)
+            board = board_class([])
+            for index, code in enumerate(cells):
+                if code != EMPTY:
+                    board.set_cell(index // BOARD_ROWS, index % BOARD_ROWS, code)
+            board.dirty = ALL_CELLS
+            for points, expected_cells, events in reference_checks(cells):
+                del board.events[:]
+                message = 'board %d %s' % (i, bytes(cells).hex())
+                self.assertEqual(board.check_board(), points, message)
+                self.assertEqual(bytes(board.cells), expected_cells, message)
+                self.assertEqual([event[:4] for event in board.events], events, message)
+                for event in board.events:
+                    if event[0] == EVENT_COMBINATION:
+                        self.assertEqual(RULE_POINTS[event[4][:3]][event[4][3]], event[3], message)
+                combinations += points != 0
+        # The boards must test the rules, not only boards without combinations
+        self.assertGreater(combinations, BOARDS)
+
+    def test_board(self):
+        self.assert_backend(Board)
+
+    def test_bitboard(self):
+        self.assert_backend(BitBoard)
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_batch(self):
+        rng = random.Random(18)
+        boards = [random_board(rng) for i in range(BOARDS)]
+        expected = [reference_checks(cells) for cells in boards]
+        game = batch.BatchGame(BOARDS, seed=0)
+        for i, cells in enumerate(boards):
+            game.cells[i] = numpy.frombuffer(bytes(cells), numpy.uint8).reshape(BOARD_COLUMNS, BOARD_ROWS)
+        games = numpy.arange(BOARDS)
+        step = 0
+        while len(games):
+            points = game.check_board(games)
+            for index, game_points in zip(games, points):
+                check = expected[index][step]
+                message = 'board %d %s' % (index, bytes(boards[index]).hex())
+                self.assertEqual(game_points, check[0], message)
+                self.assertEqual(game.cells[index].tobytes(), check[1], message)
+            games = games[points != 0]
+            step += 1
+
+    def test_dirty_checks(self):
+        verify_checks = engine.VERIFY_CHECKS
+        engine.VERIFY_CHECKS = True
+        try:
+            for board_class in (Board, BitBoard):
+                for seed in range(GAMES):
+                    rng = random.Random(seed)
+                    play_game(lambda game: random_policy(game, rng), board_class=board_class, seed=seed)
+        finally:
+            engine.VERIFY_CHECKS = verify_checks
+
+
+if __name__ == '__main__':
+    unittest.main()
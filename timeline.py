@@ -0,0 +1,68 @@
+""" Drop Card Game animation timeline
+Animations (tweens) run inside the main loop instead of blocking it with pygame.time.delay.
+Call update() with the elapsed milliseconds of every frame and draw() to draw the running tweens.
+"""
+
+
+class Tween(object):
+    def __init__(self, start, duration, draw=None, done=None, blocking=False):
+        self.start = start
+        self.duration = duration
+        self.end = start + duration
+        self.draw = draw
+        self.done = done
+        self.blocking = blocking
+
+    def progress(self, now):
+        """ Return how much of the tween has run, from 0 to 1 """
+        if self.duration <= 0:
+            return 1.0
+        return min(max(float(now - self.start) / self.duration, 0.0), 1.0)
+
+
+class Timeline(object):
+    def __init__(self):
+        self.now = 0
+        self.tweens = []
+        self.queue_end = 0
+
+    def add(self, duration, draw=None, done=None, blocking=False, delay=0):
+        """ Start a tween after delay ms. draw(target, progress) is called on every draw()
+        while the tween runs and done() once when it ends. A blocking tween holds the game ticks """
+        tween = Tween(self.now + delay, duration, draw, done, blocking)
+        self.tweens.append(tween)
+        return tween
+
+    def queue(self, duration, draw=None, done=None, blocking=False):
+        """ Start a tween when the previously queued tween ends """
+        tween = self.add(duration, draw, done, blocking, max(self.queue_end - self.now, 0))
+        self.queue_end = tween.end
+        return tween
+
+    def update(self, elapsed):
+        """ Advance the timeline by elapsed ms and finish the tweens that ended """
+        self.now += elapsed
+        running = []
+        for tween in self.tweens:
+            if tween.end <= self.now:
+                if tween.done:
+                    tween.done()
+            else:
+                running.append(tween)
+        self.tweens = running
+
+    def draw(self, target):
+        """ Draw the tweens that run now """
+        for tween in self.tweens:
+            if tween.draw and tween.start <= self.now:
+                tween.draw(target, tween.progress(self.now))
+
+    def is_blocking(self):
+        """ Return True while a blocking tween is pending or runs """
+        for tween in self.tweens:
+            if tween.blocking:
+                return True
+        return False
+
+    def is_idle(self):
+        return not self.tweens
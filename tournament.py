@@ -0,0 +1,276 @@
+""" Drop Card Game tournament
+Plays many headless games of one or more policies on a pool of worker processes and reports
+the score distribution, the stage reached and the frequency of the combinations of each policy by scoring rule.
+
+A job is a (policy, seed) pair, the game of a seed deals the same cards to every policy. Jobs are
+sent to the workers in chunks and every finished game is appended to a JSON lines results file
+as soon as its chunk comes back, so an interrupted tournament resumes where it stopped: the games
+already in the results file (same policy, seed, board and --max-stages) are not played again.
+
+Policies: random, or bot with optional Bot arguments e.g., bot:depth=3,time_budget=0.02
+Boards: the games are played on the default 5x5 board, or on a board of --board COLUMNSxROWS e.g., 20x30
+
+Usage: python tournament.py --policy random --policy bot --seeds 1000 --results results.jsonl
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import signal
+import time
+from engine import BoardLayout, EVENT_BONUS, EVENT_COMBINATION, EVENT_PENALTY, BOARD_COLUMNS, BOARD_ROWS, \
+    play_game, random_policy
+
+DEFAULT_BOARD = (BOARD_COLUMNS, BOARD_ROWS)
+_layouts = {}  # compiled layouts of the boards played by this process
+
+
+def make_policy(spec, seed):
+    """ Return the play_game policy of a policy spec, name[:arg=value,...], seeded with seed """
+    name, _, options = spec.partition(':')
+    kwargs = {}
+    for option in filter(None, options.split(',')):
+        key, _, value = option.partition('=')
+        kwargs[key] = float(value) if '.' in value else int(value)
+    rng = random.Random(seed)
+    if name == 'random' and not kwargs:
+        return lambda game: random_policy(game, rng)
+    if name == 'bot':
+        from bot import Bot
+        return Bot(rng=rng, **kwargs).play
+    raise ValueError('Unknown policy %s' % spec)
+
+
+def board_name(board):
+    return '%dx%d' % board
+
+
+def board_layout(board):
+    """ Return the layout of a board (columns, rows), compiled once per process """
+    layout = _layouts.get(board)
+    if layout is None:
+        layout = _layouts[board] = BoardLayout(*board)
+    return layout
+
+
+def combination_name(rule):
+    """ Return the name of the scoring rule of a combination event e.g., 'horizontal 4 same suit intersect' """
+    horizontal, number_of_cards, kind, intersect = rule
+    return '%s %d %s%s' % ('horizontal' if horizontal else 'vertical', number_of_cards, kind,
+                           ' intersect' if intersect else '')
+
+
+def result_combinations(result):
+    """ Return the combination counts of a result by rule name. Results of files written before the rules were
+    saved count the combinations by points, their names are e.g., '500 points' """
+    return dict((name + ' points' if name.isdigit() else name, count)
+                for name, count in result['combinations'].items())
+
+
+def play_one(spec, seed, max_stages=None, board=DEFAULT_BOARD):
+    """ Play a complete game of a policy on a board (columns, rows) and return its result """
+    combinations = {}
+    counts = {'drops': 0, 'bonuses': 0, 'penalties': 0}
+
+    def on_events(events):
+        counts['drops'] += 1
+        for event in events:
+            if event[0] == EVENT_COMBINATION:
+                name = combination_name(event[4])
+                combinations[name] = combinations.get(name, 0) + 1
+            elif event[0] == EVENT_BONUS:
+                counts['bonuses'] += 1
+            elif event[0] == EVENT_PENALTY:
+                counts['penalties'] += 1
+
+    start = time.perf_counter()
+    game = play_game(make_policy(spec, seed), max_stages=max_stages, seed=seed, on_events=on_events,
+                     layout=board_layout(board))
+    result = {'policy': spec, 'seed': seed, 'board': board_name(board), 'max_stages': max_stages,
+              'score': game.score, 'stage': game.stage, 'level': game.level,
+              'game_over': game.game_over, 'combinations': combinations,
+              'seconds': round(time.perf_counter() - start, 4)}
+    result.update(counts)
+    return result
+
+
+def init_worker():
+    """ Workers ignore Ctrl+C, the main process stops them """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def play_chunk(job):
+    """ Worker: play a chunk of seeds of a policy """
+    spec, seeds, max_stages, board = job
+    return [play_one(spec, seed, max_stages, board) for seed in seeds]
+
+
+def load_results(path):
+    """ Return the results of a results file, [] if it doesn't exist. A truncated last line is ignored """
+    results = []
+    if os.path.exists(path):
+        with open(path) as results_file:
+            for line in results_file:
+                try:
+                    results.append(json.loads(line))
+                except ValueError:
+                    pass
+    return results
+
+
+def result_board(result):
+    """ Return the board name of a result, results of files written before boards could be chosen are 5x5 """
+    return result.get('board', board_name(DEFAULT_BOARD))
+
+
+def result_key(result):
+    """ Return the key of the game of a result: policy, seed, board name and max stages. The max stages of
+    results of files written before they were saved are unknown, no run plays them """
+    return result['policy'], result['seed'], result_board(result), result.get('max_stages', 'unknown')
+
+
+def make_jobs(policies, seeds, done, chunk, max_stages, board=DEFAULT_BOARD):
+    """ Return the chunks of the (policy, seed) jobs on board with max_stages that are not done """
+    jobs = []
+    for spec in policies:
+        todo = [seed for seed in seeds if (spec, seed, board_name(board), max_stages) not in done]
+        for i in range(0, len(todo), chunk):
+            jobs.append((spec, todo[i:i + chunk], max_stages, board))
+    return jobs
+
+
+def run(policies, seeds, results_path, workers=None, chunk=10, max_stages=None, progress=None, board=DEFAULT_BOARD):
+    """ Play the games of policies and seeds on board (columns, rows) with max_stages that are not in the results
+    file yet and append their results. progress, if given, is called with the number of games played and the
+    number of games to play """
+    done = set(result_key(result) for result in load_results(results_path))
+    jobs = make_jobs(policies, seeds, done, chunk, max_stages, board)
+    total = sum(len(job[1]) for job in jobs)
+    played = 0
+    if not jobs:
+        return played
+    pool = multiprocessing.Pool(workers or os.cpu_count(), init_worker)
+    try:
+        with open(results_path, 'a') as results_file:
+            for results in pool.imap_unordered(play_chunk, jobs):
+                for result in results:
+                    results_file.write(json.dumps(result, sort_keys=True) + '\n')
+                results_file.flush()
+                played += len(results)
+                if progress is not None:
+                    progress(played, total)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return played
+
+
+def percentile(values, fraction):
+    """ Return the value at fraction (0-1) of the sorted values, nearest rank """
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize(results):
+    """ Return the summary of the results of each policy: games, score distribution, stages and combinations """
+    by_policy = {}
+    for result in results:
+        by_policy.setdefault(result['policy'], []).append(result)
+    summaries = {}
+    for spec, games in by_policy.items():
+        scores = sorted(game['score'] for game in games)
+        stages = {}
+        combinations = {}
+        for game in games:
+            stages[game['stage']] = stages.get(game['stage'], 0) + 1
+            for name, count in result_combinations(game).items():
+                combinations[name] = combinations.get(name, 0) + count
+        drops = sum(game['drops'] for game in games)
+        summaries[spec] = {
+            'games': len(games),
+            'score_mean': float(sum(scores)) / len(scores),
+            'score_min': scores[0],
+            'score_p10': percentile(scores, 0.1),
+            'score_p50': percentile(scores, 0.5),
+            'score_p90': percentile(scores, 0.9),
+            'score_max': scores[-1],
+            'stage_mean': float(sum(game['stage'] for game in games)) / len(games),
+            'stages': stages,
+            'combinations_per_100_drops': dict((name, 100.0 * count / drops)
+                                               for name, count in combinations.items()),
+            'seconds_per_game': sum(game['seconds'] for game in games) / len(games),
+        }
+    return summaries
+
+
+def print_summary(summaries):
+    for spec in sorted(summaries):
+        summary = summaries[spec]
+        print('%s: %d games' % (spec, summary['games']))
+        print('  score mean %.0f min %d p10 %d median %d p90 %d max %d' % (
+            summary['score_mean'], summary['score_min'], summary['score_p10'], summary['score_p50'],
+            summary['score_p90'], summary['score_max']))
+        print('  stage mean %.2f reached: %s' % (
+            summary['stage_mean'], ' '.join('%d:%d' % item for item in sorted(summary['stages'].items()))))
+        print('  combinations per 100 drops:')
+        frequencies = summary['combinations_per_100_drops']
+        for name in sorted(frequencies, key=lambda name: (-frequencies[name], name)):
+            print('    %6.2f %s' % (frequencies[name], name))
+        print('  %.3f s per game' % summary['seconds_per_game'])
+
+
+def parse_board(text):
+    """ Return the columns and rows of COLUMNSxROWS """
+    try:
+        columns, rows = [int(size) for size in text.lower().split('x')]
+        BoardLayout(columns, rows)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError('%s is not a board of the rules: %s' % (text, error))
+    return columns, rows
+
+
+def parse_seeds(text):
+    """ Return the seeds of N (seeds 0 to N-1) or START:STOP """
+    if ':' in text:
+        start, stop = text.split(':')
+        return range(int(start), int(stop))
+    return range(int(text))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play Drop Card Game tournaments of policies on all cores')
+    parser.add_argument('--policy', action='append', dest='policies', metavar='POLICY',
+                        help='random or bot[:arg=value,...] e.g., bot:depth=3, can be given more than once')
+    parser.add_argument('--seeds', type=parse_seeds, default=parse_seeds('100'), metavar='N|START:STOP',
+                        help='seeds of the games, the same seeds are played by every policy')
+    parser.add_argument('--max-stages', type=int, default=None, help='stop every game after this stage')
+    parser.add_argument('--board', type=parse_board, default=DEFAULT_BOARD, metavar='COLUMNSxROWS',
+                        help='size of the board e.g., 20x30, 5x5 by default')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, the number of cores by default')
+    parser.add_argument('--chunk', type=int, default=10, help='games sent to a worker at a time')
+    parser.add_argument('--results', default='tournament.jsonl', metavar='FILE',
+                        help='results file, games already in it are not played again')
+    args = parser.parse_args(argv)
+    policies = args.policies or ['random']
+    for spec in policies:
+        make_policy(spec, 0)
+
+    def progress(played, total):
+        print('\r%d/%d games' % (played, total), end='', flush=True)
+
+    try:
+        played = run(policies, args.seeds, args.results, args.workers, args.chunk, args.max_stages, progress,
+                     args.board)
+    except KeyboardInterrupt:
+        print('\nInterrupted, run again to resume')
+        return
+    if played:
+        print()
+    keys = set((spec, seed, board_name(args.board), args.max_stages) for spec in policies for seed in args.seeds)
+    results = [result for result in load_results(args.results) if result_key(result) in keys]
+    print_summary(summarize(results))
+
+
+if __name__ == '__main__':
+    main()
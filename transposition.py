@@ -0,0 +1,83 @@
+""" Drop Card Game transposition table
+A bounded cache of search results keyed by Zobrist keys (see engine.ZOBRIST and Board.zobrist).
+The table has a fixed number of slots, a key goes to the slot of its low bits. When two keys
+want the same slot, the entry of an older search or of a shallower (cheaper) search is replaced.
+"""
+import random
+from engine import BOARD_COLUMNS, DECK_SIZE
+
+_keys_rng = random.Random(1)
+# Keys of a card in a set of cards (e.g. the deck), of a card at a position of the pack and of a drop (card, column)
+CARD_KEYS = [_keys_rng.getrandbits(64) for _code in range(DECK_SIZE)]
+PACK_KEYS = [_keys_rng.getrandbits(64) for _index in range(8 << 8)]
+DROP_KEYS = [_keys_rng.getrandbits(64) for _index in range(DECK_SIZE * BOARD_COLUMNS)]
+LEVEL_KEY = _keys_rng.getrandbits(64) | 1
+_drop_keys = {BOARD_COLUMNS: DROP_KEYS}
+
+
+def drop_keys(columns):
+    """ Return the keys of the drops (card, column) on a board of columns: keys[code * columns + col].
+    They are DROP_KEYS on the default board """
+    keys = _drop_keys.get(columns)
+    if keys is None:
+        rng = random.Random(columns)
+        keys = _drop_keys[columns] = [rng.getrandbits(64) for index in range(DECK_SIZE * columns)]
+    return keys
+
+
+def cards_key(cards):
+    """ Return the key of a set of cards """
+    key = 0
+    for code in cards:
+        key ^= CARD_KEYS[code]
+    return key
+
+
+def pack_key(cards):
+    """ Return the key of an ordered list of cards (at most 8) """
+    key = 0
+    for index, code in enumerate(cards):
+        key ^= PACK_KEYS[index << 8 | code]
+    return key
+
+
+class TranspositionTable(object):
+    """ 2 ** size_bits slots of key, depth and value """
+    __slots__ = ('mask', 'keys', 'depths', 'generations', 'values', 'generation', 'hits', 'misses')
+
+    def __init__(self, size_bits=16):
+        self.mask = (1 << size_bits) - 1
+        self.keys = [None] * (1 << size_bits)
+        self.depths = [0] * (1 << size_bits)
+        self.generations = [0] * (1 << size_bits)
+        self.values = [None] * (1 << size_bits)
+        self.generation = 0
+        self.hits = self.misses = 0
+
+    def new_search(self):
+        """ Start a new search. Entries of the previous searches are kept but are replaced first """
+        self.generation += 1
+
+    def get(self, key, depth=0):
+        """ Return the value of key searched at least depth deep, None if there is none """
+        slot = key & self.mask
+        if self.keys[slot] == key and self.depths[slot] >= depth:
+            self.hits += 1
+            return self.values[slot]
+        self.misses += 1
+        return None
+
+    def put(self, key, value, depth=0):
+        """ Store the value of key searched depth deep, unless its slot has a deeper entry of this search """
+        slot = key & self.mask
+        if self.generations[slot] != self.generation or self.depths[slot] <= depth or self.keys[slot] is None:
+            self.keys[slot] = key
+            self.depths[slot] = depth
+            self.generations[slot] = self.generation
+            self.values[slot] = value
+
+    def clear(self):
+        size = self.mask + 1
+        self.keys = [None] * size
+        self.values = [None] * size
+        self.hits = self.misses = 0